@@ -1,6 +1,5 @@
 # -*- mode: python ; coding: utf-8 -*-
 import os
-from PyInstaller.utils.hooks import collect_all
 
 # parse command line arguments
 import argparse
@@ -20,14 +19,15 @@ datas = [
 
 
 
-numpy_datas, numpy_binaries, numpy_hiddenimports = collect_all('numpy')
 ws_hiddenimports=['websockets', 'websockets.legacy']
+# Console and DAW backends are imported by name when selected, so PyInstaller can't see them
+backend_hiddenimports = ['consoles.digico', 'consoles.studervista', 'daws.reaper', 'daws.protools']
 
 a = Analysis(['main.py'],
     pathex=[],
-    binaries=numpy_binaries,
-    datas=datas + numpy_datas,
-    hiddenimports=numpy_hiddenimports + ws_hiddenimports,
+    binaries=[],
+    datas=datas,
+    hiddenimports=ws_hiddenimports + backend_hiddenimports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
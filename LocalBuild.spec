@@ -8,7 +8,7 @@ a = Analysis(['main.py'],
              pathex=[],
              binaries=[],
              datas=[],
-             hiddenimports=[],
+             hiddenimports=['consoles.digico', 'consoles.studervista', 'daws.reaper', 'daws.protools'],
              hookspath=[],
              hooksconfig={},
              runtime_hooks=[],
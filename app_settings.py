@@ -1,247 +1,382 @@
 import threading
 from configparser import ConfigParser
+from dataclasses import dataclass, replace
+from typing import Callable, List, Tuple
+
+from logger_config import logger
+
+
+def _port(value) -> int:
+    port_num = int(value)
+    if not 1 <= port_num <= 65535:
+        raise ValueError("Invalid port number")
+    return port_num
+
+
+def _seconds(value) -> float:
+    seconds = float(value)
+    if seconds <= 0:
+        raise ValueError("Invalid duration")
+    return seconds
+
+
+def _seconds_or_off(value) -> float:
+    # A duration where 0 turns the feature off
+    seconds = float(value)
+    if seconds < 0:
+        raise ValueError("Invalid duration")
+    return seconds
+
+
+@dataclass(frozen=True, slots=True)
+class SettingsSnapshot:
+    # An immutable view of every setting at one point in time. Hot handlers
+    # grab settings.snapshot once per message and read fields off it.
+    console_ip: str = "10.10.10.1"
+    reaper_ip: str = "127.0.0.1"
+    repeater_ip: str = "10.10.10.10"
+    repeater_port: int = 9999
+    repeater_receive_port: int = 9998
+    reaper_port: int = 49102
+    reaper_receive_port: int = 49101
+    console_port: int = 8001
+    receive_port: int = 8000
+    forwarder_enabled: bool = False
+    marker_mode: str = "PlaybackTrack"
+    window_loc: Tuple[int, int] = (400, 222)
+    window_size: Tuple[int, int] = (221, 310)
+    name_only_match: bool = False
+    # Backend names match DiGiCo.type and Reaper.type. They are spelled out so
+    # the backends can import settings without a circular import.
+    console_type: str = "DiGiCo"
+    daw_type: str = "Reaper"
+    # Seconds without console traffic before a probe is sent, and how long
+    # to wait after that probe before reporting the console disconnected
+    link_idle_threshold: float = 0.5
+    link_timeout: float = 0.3
+    # Local port for the metrics endpoint, 0 leaves it off
+    metrics_port: int = 0
+    # Write every OSC datagram to a capture file in the log directory
+    capture_enabled: bool = False
+    # Seconds a recall must stand before its cue acts, 0 acts on every recall
+    cue_settle_time: float = 0.0
+    # Journal the recalls the settle window skipped
+    journal_skipped_cues: bool = False
+    # Answer repeater queries from the values the console last sent
+    repeater_mirror: bool = True
+    # Record the console's parameter changes for later queries, needs numpy
+    telemetry_enabled: bool = False
+    # Where the Pro Tools scripting service (PTSL) listens
+    ptsl_address: str = "localhost:31416"
+    # Local port the GUI and its network worker process talk over
+    worker_port: int = 49103
 
-from consoles import DiGiCo
-from daws import Reaper
 
 class ThreadSafeSettings:
+    # Readers get the current snapshot with a single reference read and never
+    # take a lock. Writers build a new snapshot and swap it in under the
+    # write lock, then tell subscribers what changed.
     def __init__(self):
         self._lock = threading.Lock()
-        self._settings = {
-            'console_ip' : "10.10.10.1",
-            'reaper_ip' : "127.0.0.1",
-            'repeater_ip' : "10.10.10.10",
-            'repeater_port' : 9999,
-            'repeater_receive_port' : 9998,
-            'reaper_port' : 49102,
-            'reaper_receive_port' : 49101,
-            'console_port' : 8001,
-            'receive_port' : 8000,
-            'forwarder_enabled' : False,
-            'marker_mode' : "PlaybackTrack",
-            'window_loc' : (400, 222),
-            'window_size' : (221, 310),
-            'name_only_match' : False,
-            'console_type': DiGiCo.type,
-            'daw_type' : Reaper.type
-        }
+        self._snapshot = SettingsSnapshot()
+        self._subscribers: List[Callable[[SettingsSnapshot, SettingsSnapshot], None]] = []
 
     @property
-    def console_ip(self) -> str:
+    def snapshot(self) -> SettingsSnapshot:
+        return self._snapshot
+
+    def subscribe(self, callback: Callable[[SettingsSnapshot, SettingsSnapshot], None]) -> None:
+        # callback(old, new) runs on the writer's thread after every change
         with self._lock:
-            return self._settings["console_ip"]
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback: Callable[[SettingsSnapshot, SettingsSnapshot], None]) -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s != callback]
+
+    def update(self, **changes) -> None:
+        # Swap in a snapshot with several settings changed at once
+        with self._lock:
+            old = self._snapshot
+            new = replace(old, **changes)
+            if new == old:
+                return
+            self._snapshot = new
+            subscribers = self._subscribers
+        for callback in subscribers:
+            try:
+                callback(old, new)
+            except Exception as e:
+                logger.error(f"Settings subscriber error: {e}")
+
+    @property
+    def console_ip(self) -> str:
+        return self._snapshot.console_ip
 
     @console_ip.setter
     def console_ip(self, value):
-        with self._lock:
-            self._settings["console_ip"] = value
+        self.update(console_ip=value)
 
     @property
     def reaper_ip(self) -> str:
-        with self._lock:
-            return self._settings["reaper_ip"]
+        return self._snapshot.reaper_ip
 
     @reaper_ip.setter
     def reaper_ip(self, value):
-        with self._lock:
-            self._settings["reaper_ip"] = value
+        self.update(reaper_ip=value)
 
     @property
     def repeater_ip(self) -> str:
-        with self._lock:
-            return self._settings["repeater_ip"]
+        return self._snapshot.repeater_ip
 
     @repeater_ip.setter
     def repeater_ip(self, value):
-        with self._lock:
-            self._settings["repeater_ip"] = value
+        self.update(repeater_ip=value)
 
     @property
     def repeater_port(self) -> int:
-        with self._lock:
-            return self._settings["repeater_port"]
+        return self._snapshot.repeater_port
 
     @repeater_port.setter
     def repeater_port(self, value):
-        with self._lock:
-            port_num = int(value)
-            if not 1 <= port_num <= 65535:
-                raise ValueError("Invalid port number")
-            self._settings["repeater_port"] = port_num
+        self.update(repeater_port=_port(value))
 
     @property
     def repeater_receive_port(self) -> int:
-        with self._lock:
-            return self._settings["repeater_receive_port"]
+        return self._snapshot.repeater_receive_port
 
     @repeater_receive_port.setter
     def repeater_receive_port(self, value):
-        with self._lock:
-            port_num = int(value)
-            if not 1 <= port_num <= 65535:
-                raise ValueError("Invalid port number")
-            self._settings["repeater_receive_port"] = port_num
+        self.update(repeater_receive_port=_port(value))
 
     @property
     def reaper_port(self) -> int:
-        with self._lock:
-            return self._settings["reaper_port"]
+        return self._snapshot.reaper_port
 
     @reaper_port.setter
     def reaper_port(self, value):
-        with self._lock:
-            port_num = int(value)
-            if not 1 <= port_num <= 65535:
-                raise ValueError("Invalid port number")
-            self._settings["reaper_port"] = port_num
+        self.update(reaper_port=_port(value))
 
     @property
     def reaper_receive_port(self) -> int:
-        with self._lock:
-            return self._settings["reaper_receive_port"]
+        return self._snapshot.reaper_receive_port
 
     @reaper_receive_port.setter
     def reaper_receive_port(self, value):
-        with self._lock:
-            port_num = int(value)
-            if not 1 <= port_num <= 65535:
-                raise ValueError("Invalid port number")
-            self._settings["reaper_receive_port"] = port_num
+        self.update(reaper_receive_port=_port(value))
 
     @property
     def console_port(self) -> int:
-        with self._lock:
-            return self._settings["console_port"]
+        return self._snapshot.console_port
 
     @console_port.setter
     def console_port(self, value):
-        with self._lock:
-            port_num = int(value)
-            if not 1 <= port_num <= 65535:
-                raise ValueError("Invalid port number")
-            self._settings["console_port"] = port_num
+        self.update(console_port=_port(value))
 
     @property
     def receive_port(self) -> int:
-        with self._lock:
-            return self._settings["receive_port"]
+        return self._snapshot.receive_port
 
     @receive_port.setter
     def receive_port(self, value):
-        with self._lock:
-            port_num = int(value)
-            if not 1 <= port_num <= 65535:
-                raise ValueError("Invalid port number")
-            self._settings["receive_port"] = port_num
+        self.update(receive_port=_port(value))
 
     @property
     def forwarder_enabled(self) -> bool:
-        with self._lock:
-            return self._settings["forwarder_enabled"]
+        return self._snapshot.forwarder_enabled
 
     @forwarder_enabled.setter
     def forwarder_enabled(self, value):
-        with self._lock:
-            self._settings["forwarder_enabled"] = value
+        self.update(forwarder_enabled=value)
 
     @property
     def marker_mode(self) -> str:
-        with self._lock:
-            return self._settings["marker_mode"]
+        return self._snapshot.marker_mode
 
     @marker_mode.setter
     def marker_mode(self, value):
-        with self._lock:
-            self._settings["marker_mode"] = value
+        self.update(marker_mode=value)
 
     @property
     def window_loc(self):
-        with self._lock:
-            return self._settings["window_loc"]
+        return self._snapshot.window_loc
 
     @window_loc.setter
     def window_loc(self, value):
-        with self._lock:
-            self._settings["window_loc"] = value
+        self.update(window_loc=value)
 
     @property
     def window_size(self):
-        with self._lock:
-            return self._settings["window_size"]
+        return self._snapshot.window_size
 
     @window_size.setter
     def window_size(self, value):
-        with self._lock:
-            self._settings["window_size"] = value
+        self.update(window_size=value)
 
     @property
     def name_only_match(self) -> bool:
-        with self._lock:
-            return self._settings["name_only_match"]
+        return self._snapshot.name_only_match
 
     @name_only_match.setter
     def name_only_match(self, value):
-        with self._lock:
-            self._settings["name_only_match"] = value
+        self.update(name_only_match=value)
 
     @property
     def console_type(self) -> str:
-        with self._lock:
-            return self._settings["console_type"]
+        return self._snapshot.console_type
 
     @console_type.setter
     def console_type(self, value):
-        with self._lock:
-            self._settings["console_type"] = value
+        self.update(console_type=value)
 
     @property
     def daw_type(self) -> str:
-        with self._lock:
-            return self._settings["daw_type"]
+        return self._snapshot.daw_type
 
     @daw_type.setter
     def daw_type(self, value):
-        with self._lock:
-            self._settings["daw_type"] = value
+        self.update(daw_type=value)
 
-    def update_from_config(self, config: ConfigParser):
-        # Update settings from a ConfigParser object
-        with self._lock:
-            string_properties = {
-                "console_ip": "default_ip",
-                "repeater_ip": "repeater_ip",
-                "console_type": "console_type",
-                "daw_type": "daw_type",
-            }
-            for settings_name, config_name in string_properties.items():
-                self._settings[settings_name] = config.get(
-                    "main", config_name, fallback=self._settings[settings_name]
-                )
-
-            int_properties = {
-                "console_port": "default_digico_send_port",
-                "receive_port": "default_digico_receive_port",
-                "reaper_port": "default_reaper_send_port",
-                "repeater_port": "default_repeater_send_port",
-                "repeater_receive_port": "default_repeater_receive_port",
-                "reaper_receive_port": "default_reaper_receive_port",
-            }
-            for settings_name, config_name in int_properties.items():
-                self._settings[settings_name] = config.getint(
-                    "main", config_name, fallback=self._settings[settings_name]
-                )
-
-            boolean_properties = {
-                "forwarder_enabled": "forwarder_enabled",
-                "name_only_match": "name_only_match",
-            }
-            for settings_name, config_name in boolean_properties.items():
-                self._settings[settings_name] = config.getboolean(
-                    "main", config_name, fallback=self._settings[settings_name]
-                )
-
-            # Not implementing fallbacks for these since they've been around since the v3 config
-            self._settings.update(
+    @property
+    def link_idle_threshold(self) -> float:
+        return self._snapshot.link_idle_threshold
+
+    @link_idle_threshold.setter
+    def link_idle_threshold(self, value):
+        self.update(link_idle_threshold=_seconds(value))
+
+    @property
+    def link_timeout(self) -> float:
+        return self._snapshot.link_timeout
+
+    @link_timeout.setter
+    def link_timeout(self, value):
+        self.update(link_timeout=_seconds(value))
+
+    @property
+    def metrics_port(self) -> int:
+        return self._snapshot.metrics_port
+
+    @metrics_port.setter
+    def metrics_port(self, value):
+        self.update(metrics_port=_port(value) if int(value) else 0)
+
+    @property
+    def capture_enabled(self) -> bool:
+        return self._snapshot.capture_enabled
+
+    @capture_enabled.setter
+    def capture_enabled(self, value):
+        self.update(capture_enabled=value)
+
+    @property
+    def cue_settle_time(self) -> float:
+        return self._snapshot.cue_settle_time
+
+    @cue_settle_time.setter
+    def cue_settle_time(self, value):
+        self.update(cue_settle_time=_seconds_or_off(value))
+
+    @property
+    def journal_skipped_cues(self) -> bool:
+        return self._snapshot.journal_skipped_cues
+
+    @journal_skipped_cues.setter
+    def journal_skipped_cues(self, value):
+        self.update(journal_skipped_cues=value)
+
+    @property
+    def repeater_mirror(self) -> bool:
+        return self._snapshot.repeater_mirror
+
+    @repeater_mirror.setter
+    def repeater_mirror(self, value):
+        self.update(repeater_mirror=value)
+
+    @property
+    def telemetry_enabled(self) -> bool:
+        return self._snapshot.telemetry_enabled
+
+    @telemetry_enabled.setter
+    def telemetry_enabled(self, value):
+        self.update(telemetry_enabled=value)
+
+    @property
+    def ptsl_address(self) -> str:
+        return self._snapshot.ptsl_address
+
+    @ptsl_address.setter
+    def ptsl_address(self, value):
+        self.update(ptsl_address=value)
+
+    @property
+    def worker_port(self) -> int:
+        return self._snapshot.worker_port
+
+    @worker_port.setter
+    def worker_port(self, value):
+        self.update(worker_port=_port(value))
+
+    def update_from_config(self, config: ConfigParser, section: str = "main"):
+        # Update settings from a section of a ConfigParser object. Pairings
+        # other than the main one have their own section with the same keys.
+        current = self._snapshot
+        changes = {}
+        string_properties = {
+            "console_ip": "default_ip",
+            "repeater_ip": "repeater_ip",
+            "console_type": "console_type",
+            "daw_type": "daw_type",
+            "ptsl_address": "ptsl_address",
+        }
+        for settings_name, config_name in string_properties.items():
+            changes[settings_name] = config.get(
+                section, config_name, fallback=getattr(current, settings_name)
+            )
+
+        int_properties = {
+            "console_port": "default_digico_send_port",
+            "receive_port": "default_digico_receive_port",
+            "reaper_port": "default_reaper_send_port",
+            "repeater_port": "default_repeater_send_port",
+            "repeater_receive_port": "default_repeater_receive_port",
+            "reaper_receive_port": "default_reaper_receive_port",
+            "metrics_port": "metrics_port",
+            "worker_port": "worker_port",
+        }
+        for settings_name, config_name in int_properties.items():
+            changes[settings_name] = config.getint(
+                section, config_name, fallback=getattr(current, settings_name)
+            )
+
+        boolean_properties = {
+            "forwarder_enabled": "forwarder_enabled",
+            "name_only_match": "name_only_match",
+            "capture_enabled": "capture_enabled",
+            "telemetry_enabled": "telemetry_enabled",
+            "repeater_mirror": "repeater_mirror",
+            "journal_skipped_cues": "journal_skipped_cues",
+        }
+        for settings_name, config_name in boolean_properties.items():
+            changes[settings_name] = config.getboolean(
+                section, config_name, fallback=getattr(current, settings_name)
+            )
+
+        float_properties = {
+            "link_idle_threshold": "link_idle_threshold",
+            "link_timeout": "link_timeout",
+        }
+        for settings_name, config_name in float_properties.items():
+            changes[settings_name] = _seconds(config.getfloat(
+                section, config_name, fallback=getattr(current, settings_name)
+            ))
+        changes["cue_settle_time"] = _seconds_or_off(config.getfloat(
+            section, "cue_settle_time", fallback=current.cue_settle_time
+        ))
+
+        # Not implementing fallbacks for these since they've been around since the v3 config
+        if section == "main":
+            changes.update(
                 {
                     "window_loc": (
                         int(config["main"]["window_pos_x"]),
@@ -253,6 +388,75 @@ class ThreadSafeSettings:
                     ),
                 }
             )
+        self.update(**changes)
+
+
+# Config keys of the settings a DAW section can set, e.g. [daw Backup]
+DAW_CONFIG_KEYS = {
+    "daw_type": "daw_type",
+    "reaper_ip": "reaper_ip",
+    "reaper_port": "default_reaper_send_port",
+    "reaper_receive_port": "default_reaper_receive_port",
+    "ptsl_address": "ptsl_address",
+}
+
+
+class DawSettings(ThreadSafeSettings):
+    # What one of the extra DAWs a pairing drives sees: the pairing's
+    # settings with the DAW's own type, address and ports laid over them.
+    # Everything else, like the marker mode, is read from and written to
+    # the pairing's settings, so all of its DAWs follow the same console.
+    # The merged snapshot is rebuilt whenever the pairing's settings change,
+    # and this object's own subscribers are told about it.
+    def __init__(self, base: ThreadSafeSettings, **overrides):
+        super().__init__()
+        self.base = base
+        self.overrides = overrides
+        self._snapshot = replace(base.snapshot, **overrides)
+        base.subscribe(self._base_changed)
+
+    @classmethod
+    def from_config(cls, base: ThreadSafeSettings, config: ConfigParser, section: str) -> "DawSettings":
+        current = base.snapshot
+        overrides = {
+            settings_name: config.get(section, config_name, fallback=getattr(current, settings_name))
+            for settings_name, config_name in DAW_CONFIG_KEYS.items()
+        }
+        overrides["reaper_port"] = _port(overrides["reaper_port"])
+        overrides["reaper_receive_port"] = _port(overrides["reaper_receive_port"])
+        return cls(base, **overrides)
+
+    def close(self) -> None:
+        # Stops following the pairing's settings
+        self.base.unsubscribe(self._base_changed)
+
+    def _base_changed(self, old: SettingsSnapshot, new: SettingsSnapshot) -> None:
+        # The base's latest snapshot rather than `new`, in case two changes
+        # to it are reported out of order
+        self._merge()
+
+    def _merge(self) -> None:
+        with self._lock:
+            old = self._snapshot
+            new = replace(self.base.snapshot, **self.overrides)
+            if new == old:
+                return
+            self._snapshot = new
+            subscribers = self._subscribers
+        for callback in subscribers:
+            try:
+                callback(old, new)
+            except Exception as e:
+                logger.error(f"Settings subscriber error: {e}")
+
+    def update(self, **changes) -> None:
+        own = {name: changes.pop(name) for name in list(changes) if name in self.overrides}
+        if own:
+            with self._lock:
+                self.overrides = {**self.overrides, **own}
+            self._merge()
+        if changes:
+            self.base.update(**changes)
 
 
 settings = ThreadSafeSettings()
@@ -0,0 +1,40 @@
+import importlib
+import threading
+from typing import Iterable, Optional, Type
+
+
+class Backend:
+    # Registry entry for a console or DAW backend. Only the name and the
+    # supported features are known up front. The backend module, and with it
+    # heavy dependencies like ptsl/grpc or asn1, is imported the first time
+    # the class is actually needed.
+    __slots__ = ("type", "module", "class_name", "supported_features", "_cls", "_lock")
+
+    def __init__(
+        self,
+        type: str,
+        module: str,
+        class_name: str,
+        supported_features: Iterable = (),
+    ):
+        self.type = type
+        self.module = module
+        self.class_name = class_name
+        self.supported_features = list(supported_features)
+        self._cls: Optional[Type] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._cls is not None
+
+    def load(self) -> Type:
+        if self._cls is None:
+            with self._lock:
+                if self._cls is None:
+                    module = importlib.import_module(self.module)
+                    self._cls = getattr(module, self.class_name)
+        return self._cls
+
+    def __repr__(self) -> str:
+        return f"Backend({self.type!r}, {self.module}.{self.class_name})"
@@ -0,0 +1,81 @@
+# Publishes markers on a bus that a Reaper backend shares with a Pro Tools
+# backend whose PTSL stand-in answers slowly, and reports how long the
+# markers take to reach the fake Reaper with and without the slow DAW next
+# to it. With per-DAW queues the two rows should match.
+#
+#   python -m benchmarks.bench_fanout --markers 200 --slow-ms 20
+import argparse
+import time
+from typing import Dict, List
+
+from app_settings import ThreadSafeSettings
+from benchmarks.common import print_report
+from daws import ProTools, Reaper
+from event_bus import EventBus, PlaceMarker
+from harness.ptsl_server import PtslStandIn, StandInServer
+from harness.simulators import FakeReaper
+
+
+def _send_markers(bus: EventBus, reaper: FakeReaper, count: int, gap: float) -> List[float]:
+    samples = []
+    for i in range(count):
+        name = f"Marker {i + 1}"
+        arrived, stamp = reaper.expect(lambda a, p, name=name: a == "/lastmarker/name" and p[0] == name)
+        sent = time.perf_counter()
+        bus.publish(PlaceMarker(marker_name=name, ingest=sent))
+        if arrived.wait(2.0):
+            samples.append(stamp[0] - sent)
+        time.sleep(gap)
+    return samples
+
+
+def run(base_port: int, count: int, slow: float, gap: float) -> Dict[str, List[float]]:
+    settings = ThreadSafeSettings()
+    settings.update(reaper_ip="127.0.0.1", reaper_port=base_port, reaper_receive_port=base_port + 1)
+    fake_reaper = FakeReaper(base_port, base_port + 1, 0)
+    results = {}
+    try:
+        with StandInServer(PtslStandIn(delay=slow), "localhost:0") as server:
+            for name, with_protools in (("Reaper alone", False), ("Reaper + slow Pro Tools", True)):
+                bus = EventBus()
+                reaper = Reaper(settings, bus)
+                reaper.connect()
+                daws = [reaper]
+                if with_protools:
+                    protools = ProTools(settings, bus, address=server.address)
+                    protools.connect()
+                    daws.append(protools)
+                try:
+                    results[name] = _send_markers(bus, fake_reaper, count, gap)
+                    stats = {s["subscriber"]: s for s in bus.stats()}
+                    # Let the slow DAW catch up before its connection closes
+                    deadline = time.monotonic() + count * slow + 5
+                    while any(s["delivered"] < count for s in bus.stats()) and time.monotonic() < deadline:
+                        time.sleep(0.05)
+                finally:
+                    for daw in daws:
+                        daw.shutdown_servers()
+                if with_protools:
+                    backlog = stats["ProTools"]
+                    print(f"Pro Tools meanwhile: {backlog['delivered']} delivered, "
+                          f"{backlog['depth']} still queued, handler avg {backlog['handler_avg_ms']:.1f} ms")
+    finally:
+        fake_reaper.close()
+    print_report(f"Marker to Reaper ({count} markers, Pro Tools answering in {slow * 1000:.0f} ms)", results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time markers to a fake Reaper with and without a slow Pro Tools on the same bus."
+    )
+    parser.add_argument("--base-port", type=int, default=39500)
+    parser.add_argument("--markers", type=int, default=200)
+    parser.add_argument("--slow-ms", type=float, default=20.0, help="Delay of every PTSL command")
+    parser.add_argument("--gap", type=float, default=0.01, help="Seconds between markers")
+    args = parser.parse_args()
+    run(args.base_port, args.markers, args.slow_ms / 1000, args.gap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compares resolving the local bind address by scanning every interface on
+# each call, as the bridge used to, with the cached InterfaceTable. The
+# --fake-adapters option adds synthetic virtual adapters to the scan to
+# show how both scale on machines with many of them.
+#
+#   python -m benchmarks.bench_interfaces --iterations 2000 --fake-adapters 40
+import argparse
+import ipaddress
+import socket
+import time
+from collections import namedtuple
+
+import psutil
+
+import utilities
+from benchmarks.common import print_report
+
+Snic = namedtuple("Snic", "family address netmask")
+
+
+def scan_every_call(console_ip):
+    # The lookup as it was before the interface table
+    ipv4_interfaces = []
+    for interface, snics in psutil.net_if_addrs().items():
+        for snic in snics:
+            if snic.family == socket.AF_INET:
+                ipv4_interfaces.append((snic.address, snic.netmask))
+    for i in ipv4_interfaces:
+        interface_ip_string = i[0] + "/" + i[1]
+        if ipaddress.IPv4Address(console_ip) in ipaddress.IPv4Network(interface_ip_string, False):
+            return i[0]
+
+
+def run(iterations: int, console_ip: str, fake_adapters: int) -> dict:
+    real = psutil.net_if_addrs
+    if fake_adapters:
+        def with_fakes():
+            addrs = dict(real())
+            for n in range(fake_adapters):
+                addrs[f"veth{n}"] = [Snic(socket.AF_INET, f"172.{16 + n // 250}.{n % 250}.1", "255.255.255.0")]
+            return addrs
+        psutil.net_if_addrs = with_fakes
+    try:
+        table = utilities.InterfaceTable()
+        results = {"scan every call": [], "interface table": []}
+        for _ in range(iterations):
+            start = time.perf_counter()
+            expected = scan_every_call(console_ip)
+            results["scan every call"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            match = table.lookup(console_ip)
+            results["interface table"].append(time.perf_counter() - start)
+            assert (match[0].address if match else None) == expected
+    finally:
+        psutil.net_if_addrs = real
+    print_report(
+        f"Local address lookup for {console_ip} ({iterations} lookups, {fake_adapters} fake adapters)",
+        results,
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare scanning every interface for the bind address with the cached interface table."
+    )
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--console-ip", default="127.0.0.1")
+    parser.add_argument("--fake-adapters", type=int, default=0)
+    args = parser.parse_args()
+    run(args.iterations, args.console_ip, args.fake_adapters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Drives a headless bridge with the simulated console, iPad and Reaper from
+# harness.simulators and reports recall-to-DAW latency, repeater throughput
+# and the bridge's CPU use. Save the results of one release with --save and
+# compare the next one against them with --baseline.
+#
+#   python -m benchmarks.bench_latency --recalls 500 --meter-rate 2000
+#   python -m benchmarks.bench_latency --save v4.json
+#   python -m benchmarks.bench_latency --baseline v4.json
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.common import print_report, summarize
+from harness.simulators import (
+    FakeReaper, HeadlessBridge, SimulatedConsole, SimulatedRepeaterClient, cue_name,
+)
+
+
+class Rig:
+    def __init__(self, base_port: int, mode: str, markers: int):
+        self.mode = mode
+        self.metrics_port = base_port + 6
+        self.console = SimulatedConsole(base_port, base_port + 1)
+        self.ipad = SimulatedRepeaterClient(base_port + 2, base_port + 3)
+        self.reaper = FakeReaper(base_port + 4, base_port + 5, markers)
+        self.bridge = HeadlessBridge(
+            "--console-type", "DiGiCo", "--daw-type", "Reaper",
+            "--console-ip", "127.0.0.1", "--console-port", str(base_port), "--receive-port", str(base_port + 1),
+            "--repeater", "--repeater-ip", "127.0.0.1",
+            "--repeater-port", str(base_port + 2), "--repeater-receive-port", str(base_port + 3),
+            "--reaper-ip", "127.0.0.1", "--reaper-port", str(base_port + 4),
+            "--reaper-receive-port", str(base_port + 5),
+            "--marker-mode", mode, "--metrics-port", str(self.metrics_port),
+        )
+
+    def start(self) -> None:
+        self.bridge.wait_for("console_connected")
+        self.reaper.transport(playing=False, recording=self.mode == "Recording")
+        time.sleep(0.2)
+
+    def recall(self, number: int, timeout: float = 2.0) -> Optional[float]:
+        # Time from the desk sending the recall to Reaper getting the marker
+        # command. Returns None if Reaper never hears about it.
+        if self.mode == "Recording":
+            name = cue_name(number)
+            arrived, stamp = self.reaper.expect(lambda a, p: a == "/lastmarker/name" and p[0] == name)
+        else:
+            arrived, stamp = self.reaper.expect(lambda a, p: a == "/marker" and p[0] == number)
+        sent = self.console.recall(number)
+        if not arrived.wait(timeout):
+            return None
+        return stamp[0] - sent
+
+    def macro(self, number: int, action: int, timeout: float = 2.0) -> Optional[float]:
+        arrived, stamp = self.reaper.expect(lambda a, p: a == "/action" and p[0] == action)
+        sent = self.console.press_macro(number)
+        if not arrived.wait(timeout):
+            return None
+        return stamp[0] - sent
+
+    def bridge_metrics(self) -> Dict:
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.metrics_port}/metrics.json", timeout=2) as response:
+            return json.load(response)
+
+    def close(self) -> None:
+        self.bridge.stop()
+        for peer in (self.console, self.ipad, self.reaper):
+            peer.close()
+
+
+def _measure_cpu(rig: Rig, work: Callable[[], None]) -> float:
+    # The bridge's CPU use while work() runs, in percent of one core
+    cpu, start = rig.bridge.cpu_seconds(), time.perf_counter()
+    work()
+    return (rig.bridge.cpu_seconds() - cpu) / (time.perf_counter() - start) * 100
+
+
+def _recalls(rig: Rig, count: int, markers: int, gap: float, samples: List[float]) -> int:
+    lost = 0
+    for i in range(count):
+        latency = rig.recall(i % markers + 1)
+        if latency is None:
+            lost += 1
+        else:
+            samples.append(latency)
+        time.sleep(gap)
+    return lost
+
+
+def _throughput(sent: int, delivered: int, seconds: float, cpu: float) -> Dict[str, float]:
+    return {
+        "sent": sent,
+        "delivered": delivered,
+        "delivered_per_s": delivered / seconds,
+        "loss_pct": 100 * (sent - delivered) / sent if sent else 0.0,
+        "cpu_pct": cpu,
+    }
+
+
+def run(base_port: int, mode: str, recalls: int, markers: int, meter_rate: int, duration: float,
+        gap: float) -> Dict:
+    rig = Rig(base_port, mode, markers)
+    latency = {"recall": [], "recall during meter flood": [], "macro": []}
+    lost = {}
+    throughput = {}
+    try:
+        rig.start()
+        cpu_idle = _measure_cpu(rig, lambda: time.sleep(2))
+
+        cpu_recall = _measure_cpu(
+            rig, lambda: lost.__setitem__("recall", _recalls(rig, recalls, markers, gap, latency["recall"]))
+        )
+        lost["macro"] = 0
+        for i in range(min(recalls, 100)):
+            # Alternate play and stop so the DAW state goes back and forth
+            sample = rig.macro(1, 1007) if i % 2 == 0 else rig.macro(2, 1016)
+            if sample is None:
+                lost["macro"] += 1
+            else:
+                latency["macro"].append(sample)
+            time.sleep(gap)
+
+        # Console meters through the repeater to the iPad, with recalls on top
+        meters_before = rig.ipad.meters
+        flood = {}
+
+        def console_flood():
+            flood["sent"] = rig.console.flood(meter_rate, duration)
+
+        def meter_phase():
+            thread = threading.Thread(target=console_flood)
+            thread.start()
+            start = time.perf_counter()
+            lost["recall during meter flood"] = _recalls(
+                rig, recalls, markers, max(gap, duration / recalls), latency["recall during meter flood"]
+            )
+            thread.join()
+            time.sleep(max(0.0, duration - (time.perf_counter() - start)) + 0.5)
+
+        cpu = _measure_cpu(rig, meter_phase)
+        throughput["console to iPad"] = _throughput(
+            flood["sent"], rig.ipad.meters - meters_before, duration, cpu
+        )
+
+        # iPad control changes through the repeater to the console
+        forwarded_before = rig.console.forwarded
+
+        def ipad_phase():
+            flood["sent"] = rig.ipad.flood(meter_rate, duration)
+            time.sleep(0.5)
+
+        cpu = _measure_cpu(rig, ipad_phase)
+        throughput["iPad to console"] = _throughput(
+            flood["sent"], rig.console.forwarded - forwarded_before, duration, cpu
+        )
+        stages = {
+            name: summary for name, summary in rig.bridge_metrics()["stages"].items()
+            if name.startswith(("end_to_end.", "console."))
+        }
+    finally:
+        rig.close()
+
+    print_report(f"Recall to DAW, {mode} mode ({recalls} recalls, {markers} markers in Reaper)", latency)
+    for name, count in lost.items():
+        if count:
+            print(f"{name}: {count} never reached Reaper")
+    print()
+    print(f"{'Repeater throughput':<24}{'sent':>9}{'msg/s':>10}{'loss %':>9}{'cpu %':>8}")
+    for name, t in throughput.items():
+        print(f"{name:<24}{t['sent']:>9}{t['delivered_per_s']:>10.0f}{t['loss_pct']:>9.2f}{t['cpu_pct']:>8.1f}")
+    print()
+    print(f"bridge cpu: idle {cpu_idle:.1f}%, during recalls {cpu_recall:.1f}%")
+    print("bridge stage timings (ms):")
+    for name, s in stages.items():
+        print(f"  {name:<52} p50 {s['p50_ms']:>8.3f}  p95 {s['p95_ms']:>8.3f}  max {s['max_ms']:>8.3f}")
+    return {
+        "mode": mode,
+        "latency": {name: summarize(samples) for name, samples in latency.items()},
+        "lost": lost,
+        "throughput": throughput,
+        "cpu": {"idle_pct": cpu_idle, "recalls_pct": cpu_recall},
+    }
+
+
+def compare(baseline: Dict, result: Dict) -> None:
+    # Prints how this run moved against a saved one
+    print()
+    print("Against baseline")
+    for name, now in result["latency"].items():
+        before = baseline["latency"].get(name)
+        if before:
+            print(f"  {name:<28} p50 {before['p50']:.3f} -> {now['p50']:.3f} ms"
+                  f"   p95 {before['p95']:.3f} -> {now['p95']:.3f} ms")
+    for name, now in result["throughput"].items():
+        before = baseline["throughput"].get(name)
+        if before:
+            print(f"  {name:<28} {before['delivered_per_s']:.0f} -> {now['delivered_per_s']:.0f} msg/s"
+                  f"   cpu {before['cpu_pct']:.1f} -> {now['cpu_pct']:.1f} %")
+    print(f"  {'idle cpu':<28} {baseline['cpu']['idle_pct']:.1f} -> {result['cpu']['idle_pct']:.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure recall-to-DAW latency, repeater throughput and CPU use of a headless bridge."
+    )
+    parser.add_argument("--base-port", type=int, default=39300)
+    parser.add_argument("--mode", choices=["PlaybackTrack", "Recording"], default="PlaybackTrack")
+    parser.add_argument("--recalls", type=int, default=200)
+    parser.add_argument("--markers", type=int, default=100, help="Markers in the fake Reaper project")
+    parser.add_argument("--meter-rate", type=int, default=2000, help="Messages per second in the floods")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds each flood lasts")
+    parser.add_argument("--gap", type=float, default=0.01, help="Seconds between recalls")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved with --save")
+    args = parser.parse_args()
+    result = run(args.base_port, args.mode, args.recalls, args.markers, args.meter_rate, args.duration, args.gap)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), result)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Measures how quickly the bridge notices a DiGiCo console going quiet and how
+# many probes it sends while the console is streaming versus idle. The
+# simulated console answers name queries and can stream meter traffic. Exits
+# non-zero if p95 detection is over the budget.
+#
+#   python -m benchmarks.bench_liveness --iterations 5
+import argparse
+import tempfile
+import threading
+import time
+
+from pubsub import pub
+
+from app_settings import SettingsSnapshot, settings
+from benchmarks.common import isolated_bridge, percentile, print_report
+from event_bus import bus, ConsoleConnected
+from harness.simulators import SimulatedConsole
+
+
+def _stream_meters(console: SimulatedConsole, streaming: threading.Event, stop: threading.Event) -> None:
+    # Sends a meter every 20 ms while streaming is set
+    while not stop.wait(0.02):
+        if streaming.is_set():
+            console.send("/Meters/Input/1", 0.5)
+
+
+def run(iterations: int, base_port: int, window: float, idle_threshold: float, timeout: float) -> dict:
+    settings.update(
+        console_type="DiGiCo",
+        console_ip="127.0.0.1",
+        console_port=base_port,
+        receive_port=base_port + 1,
+        forwarder_enabled=False,
+        reaper_port=base_port + 2,
+        reaper_receive_port=base_port + 3,
+        link_idle_threshold=idle_threshold,
+        link_timeout=timeout,
+    )
+    with tempfile.TemporaryDirectory() as prefs:
+        console = SimulatedConsole(base_port, base_port + 1)
+        streaming, stop_streaming = threading.Event(), threading.Event()
+        streamer = threading.Thread(target=_stream_meters, args=(console, streaming, stop_streaming), daemon=True)
+        streamer.start()
+        connected = threading.Event()
+        disconnected = threading.Event()
+
+        class Listener:
+            def connected(self, consolename, colour="green"):
+                connected.set()
+
+            def disconnected(self):
+                disconnected.set()
+
+        listener = Listener()
+        bus.subscribe(ConsoleConnected, listener.connected)
+        pub.subscribe(listener.disconnected, "console_disconnected")
+        bridge = isolated_bridge(prefs)
+        bridge.start_threads()
+        detection = []
+        try:
+            # Probe traffic while streaming versus while idle
+            if not connected.wait(5):
+                raise TimeoutError("Bridge never saw the fake console")
+            streaming.set()
+            time.sleep(0.2)
+            before = console.probes
+            time.sleep(window)
+            busy_probes = console.probes - before
+            streaming.clear()
+            time.sleep(0.2)
+            before = console.probes
+            time.sleep(window)
+            idle_probes = console.probes - before
+
+            # Time from the console's last datagram to the disconnect report
+            streaming.set()
+            for _ in range(iterations):
+                time.sleep(0.3)
+                disconnected.clear()
+                console.alive = False
+                start = time.perf_counter()
+                if not disconnected.wait(10):
+                    raise TimeoutError("Disconnect was never reported")
+                detection.append(time.perf_counter() - start)
+                connected.clear()
+                console.alive = True
+                if not connected.wait(5):
+                    raise TimeoutError("Bridge did not reconnect")
+        finally:
+            bridge.close_servers()
+            bus.unsubscribe(listener)
+            stop_streaming.set()
+            streamer.join()
+            console.close()
+        print_report(f"Disconnect detection ({iterations} outages, {idle_threshold} s idle + {timeout} s timeout)", {"detection": detection})
+        print(f"probes in {window:.0f} s: streaming {busy_probes}, idle {idle_probes}")
+        return {"detection": detection, "busy_probes": busy_probes, "idle_probes": idle_probes}
+
+
+def main():
+    defaults = SettingsSnapshot()
+    parser = argparse.ArgumentParser(
+        description="Measure how quickly a silent DiGiCo console is noticed and how often it is probed."
+    )
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--base-port", type=int, default=39200)
+    parser.add_argument("--window", type=float, default=5.0, help="Seconds to count probes for")
+    parser.add_argument("--idle-threshold", type=float, default=defaults.link_idle_threshold)
+    parser.add_argument("--timeout", type=float, default=defaults.link_timeout)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+    result = run(args.iterations, args.base_port, args.window, args.idle_threshold, args.timeout)
+    p95 = percentile(result["detection"], 95) * 1000
+    if p95 > args.budget_ms:
+        raise SystemExit(f"Detection p95 {p95:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Measures what logging costs the thread that handles console traffic. The
+# DiGiCo snapshot handler is timed with the old synchronous handlers (rotating
+# file plus stream, written to a temp directory) and with the queued
+# pipeline from logger_config. It also floods one call site to show the rate
+# limiter at work.
+#
+#   python -m benchmarks.bench_logging --iterations 5000
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+import consoles.digico as digico
+from app_settings import settings
+from benchmarks.common import print_report
+from logger_config import DeferredQueueHandler, RateLimitFilter, RingBufferHandler
+from metrics import CountingUDPClient
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+
+
+def _handlers(directory: str, name: str):
+    file_handler = RotatingFileHandler(os.path.join(directory, f"{name}.log"), maxBytes=1024 * 1024, backupCount=5)
+    file_handler.setFormatter(logging.Formatter(FORMAT))
+    stream_handler = logging.StreamHandler(open(os.path.join(directory, f"{name}.out"), "w"))
+    stream_handler.setLevel(logging.INFO)
+    stream_handler.setFormatter(logging.Formatter(FORMAT))
+    return [file_handler, stream_handler]
+
+
+def synchronous_logger(directory: str) -> logging.Logger:
+    # The handlers as they were attached before the queue
+    log = logging.getLogger("bench.sync")
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    for handler in _handlers(directory, "sync"):
+        log.addHandler(handler)
+    return log
+
+
+def queued_logger(directory: str, name: str, rate_limit: bool):
+    log = logging.getLogger(f"bench.{name}")
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    if rate_limit:
+        handler.addFilter(RateLimitFilter())
+    log.addHandler(handler)
+    listener = QueueListener(log_queue, *_handlers(directory, name), RingBufferHandler(),
+                             respect_handler_level=True)
+    listener.start()
+    return log, listener
+
+
+def _time_handler(console: digico.DiGiCo, log: logging.Logger, iterations: int) -> list:
+    digico.logger = log
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        console._request_snapshot_info(f"/Snapshots/Recall_Snapshot/{i % 500}", 1)
+        log.debug("Received malformed OSC message at address: %s", "/Snapshots/Recall_Snapshot")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(iterations: int) -> dict:
+    settings.update(forwarder_enabled=False)
+    original = digico.logger
+    console = digico.DiGiCo()
+    # The handler sends its name query with send_dgram, like the real client
+    console.console_client = CountingUDPClient("127.0.0.1", 9, "bench_sink")
+    with tempfile.TemporaryDirectory() as directory:
+        sync_log = synchronous_logger(directory)
+        unlimited_log, unlimited_listener = queued_logger(directory, "unlimited", rate_limit=False)
+        queued_log, listener = queued_logger(directory, "queued", rate_limit=True)
+        try:
+            results = {
+                "synchronous": _time_handler(console, sync_log, iterations),
+                "queued": _time_handler(console, unlimited_log, iterations),
+                "queued, rate limited": _time_handler(console, queued_log, iterations),
+            }
+        finally:
+            digico.logger = original
+            unlimited_listener.stop()
+            listener.stop()
+            for log in (sync_log, unlimited_log, queued_log):
+                for handler in list(log.handlers):
+                    handler.close()
+                    log.removeHandler(handler)
+        with open(os.path.join(directory, "queued.log")) as f:
+            written = sum(1 for _ in f)
+    print_report(f"Snapshot handler with logging ({iterations} messages)", results)
+    print(f"rate limited pipeline wrote {written} of {iterations * 2} records")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure what logging costs the thread that handles console traffic.")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
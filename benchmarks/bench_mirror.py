@@ -0,0 +1,122 @@
+# Several remotes connect through the repeater of a headless bridge and ask
+# for the fader of every channel, with and without the console mirror.
+# Reports how many of those queries reached the desk and how long a remote
+# waited for each answer. The mirror answers the remote that asked, while the
+# desk's own answer is relayed to the configured repeater.
+#
+#   python -m benchmarks.bench_mirror --remotes 4 --channels 96
+import argparse
+import socket
+import time
+from typing import Dict, List, Optional
+
+from pythonosc.osc_message import OscMessage
+from pythonosc.osc_message_builder import build_msg
+
+from benchmarks.common import print_report
+from harness.simulators import FakeReaper, HeadlessBridge, SimulatedConsole, SimulatedRepeaterClient
+
+
+class QueryCountingConsole(SimulatedConsole):
+    # Answers a query for any fader with its level, like the desk does
+    def __init__(self, port: int, bridge_port: int):
+        self.queries = 0
+        super().__init__(port, bridge_port)
+
+    def handle(self, address: str, params: list) -> None:
+        if address.endswith("/fader/?"):
+            self.queries += 1
+            self.send(address[:-2], -10.0)
+        else:
+            super().handle(address, params)
+
+
+def _fader(channel: int) -> str:
+    return f"/Input_Channels/{channel}/fader"
+
+
+def _answer(remote: socket.socket, address: str, timeout: float = 2.0) -> Optional[float]:
+    # When the answer to address reached the remote, skipping the values a
+    # new remote is synced with first
+    deadline = time.perf_counter() + timeout
+    while True:
+        remote.settimeout(max(0.001, deadline - time.perf_counter()))
+        try:
+            data = remote.recv(65535)
+        except socket.timeout:
+            return None
+        if OscMessage(data).address == address:
+            return time.perf_counter()
+
+
+def run_once(base_port: int, mirror: bool, remotes: int, channels: int) -> Dict:
+    console = QueryCountingConsole(base_port, base_port + 1)
+    ipad = SimulatedRepeaterClient(base_port + 2, base_port + 3)
+    reaper = FakeReaper(base_port + 4, base_port + 5, 0)
+    bridge = HeadlessBridge(
+        "--console-type", "DiGiCo", "--daw-type", "Reaper",
+        "--console-ip", "127.0.0.1", "--console-port", str(base_port), "--receive-port", str(base_port + 1),
+        "--repeater", "--repeater-ip", "127.0.0.1",
+        "--repeater-port", str(base_port + 2), "--repeater-receive-port", str(base_port + 3),
+        "--reaper-ip", "127.0.0.1", "--reaper-port", str(base_port + 4),
+        "--reaper-receive-port", str(base_port + 5),
+        *([] if mirror else ["--no-mirror"]),
+    )
+    sockets: List[socket.socket] = []
+    waits: List[float] = []
+    try:
+        bridge.wait_for("console_connected")
+        # The desk reports every fader once, as it does when it comes online
+        for channel in range(1, channels + 1):
+            console.send(_fader(channel), -10.0)
+        time.sleep(0.5)
+        for _ in range(remotes):
+            remote = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            remote.bind(("127.0.0.1", 0))
+            sockets.append(remote)
+            for channel in range(1, channels + 1):
+                address = _fader(channel)
+                if not mirror:
+                    arrived, stamp = ipad.expect(lambda a, p, address=address: a == address)
+                sent = time.perf_counter()
+                remote.sendto(build_msg(address + "/?", []).dgram, ("127.0.0.1", base_port + 3))
+                if mirror:
+                    answered = _answer(remote, address)
+                else:
+                    answered = stamp[0] if arrived.wait(2.0) else None
+                if answered is not None:
+                    waits.append(answered - sent)
+    finally:
+        bridge.stop()
+        for remote in sockets:
+            remote.close()
+        for peer in (console, ipad, reaper):
+            peer.close()
+    return {"queries": console.queries, "waits": waits}
+
+
+def run(base_port: int, remotes: int, channels: int) -> Dict[str, Dict]:
+    results = {
+        "console answers": run_once(base_port, False, remotes, channels),
+        "mirror answers": run_once(base_port, True, remotes, channels),
+    }
+    print(f"{remotes} remotes each querying {channels} faders")
+    for name, result in results.items():
+        print(f"{name:<24}{result['queries']:>6} queries reached the console")
+    print_report("Query to answer at the remote", {name: r["waits"] for name, r in results.items()})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count the remote queries that reach the console with and without the mirror, and time the answers."
+    )
+    parser.add_argument("--base-port", type=int, default=39600)
+    parser.add_argument("--remotes", type=int, default=4)
+    parser.add_argument("--channels", type=int, default=96)
+    args = parser.parse_args()
+    run(args.base_port, args.remotes, args.channels)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compares encoding the bridge's outbound messages with pythonosc's message
+# builder against osc_encoder's templates, and checks both produce the same
+# bytes. The sends themselves aren't timed, only building the datagram.
+#
+#   python -m benchmarks.bench_osc_encode --iterations 200000
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+from pythonosc.osc_message_builder import OscMessageBuilder
+
+from consoles import digico
+from daws import reaper
+from osc_encoder import OscEncoder, OscTemplate
+
+# (name, address, arguments, the template the bridge uses for it)
+MESSAGES: List[Tuple[str, str, list, OscTemplate]] = [
+    ("reaper play", "/action", [1007], reaper.ACTION),
+    ("reaper go to marker", "/marker", [42], reaper.GO_TO_MARKER),
+    ("reaper marker name", "/lastmarker/name", ["12.5 Scene 4 - Ballroom"], reaper.LAST_MARKER_NAME),
+    ("snapshot name query", "/Snapshots/name/?", [125], digico.SNAPSHOT_NAME_QUERY),
+    ("heartbeat", "/Console/Name/?", [], OscTemplate("/Console/Name/?")),
+    ("repeated fader move", "/Input_Channels/12/fader", [-12.5], OscTemplate("/Input_Channels/12/fader", "f")),
+    ("repeated snapshot name", "/Snapshots/name", [3, 1250, 0, "Scene 4"], OscTemplate("/Snapshots/name", "iiis")),
+]
+
+
+def pythonosc_encode(address: str, args: list) -> bytes:
+    # What SimpleUDPClient.send_message does before sending
+    builder = OscMessageBuilder(address=address)
+    for arg in args:
+        builder.add_arg(arg)
+    return builder.build().dgram
+
+
+def _ns_per_call(func: Callable[[], bytes], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def run(iterations: int) -> Dict[str, Dict[str, float]]:
+    encoder = OscEncoder()
+    results = {}
+    for name, address, args, template in MESSAGES:
+        expected = pythonosc_encode(address, args)
+        assert template.encode(*args) == expected, f"{name}: template bytes differ from pythonosc"
+        assert encoder.encode(address, args) == expected, f"{name}: encoder bytes differ from pythonosc"
+        precompiled = template.encode(*args)
+        results[name] = {
+            "pythonosc": _ns_per_call(lambda: pythonosc_encode(address, args), iterations),
+            "encoder": _ns_per_call(lambda: encoder.encode(address, args), iterations),
+            "template": _ns_per_call(lambda: template.encode(*args), iterations),
+            "precompiled": _ns_per_call(lambda: precompiled, iterations),
+        }
+    print(f"Encoding one message, ns per call ({iterations} calls each, bytes identical to pythonosc)")
+    print(f"{'':<26}{'pythonosc':>11}{'encoder':>10}{'template':>10}{'precompiled':>13}{'speedup':>9}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['pythonosc']:>11.0f}{r['encoder']:>10.0f}{r['template']:>10.0f}"
+              f"{r['precompiled']:>13.0f}{r['pythonosc'] / r['template']:>8.1f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare encoding outbound OSC with pythonosc against the osc_encoder templates."
+    )
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+    run(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
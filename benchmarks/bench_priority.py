@@ -0,0 +1,98 @@
+# Floods a headless bridge with console meters for the repeater at rising
+# rates and times transport macros and snapshot recalls to Reaper on top of
+# the flood. Reports control latency at each rate, how many meters reached
+# the iPad and how many the bridge shed.
+#
+#   python -m benchmarks.bench_priority --rates 0 5000 20000 50000
+import argparse
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.bench_latency import Rig
+from benchmarks.common import summarize
+
+
+def _control(rig: Rig, duration: float, gap: float, samples: List[float]) -> int:
+    # Alternates play and stop macros with recalls until duration is up
+    lost = 0
+    i = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        if i % 3 == 2:
+            sample = rig.recall(i % 100 + 1)
+        else:
+            sample = rig.macro(1, 1007) if i % 3 == 0 else rig.macro(2, 1016)
+        if sample is None:
+            lost += 1
+        else:
+            samples.append(sample)
+        i += 1
+        time.sleep(gap)
+    return lost
+
+
+def run_rate(rig: Rig, rate: int, duration: float, gap: float) -> Dict:
+    samples: List[float] = []
+    flood = {"sent": 0}
+    meters_before = rig.ipad.meters
+    shed_before = _shed(rig)
+    thread = None
+    if rate:
+        thread = threading.Thread(target=lambda: flood.__setitem__("sent", rig.console.flood(rate, duration)))
+        thread.start()
+    lost = _control(rig, duration, gap, samples)
+    if thread:
+        thread.join()
+    time.sleep(1.0)
+    return {
+        "rate": rate,
+        "control": summarize(samples),
+        "lost": lost,
+        "sent": flood["sent"],
+        "meters": rig.ipad.meters - meters_before,
+        "shed": _shed(rig) - shed_before,
+    }
+
+
+def _shed(rig: Rig) -> int:
+    lanes = rig.bridge_metrics()["gauges"].get("console_lanes")
+    if not isinstance(lanes, dict):
+        return 0
+    return sum(lane["shed"] for lane in lanes.values())
+
+
+def run(base_port: int, rates: List[int], duration: float, gap: float) -> List[Dict]:
+    rig = Rig(base_port, "PlaybackTrack", 100)
+    results = []
+    try:
+        rig.start()
+        for rate in rates:
+            results.append(run_rate(rig, rate, duration, gap))
+    finally:
+        rig.close()
+    print(f"Transport macros and recalls to Reaper during a console meter flood ({duration:.0f} s per rate)")
+    print(f"{'meters/s':>9}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms){'lost':>6}"
+          f"{'meters sent':>13}{'relayed':>9}{'shed':>8}")
+    for r in results:
+        c = r["control"]
+        print(f"{r['rate']:>9}{c['n']:>6}{c['p50']:>9.3f}{c['p95']:>9.3f}{c['p99']:>9.3f}{c['max']:>9.3f}"
+              f"      {r['lost']:>6}{r['sent']:>13}{r['meters']:>9}{r['shed']:>8}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time transport macros and recalls to Reaper during a console meter flood."
+    )
+    parser.add_argument("--base-port", type=int, default=39900)
+    parser.add_argument("--rates", type=int, nargs="+", default=[0, 5000, 20000, 50000],
+                        help="Meter messages per second the console sends")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of flood per rate")
+    parser.add_argument("--gap", type=float, default=0.02, help="Seconds between control messages")
+    args = parser.parse_args()
+    run(args.base_port, args.rates, args.duration, args.gap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Drives the ProTools backend through cue, marker and transport sequences
+# against the local PTSL stand-in and reports per-operation latency. The
+# handlers are called directly so the numbers are the backend's own cost.
+#
+#   python -m benchmarks.bench_protools --iterations 200 --delay-ms 2
+import argparse
+import time
+
+from benchmarks.common import print_report
+from daws import ProTools
+from harness.ptsl_server import PtslStandIn, StandInServer
+
+
+def run(iterations: int, delay: float, fail_rate: float) -> dict:
+    servicer = PtslStandIn(delay=delay, fail_rate=fail_rate, seed=1)
+    results = {"cue": [], "marker": [], "transport rec": [], "transport stop": [], "transport play": []}
+    failures = 0
+    with StandInServer(servicer, "localhost:0") as server:
+        daw = ProTools(address=server.address)
+        daw._open_protools_connection()
+        try:
+            for i in range(iterations):
+                start = time.perf_counter()
+                daw._handle_cue_load(cue=f"{i + 1}.0 Cue {i + 1}")
+                results["cue"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                try:
+                    daw._place_marker_with_name(marker_name=f"Marker {i + 1}")
+                except Exception:
+                    failures += 1
+                results["marker"].append(time.perf_counter() - start)
+
+                for action in ("rec", "stop", "play", "stop"):
+                    start = time.perf_counter()
+                    daw._incoming_transport_action(transport_action=action)
+                    results[f"transport {action}"].append(time.perf_counter() - start)
+        finally:
+            daw.shutdown_servers()
+    print_report(
+        f"ProTools backend vs PTSL stand-in ({iterations} iterations, "
+        f"{delay * 1000:.1f} ms delay, {fail_rate:.0%} failures)",
+        results,
+    )
+    print(f"marker failures: {failures}, stand-in calls: {servicer.calls}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure per-operation latency of the Pro Tools backend against the PTSL stand-in."
+    )
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    run(args.iterations, args.delay_ms / 1000, args.fail_rate)
+
+
+if __name__ == "__main__":
+    main()
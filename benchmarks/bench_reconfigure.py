@@ -0,0 +1,98 @@
+# Measures the reconfiguration gap: how long each component is not serving
+# after a settings change, and checks that components whose settings did not
+# change keep their servers bound throughout.
+#
+#   python -m benchmarks.bench_reconfigure
+import argparse
+import tempfile
+import time
+
+from app_settings import settings
+from benchmarks.common import isolated_bridge, print_report
+from utilities import DawConsoleBridge
+
+
+def _servers(bridge: DawConsoleBridge) -> dict:
+    return {
+        "console": getattr(bridge.console, "digico_osc_server", None),
+        "repeater": getattr(bridge.console, "repeater_osc_server", None),
+        "daw": getattr(bridge.daw, "reaper_osc_server", None),
+    }
+
+
+def _wait_serving(bridge: DawConsoleBridge, before: dict, timeout: float = 5.0) -> None:
+    # Waits until every server is bound, and the restarted ones are new objects
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        now = _servers(bridge)
+        if all(server is not None for server in now.values()) and any(
+            now[name] is not before[name] for name in now
+        ):
+            return
+        time.sleep(0.0005)
+    raise TimeoutError("Servers did not come back")
+
+
+def run(iterations: int, base_port: int) -> dict:
+    settings.update(
+        console_ip="127.0.0.1",
+        console_port=base_port,
+        receive_port=base_port + 1,
+        forwarder_enabled=True,
+        repeater_ip="127.0.0.1",
+        repeater_port=base_port + 2,
+        repeater_receive_port=base_port + 3,
+        reaper_port=base_port + 4,
+        reaper_receive_port=base_port + 5,
+        daw_type="Reaper",
+        console_type="DiGiCo",
+    )
+    with tempfile.TemporaryDirectory() as prefs:
+        bridge = isolated_bridge(prefs)
+        bridge.start_threads()
+        _wait_serving(bridge, {"console": None, "repeater": None, "daw": None})
+
+        scenarios = {
+            "repeater port": lambda i: {"repeater_receive_port": base_port + 3 + (i % 2) * 10},
+            "daw port": lambda i: {"reaper_receive_port": base_port + 5 + (i % 2) * 10},
+            "console port": lambda i: {"receive_port": base_port + 1 + (i % 2) * 10},
+        }
+        gaps = {name: [] for name in scenarios}
+        kept_bound = True
+        try:
+            for name, change in scenarios.items():
+                for i in range(1, iterations + 1):
+                    before = _servers(bridge)
+                    settings.update(**change(i))
+                    start = time.perf_counter()
+                    changed = bridge.apply_configuration()
+                    _wait_serving(bridge, before)
+                    gaps[name].append(time.perf_counter() - start)
+                    after = _servers(bridge)
+                    for component in before:
+                        untouched = component not in changed and not (
+                            component == "repeater" and "console" in changed
+                        )
+                        if untouched and after[component] is not before[component]:
+                            kept_bound = False
+        finally:
+            bridge.close_servers()
+        print_report(f"Reconfiguration gap ({iterations} changes each)", gaps)
+        print(f"unchanged components kept serving: {kept_bound}")
+        return {"gaps": gaps, "kept_bound": kept_bound}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how long each component stops serving after a settings change."
+    )
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--base-port", type=int, default=39100)
+    args = parser.parse_args()
+    result = run(args.iterations, args.base_port)
+    if not result["kept_bound"]:
+        raise SystemExit("A component was restarted although its settings did not change")
+
+
+if __name__ == "__main__":
+    main()
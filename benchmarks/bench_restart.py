@@ -0,0 +1,123 @@
+# Measures a full bridge restart, close_servers() followed by start_threads()
+# until every server is bound again, and checks that each cycle leaves no
+# threads or sockets behind. The main pairing drives a backup Reaper too,
+# which must come back once per restart. Exits non-zero if p95 is over the
+# budget or anything leaked.
+#
+#   python -m benchmarks.bench_restart --iterations 20
+import argparse
+import gc
+import tempfile
+import threading
+import time
+
+import psutil
+
+from app_settings import DawSettings, settings
+from benchmarks.common import isolated_bridge, percentile, print_report
+from event_bus import bus
+from utilities import DawConsoleBridge
+
+
+def _bound(bridge: DawConsoleBridge) -> bool:
+    return all(
+        server is not None
+        for server in (
+            getattr(bridge.console, "digico_osc_server", None),
+            getattr(bridge.console, "repeater_osc_server", None),
+            *(getattr(daw, "reaper_osc_server", None) for daw in bridge.main.daws),
+        )
+    )
+
+
+def _wait_bound(bridge: DawConsoleBridge, timeout: float = 5.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while not _bound(bridge):
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Servers did not come up")
+        time.sleep(0.0005)
+
+
+def _resources(process: psutil.Process) -> tuple:
+    return threading.active_count(), process.num_fds()
+
+
+def _duplicated(bridge: DawConsoleBridge) -> bool:
+    # One backup DAW, and one bus subscriber for each DAW
+    subscribers = [s["subscriber"] for s in bus.stats()]
+    return len(bridge.main.extra_daws) != 1 or any(
+        subscribers.count(daw.subscriber_name) != 1 for daw in bridge.main.daws
+    )
+
+
+def run(iterations: int, base_port: int) -> dict:
+    settings.update(
+        console_type="DiGiCo",
+        daw_type="Reaper",
+        console_ip="127.0.0.1",
+        console_port=base_port,
+        receive_port=base_port + 1,
+        forwarder_enabled=True,
+        repeater_ip="127.0.0.1",
+        repeater_port=base_port + 2,
+        repeater_receive_port=base_port + 3,
+        reaper_port=base_port + 4,
+        reaper_receive_port=base_port + 5,
+    )
+    with tempfile.TemporaryDirectory() as prefs:
+        process = psutil.Process()
+        bridge = isolated_bridge(prefs)
+        bridge.main.extra_daw_settings["Backup"] = DawSettings(
+            settings, daw_type="Reaper", reaper_ip="127.0.0.1",
+            reaper_port=base_port + 6, reaper_receive_port=base_port + 7,
+        )
+        bridge.start_threads()
+        _wait_bound(bridge)
+        # The baseline is taken after one shutdown, when the bridge is left
+        # holding a stopped backend and its UDP clients
+        bridge.close_servers()
+        gc.collect()
+        baseline = _resources(process)
+        bridge.start_threads()
+        _wait_bound(bridge)
+        results = {"shutdown": [], "restart": []}
+        duplicated = False
+        for _ in range(iterations):
+            start = time.perf_counter()
+            bridge.close_servers()
+            results["shutdown"].append(time.perf_counter() - start)
+            bridge.start_threads()
+            _wait_bound(bridge)
+            results["restart"].append(time.perf_counter() - start)
+            duplicated = duplicated or _duplicated(bridge)
+        bridge.close_servers()
+        # Old backends hold their UDP clients in reference cycles with their
+        # dispatchers, so their sockets are released on the next collection
+        gc.collect()
+        leftover = _resources(process)
+        print_report(f"Bridge restart ({iterations} cycles)", results)
+        print(f"threads: {baseline[0]} before, {leftover[0]} after; fds: {baseline[1]} before, {leftover[1]} after")
+        print(f"DAWs duplicated across restarts: {duplicated}")
+        return {**results, "leaked": leftover != baseline, "duplicated": duplicated}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure a full bridge restart and check that nothing leaks across restarts."
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--base-port", type=int, default=39400)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    args = parser.parse_args()
+    result = run(args.iterations, args.base_port)
+    p95 = percentile(result["restart"], 95) * 1000
+    if p95 > args.budget_ms:
+        raise SystemExit(f"Restart p95 {p95:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    if result["leaked"]:
+        raise SystemExit("Threads or sockets leaked across restarts")
+    if result["duplicated"]:
+        raise SystemExit("A restart left a DAW behind or started it twice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Seeds a fake Reaper with markers for the cue list of a simulated DiGiCo
+# through a headless bridge, for an empty session, a half seeded one and one
+# that already has every cue. Reports how long each took and how many
+# datagrams reached Reaper, next to the three per cue that placing every
+# marker on its own would take.
+#
+#   python -m benchmarks.bench_seed --cues 300
+import argparse
+import json
+import socket
+import time
+from typing import Dict, List
+
+from harness.simulators import FakeReaper, HeadlessBridge, SimulatedConsole, cue_name
+
+
+def _seed(bridge: HeadlessBridge, control: socket.socket, timeout: float = 30.0) -> Dict:
+    seen = len(bridge.events)
+    control.sendall((json.dumps({"command": "seed_markers"}) + "\n").encode())
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for event in bridge.events[seen:]:
+            if event["event"] == "markers_seeded":
+                return event
+        time.sleep(0.01)
+    raise TimeoutError("Bridge never reported markers_seeded")
+
+
+def run_once(base_port: int, cues: int, existing: int) -> Dict:
+    console = SimulatedConsole(base_port, base_port + 1, snapshots=cues)
+    reaper = FakeReaper(base_port + 4, base_port + 5, existing)
+    bridge = HeadlessBridge(
+        "--console-type", "DiGiCo", "--daw-type", "Reaper",
+        "--console-ip", "127.0.0.1", "--console-port", str(base_port), "--receive-port", str(base_port + 1),
+        "--no-repeater", "--reaper-ip", "127.0.0.1", "--reaper-port", str(base_port + 4),
+        "--reaper-receive-port", str(base_port + 5), "--worker", "--status-port", str(base_port + 6),
+    )
+    try:
+        bridge.wait_for("console_connected")
+        reaper.transport(playing=False, recording=False)
+        time.sleep(0.2)
+        with socket.create_connection(("127.0.0.1", base_port + 6)) as control:
+            before = reaper.received
+            start = time.perf_counter()
+            result = _seed(bridge, control)
+            elapsed = time.perf_counter() - start
+            time.sleep(0.2)
+        datagrams = reaper.received - before
+        expected = {cue_name(n) for n in range(1, cues + 1)}
+        missing = expected - set(reaper.markers.values())
+    finally:
+        bridge.stop()
+        for peer in (console, reaper):
+            peer.close()
+    return {**result, "seconds": elapsed, "datagrams": datagrams, "missing": len(missing)}
+
+
+def run(base_port: int, cues: int) -> List[Dict]:
+    results = []
+    for existing in (0, cues // 2, cues):
+        result = run_once(base_port, cues, existing)
+        result["existing"] = existing
+        results.append(result)
+    print(f"Seeding Reaper from a {cues} cue console")
+    print(f"{'markers before':<16}{'added':>7}{'present':>9}{'seconds':>9}{'datagrams':>11}"
+          f"{'one by one':>12}{'missing':>9}")
+    for r in results:
+        print(f"{r['existing']:<16}{r['added']:>7}{r['present']:>9}{r['seconds']:>9.2f}{r['datagrams']:>11}"
+              f"{3 * cues:>12}{r['missing']:>9}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time seeding a fake Reaper with markers for a simulated DiGiCo's cue list."
+    )
+    parser.add_argument("--base-port", type=int, default=39700)
+    parser.add_argument("--cues", type=int, default=300)
+    args = parser.parse_args()
+    run(args.base_port, args.cues)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Scrolls a simulated DiGiCo through runs of snapshots faster than the
+# settle window, with Reaper recording and a headless bridge in Recording
+# mode, and counts what reaches Reaper with and without settling. With a
+# settle window each run should leave one marker, named for the last
+# snapshot of the run.
+#
+#   python -m benchmarks.bench_settle --runs 10 --run-length 20 --gap-ms 30
+import argparse
+import time
+from typing import Dict, List
+
+from harness.simulators import FakeReaper, HeadlessBridge, SimulatedConsole, cue_name
+
+
+def run_once(base_port: int, settle: float, runs: int, run_length: int, gap: float) -> Dict:
+    console = SimulatedConsole(base_port, base_port + 1)
+    reaper = FakeReaper(base_port + 4, base_port + 5, 0)
+    bridge = HeadlessBridge(
+        "--console-type", "DiGiCo", "--daw-type", "Reaper",
+        "--console-ip", "127.0.0.1", "--console-port", str(base_port), "--receive-port", str(base_port + 1),
+        "--no-repeater", "--reaper-ip", "127.0.0.1", "--reaper-port", str(base_port + 4),
+        "--reaper-receive-port", str(base_port + 5), "--marker-mode", "Recording",
+        "--cue-settle", str(settle),
+    )
+    last_cues: List[str] = []
+    try:
+        bridge.wait_for("console_connected")
+        reaper.transport(playing=True, recording=True)
+        time.sleep(0.2)
+        before = reaper.received
+        snapshot = 0
+        for _ in range(runs):
+            for _ in range(run_length):
+                snapshot += 1
+                console.recall(snapshot)
+                time.sleep(gap)
+            last_cues.append(cue_name(snapshot))
+            # The operator stops on a cue for a moment
+            time.sleep(max(settle, 0.05) + 0.3)
+        datagrams = reaper.received - before
+    finally:
+        bridge.stop()
+        for peer in (console, reaper):
+            peer.close()
+    names = [name for name in reaper.markers.values() if name]
+    return {
+        "recalls": runs * run_length,
+        "markers": len(names),
+        "datagrams": datagrams,
+        "landed": sum(cue in names for cue in last_cues),
+    }
+
+
+def run(base_port: int, settle: float, runs: int, run_length: int, gap: float) -> Dict[str, Dict]:
+    results = {
+        "no settling": run_once(base_port, 0.0, runs, run_length, gap),
+        f"{settle * 1000:.0f} ms settle": run_once(base_port, settle, runs, run_length, gap),
+    }
+    print(f"{runs} runs of {run_length} recalls {gap * 1000:.0f} ms apart, Reaper recording")
+    print(f"{'':<18}{'recalls':>9}{'markers':>9}{'datagrams':>11}{'runs ending on a marker':>25}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['recalls']:>9}{r['markers']:>9}{r['datagrams']:>11}{r['landed']:>19}/{runs}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count the markers a run of quick recalls leaves in Reaper with and without a settle window."
+    )
+    parser.add_argument("--base-port", type=int, default=39800)
+    parser.add_argument("--settle-ms", type=float, default=250.0)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--run-length", type=int, default=20)
+    parser.add_argument("--gap-ms", type=float, default=30.0, help="Time between recalls within a run")
+    args = parser.parse_args()
+    run(args.base_port, args.settle_ms / 1000, args.runs, args.run_length, args.gap_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
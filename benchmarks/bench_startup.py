@@ -0,0 +1,62 @@
+# Measures how long it takes to import the bridge and load the selected
+# backends, and which heavy dependencies come along for the ride. Each run is
+# a fresh interpreter so nothing is cached between samples.
+#
+#   python -m benchmarks.bench_startup --console DiGiCo --daw Reaper
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import print_report
+
+HEAVY_MODULES = ["ptsl", "grpc", "google.protobuf", "asn1", "pythonosc", "setuptools", "numpy"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import utilities
+from consoles import CONSOLES
+from daws import DAWS
+CONSOLES[sys.argv[1]].load()
+DAWS[sys.argv[2]].load()
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def run(console: str, daw: str, repeat: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    modules = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, console, daw],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(report["elapsed"])
+        modules = report["modules"]
+    print_report(f"Bridge import with {console} + {daw} ({repeat} runs)", {"startup": samples})
+    loaded = [m for m in HEAVY_MODULES if m in modules]
+    print(f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+    return {"startup": samples, "heavy_modules": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how long importing the bridge and loading the selected backends takes."
+    )
+    parser.add_argument("--console", default="DiGiCo")
+    parser.add_argument("--daw", default="Reaper")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.console, args.daw, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
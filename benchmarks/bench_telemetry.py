@@ -0,0 +1,89 @@
+# Feeds console parameter traffic through the telemetry recorder as fast as
+# one thread can, which is far more than a console sends, and reports what
+# recording adds to each forwarded message, how fast the writer thread
+# stores rows and how long a fader history query takes afterwards.
+#
+#   python -m benchmarks.bench_telemetry --messages 1000000
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from supervisor import CancellationToken
+from telemetry import Telemetry
+from telemetry_store import TelemetryReader, fader_history
+
+
+def _traffic(count: int, channels: int):
+    # Fader, mute and gain moves spread over the input channels
+    rng = random.Random(1)
+    for _ in range(count):
+        channel = rng.randint(1, channels)
+        kind = rng.random()
+        if kind < 0.8:
+            yield f"/Input_Channels/{channel}/fader", (rng.uniform(-90.0, 10.0),)
+        elif kind < 0.9:
+            yield f"/Input_Channels/{channel}/mute", (rng.randint(0, 1),)
+        else:
+            yield f"/Input_Channels/{channel}/Channel_Input/gain", (rng.uniform(-20.0, 60.0),)
+
+
+def _ns_per_record(recorder: Telemetry, messages: list) -> float:
+    start = time.perf_counter()
+    for address, args in messages:
+        recorder.record("", address, args)
+    return (time.perf_counter() - start) / len(messages) * 1e9
+
+
+def run(count: int, channels: int) -> Dict[str, float]:
+    messages = list(_traffic(count, channels))
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        directory = os.path.join(root, "telemetry")
+        recorder = Telemetry()
+        results["record, not recording (ns)"] = _ns_per_record(recorder, messages)
+
+        token = CancellationToken()
+        writer = threading.Thread(target=recorder.run, args=(directory, token))
+        writer.start()
+        while not recorder.active:
+            time.sleep(0.01)
+        started = time.perf_counter()
+        results["record, recording (ns)"] = _ns_per_record(recorder, messages)
+        token.cancel()
+        writer.join()
+        elapsed = time.perf_counter() - started
+        results["rows stored per second"] = count / elapsed
+
+        reader = TelemetryReader(directory)
+        stored = sum(reader.counts().values())
+        assert stored == count, f"{stored} rows stored, {count} sent"
+        start = time.perf_counter()
+        times, values = fader_history(reader, 12)
+        results["fader 12 history query (ms)"] = (time.perf_counter() - start) * 1000
+        middle = times[len(times) // 2]
+        start = time.perf_counter()
+        fader_history(reader, 12, middle, middle + 1.0)
+        results["fader 12, one second (ms)"] = (time.perf_counter() - start) * 1000
+        results["segments"] = len(reader.segments())
+    print(f"Telemetry recording of {count} parameter changes on {channels} channels, all rows read back")
+    for name, value in results.items():
+        print(f"{name:<32}{value:>14,.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure what recording console telemetry costs and how fast a fader history query is."
+    )
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--channels", type=int, default=128)
+    args = parser.parse_args()
+    run(args.messages, args.channels)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    # Nearest-rank percentile of an unsorted list of samples
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    # Latency summary in milliseconds for a list of durations in seconds
+    ms = [s * 1000 for s in samples]
+    return {
+        "n": len(ms),
+        "min": min(ms) if ms else float("nan"),
+        "p50": percentile(ms, 50),
+        "p95": percentile(ms, 95),
+        "p99": percentile(ms, 99),
+        "max": max(ms) if ms else float("nan"),
+        "mean": statistics.fmean(ms) if ms else float("nan"),
+    }
+
+
+def timed(func: Callable, *args, **kwargs) -> float:
+    # Runs func once and returns its wall-clock duration in seconds
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def print_report(title: str, results: Dict[str, List[float]]) -> None:
+    print(title)
+    print(f"{'':<24}{'n':>6}{'min':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, samples in results.items():
+        s = summarize(samples)
+        print(
+            f"{name:<24}{s['n']:>6}{s['min']:>9.3f}{s['p50']:>9.3f}"
+            f"{s['p95']:>9.3f}{s['p99']:>9.3f}{s['max']:>9.3f}"
+        )
+
+
+def isolated_bridge(directory: str):
+    # A DawConsoleBridge with its preferences file, journal and metrics in
+    # directory rather than the user's, so the settings a benchmark applies
+    # are the ones it runs with and its cues never reach the show journal.
+    # It also leaves a local Reaper's ini file alone.
+    from daws.reaper import Reaper
+    from utilities import DawConsoleBridge
+    Reaper.validate_prefs = False
+    return DawConsoleBridge(os.path.join(directory, "settingsV3.ini"), directory)
@@ -0,0 +1,211 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from configparser import ConfigParser
+from typing import Any, Dict, List, Optional, Tuple
+
+import appdirs
+from pubsub import pub
+
+from app_settings import settings
+from backend_registry import Backend
+from consoles import CONSOLES
+from daws import DAWS
+from event_bus import bus, ConsoleConnected
+from logger_config import logger
+
+# main.py hands the rest of the command line to headless.py when it gets this
+# flag, which is how a frozen build runs its own worker
+HEADLESS_FLAG = "--headless"
+# Seconds to wait for a newly started worker to open its status socket
+WORKER_START_TIMEOUT = 10.0
+# Shown until the worker reports a console type this build knows
+UNKNOWN_CONSOLE = Backend("Unknown", "consoles.console", "Console")
+
+
+def worker_command(port: int) -> List[str]:
+    flags = ["--worker", "--quiet", "--status-port", str(port)]
+    if getattr(sys, "frozen", False):
+        return [sys.executable, HEADLESS_FLAG, *flags]
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "headless.py"), *flags]
+
+
+class BridgeClient:
+    # The GUI's handle on the bridge, which runs in a worker process so the
+    # network threads never wait for the wx main loop. The worker is headless
+    # mode taking commands on its status socket. Status lines from it are
+    # republished on this process's bus and pubsub topics, so the window
+    # listens to them as it did when the bridge ran in the same process. If
+    # the GUI dies the worker keeps running, and the next GUI attaches to it.
+    def __init__(self):
+        self.process: Optional[subprocess.Popen] = None
+        self._socket: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._closing = False
+        self._stopped = threading.Event()
+        self.load_preferences()
+
+    @staticmethod
+    def load_preferences() -> None:
+        # The worker owns the preferences file, the GUI only reads it for
+        # the window and the preferences panel
+        path = os.path.join(appdirs.user_config_dir("Digico-Reaper Link", "Justin Stasiw"), "settingsV3.ini")
+        if not os.path.isfile(path):
+            return
+        try:
+            config = ConfigParser()
+            config.read(path)
+            settings.update_from_config(config)
+        except Exception as e:
+            logger.error(f"Failed to read config file: {e}")
+
+    @property
+    def console(self) -> Backend:
+        # Registry entries carry the type and supported features the window needs
+        return CONSOLES.get(settings.console_type, UNKNOWN_CONSOLE)
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="bridge-client", daemon=True).start()
+
+    def _connect(self) -> socket.socket:
+        # Attaches to a worker left running by an earlier GUI, or starts one
+        address = ("127.0.0.1", settings.worker_port)
+        try:
+            return socket.create_connection(address, timeout=1)
+        except OSError:
+            pass
+        logger.info("Starting the bridge worker process")
+        self.process = subprocess.Popen(
+            worker_command(settings.worker_port),
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            # Its own session, so signals meant for the GUI don't reach it
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while True:
+            try:
+                return socket.create_connection(address, timeout=1)
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def _run(self) -> None:
+        while not self._closing:
+            try:
+                connection = self._connect()
+            except OSError as e:
+                logger.error(f"Could not reach the bridge worker: {e}")
+                time.sleep(1)
+                continue
+            connection.settimeout(None)
+            with self._send_lock:
+                self._socket = connection
+            try:
+                for line in connection.makefile("r", encoding="utf-8"):
+                    try:
+                        self._dispatch(json.loads(line))
+                    except Exception as e:
+                        logger.error(f"Error handling bridge status {line.strip()}: {e}")
+            except OSError:
+                pass
+            with self._send_lock:
+                self._socket = None
+            connection.close()
+            if not self._closing:
+                logger.warning("Lost the bridge worker, reconnecting")
+                pub.sendMessage("console_disconnected")
+                time.sleep(0.5)
+        self._stopped.set()
+
+    def _dispatch(self, status: Dict[str, Any]) -> None:
+        event = status["event"]
+        if "pairing" in status:
+            # Only the main pairing is shown in the window
+            return
+        if event == "state":
+            settings.marker_mode = status["marker_mode"]
+            pub.sendMessage("console_type_updated", console=CONSOLES.get(status["console_type"], UNKNOWN_CONSOLE))
+            if status["console"] == "N/C":
+                pub.sendMessage("console_disconnected")
+            else:
+                bus.publish(ConsoleConnected(consolename=status["console"], colour=status["colour"]))
+        elif event == "console_connected":
+            bus.publish(ConsoleConnected(consolename=status["console"], colour=status["colour"]))
+        elif event == "console_disconnected":
+            pub.sendMessage("console_disconnected")
+        elif event == "console_type":
+            pub.sendMessage("console_type_updated", console=CONSOLES.get(status["console_type"], UNKNOWN_CONSOLE))
+        elif event == "daw_type" and status["daw_type"] in DAWS:
+            pub.sendMessage("daw_type_updated", daw=DAWS[status["daw_type"]])
+        elif event == "marker_mode":
+            settings.marker_mode = status["marker_mode"]
+        elif event == "reaper_error":
+            pub.sendMessage("reaper_error", reapererror=status["error"])
+        elif event == "reaper_configured":
+            pub.sendMessage("reset_reaper", resetreaper=True)
+        elif event == "markers_seeded":
+            pub.sendMessage("markers_seeded", daw=status["daw"], added=status["added"],
+                            present=status["present"], error=status["error"])
+
+    def send(self, command: str, **fields) -> None:
+        line = json.dumps({"command": command, **fields}) + "\n"
+        with self._send_lock:
+            if self._socket is None:
+                logger.warning(f"Bridge worker not connected, dropped {command}")
+                return
+            try:
+                self._socket.sendall(line.encode())
+            except OSError as e:
+                logger.error(f"Could not send {command} to the bridge worker: {e}")
+
+    # The bridge operations the window uses
+
+    def place_marker(self, marker_name: str) -> None:
+        self.send("place_marker", marker_name=marker_name)
+
+    def set_marker_mode(self, marker_mode: str) -> None:
+        settings.marker_mode = marker_mode
+        self.send("marker_mode", marker_mode=marker_mode)
+
+    def reconnect(self) -> None:
+        self.send("reconnect")
+
+    def seed_markers(self) -> None:
+        self.send("seed_markers")
+
+    def start_threads(self) -> None:
+        self.send("start_threads")
+
+    def update_configuration(self, **values) -> None:
+        self.send("update_configuration", values=values)
+
+    def update_pos_in_config(self, win_pos_tuple: Tuple[int, int]) -> None:
+        self.send("window_pos", position=[win_pos_tuple[0], win_pos_tuple[1]])
+
+    def update_size_in_config(self, win_size_tuple: Tuple[int, int]) -> None:
+        self.send("window_size", size=[win_size_tuple[0], win_size_tuple[1]])
+
+    def shutdown(self) -> Future:
+        # Stops the worker and resolves once it has closed its servers
+        future: Future = Future()
+
+        def wait_for_worker():
+            self._closing = True
+            self.send("shutdown")
+            try:
+                if not self._stopped.wait(WORKER_START_TIMEOUT):
+                    raise TimeoutError("The bridge worker didn't stop")
+                if self.process:
+                    self.process.wait(WORKER_START_TIMEOUT)
+                future.set_result(True)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=wait_for_worker, name="bridge-shutdown", daemon=True).start()
+        return future
@@ -0,0 +1,143 @@
+import mmap
+import os
+import queue
+import struct
+import time
+from typing import Iterator, NamedTuple
+
+from logger_config import logger
+from supervisor import CancellationToken
+
+# File layout: a header with the wall clock time the capture started, then one
+# record per datagram: seconds since the start, socket, direction, length,
+# followed by the raw bytes. Everything is little endian.
+MAGIC = b"DRLCAP01"
+HEADER = struct.Struct("<8sd")
+RECORD = struct.Struct("<dBBI")
+
+SOCKETS = ("console", "repeater", "daw")
+INBOUND, OUTBOUND = 0, 1
+DIRECTIONS = ("in", "out")
+# Socket names as counted in metrics, e.g. "console_in"
+_SOCKET_IDS = {
+    f"{socket}_{direction}": (socket_id, direction_id)
+    for socket_id, socket in enumerate(SOCKETS)
+    for direction_id, direction in enumerate(DIRECTIONS)
+}
+
+
+class CapturedDatagram(NamedTuple):
+    time: float
+    socket: str
+    direction: str
+    data: memoryview
+
+
+class Capture:
+    # The receive and send paths only put the datagram on a queue, and only
+    # while a capture is running. The writer thread does all the file I/O.
+    def __init__(self):
+        self.active = False
+        self.dropped = 0
+        self._started = 0.0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    def record(self, socket_name: str, data: bytes) -> None:
+        if self.active:
+            self._queue.put((time.perf_counter(), socket_name, bytes(data)))
+
+    def run(self, path: str, token: CancellationToken) -> None:
+        # Writes datagrams to path until cancelled, then flushes what is queued
+        try:
+            f = open(path, "wb")
+        except OSError as e:
+            logger.error(f"Could not open capture file {path}: {e}")
+            return
+        with f:
+            f.write(HEADER.pack(MAGIC, time.time()))
+            self._started = time.perf_counter()
+            self.active = True
+            logger.info(f"Capturing OSC traffic to {path}")
+            written = 0
+            try:
+                while True:
+                    try:
+                        item = self._queue.get(timeout=0.25)
+                    except queue.Empty:
+                        if token.cancelled:
+                            break
+                        f.flush()
+                        continue
+                    written += self._write(f, item)
+                    # Drain without blocking so a burst becomes one buffered write
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        written += self._write(f, item)
+            finally:
+                self.active = False
+                while True:
+                    try:
+                        written += self._write(f, self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+        logger.info(f"Capture stopped, {written} datagrams written")
+
+    def _write(self, f, item) -> int:
+        stamp, socket_name, data = item
+        ids = _SOCKET_IDS.get(socket_name)
+        if ids is None:
+            self.dropped += 1
+            return 0
+        f.write(RECORD.pack(stamp - self._started, ids[0], ids[1], len(data)))
+        f.write(data)
+        return 1
+
+
+capture = Capture()
+
+
+class CaptureReader:
+    # Reads a capture through a memory map, so a long show doesn't have to fit
+    # in memory. The datagrams are views into the map and are only valid
+    # until the reader is closed.
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a capture file")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.started = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+
+    def __iter__(self) -> Iterator[CapturedDatagram]:
+        view = memoryview(self._map)
+        offset = HEADER.size
+        end = len(self._map)
+        while offset + RECORD.size <= end:
+            stamp, socket_id, direction_id, length = RECORD.unpack_from(self._map, offset)
+            offset += RECORD.size
+            if offset + length > end:
+                # The last record of a capture that was cut off
+                break
+            yield CapturedDatagram(stamp, SOCKETS[socket_id], DIRECTIONS[direction_id], view[offset:offset + length])
+            offset += length
+
+    def close(self) -> None:
+        try:
+            self._map.close()
+        except BufferError:
+            # A datagram view is still referenced, the map closes when it goes
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import threading
+import time
+from configparser import ConfigParser
+from typing import Any, Dict
+
+from configupdater import ConfigUpdater
+
+from logger_config import logger
+
+
+class ConfigStore:
+    # Keeps the parsed preferences file in memory so it is only read once.
+    # Changes are coalesced and written by a background thread once they have
+    # been quiet for `delay` seconds. Each write goes to a temporary file that
+    # is renamed over the original, so a crash mid-write never leaves a
+    # truncated preferences file behind.
+    def __init__(self, path: str, delay: float = 0.5):
+        self.path = path
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        self._updater = ConfigUpdater()
+        if os.path.isfile(path):
+            try:
+                self._updater.read(path)
+            except Exception as e:
+                logger.error(f"Failed to read preferences file: {e}")
+                self._updater = ConfigUpdater()
+        self._dirty = False
+        self._last_change = 0.0
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="config-writer", daemon=True)
+        self._writer.start()
+
+    def update(self, section: str, values: Dict[str, Any]) -> None:
+        with self._lock:
+            if not self._updater.has_section(section):
+                self._updater.add_section(section)
+            for key, value in values.items():
+                self._updater[section][key] = str(value)
+            self._dirty = True
+            self._last_change = time.monotonic()
+            self._changed.notify()
+
+    def config(self) -> ConfigParser:
+        # A ConfigParser view of the current, possibly not yet written, contents
+        config = ConfigParser()
+        with self._lock:
+            config.read_string(str(self._updater))
+        return config
+
+    def flush(self) -> None:
+        # Writes any pending changes now
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                text = str(self._updater)
+                self._dirty = False
+            self._write(text)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._changed.notify()
+        self._writer.join()
+        self.flush()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if not self._dirty:
+                        self._changed.wait()
+                        continue
+                    remaining = self._last_change + self.delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write(self, text: str) -> None:
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            logger.debug("Preferences file written")
+        except Exception as e:
+            logger.error(f"Failed to write preferences file: {e}")
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
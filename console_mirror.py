@@ -0,0 +1,76 @@
+from typing import Dict, Iterator, Optional, Tuple
+
+# Streamed readings that are stale by the time anyone asks, never mirrored
+TRANSIENT_PREFIXES = ("/Meters/",)
+# Addresses whose queries take an index (a snapshot or macro number) that the
+# console echoes as the first argument of its answer. Others are learned
+# from the queries remotes send.
+INDEXED_ADDRESSES = ("/Snapshots/name", "/Macros/name")
+QUERY_SUFFIX = "/?"
+
+
+class ConsoleMirror:
+    # The latest values the console sent for each address, kept from the
+    # traffic the repeater relays anyway. A query from a remote that the
+    # mirror holds the answer to doesn't need to go to the console.
+    # Handlers run on the servers' request threads, and single dict reads
+    # and writes are atomic, so there is no lock.
+    def __init__(self, max_entries: int = 65536):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._values: Dict[str, tuple] = {}
+        self._indexed_values: Dict[Tuple[str, object], tuple] = {}
+        self._indexed = set(INDEXED_ADDRESSES)
+
+    def _store(self, table: dict, key, args: tuple) -> None:
+        # Addresses with changing parts would grow the mirror forever, so
+        # past the limit only known addresses are updated
+        if key in table or len(table) < self.max_entries:
+            table[key] = args
+
+    def from_console(self, address: str, args: tuple) -> None:
+        if address.startswith(TRANSIENT_PREFIXES):
+            return
+        if address in self._indexed and args:
+            self._store(self._indexed_values, (address, args[0]), args)
+        else:
+            self._store(self._values, address, args)
+
+    def from_remote(self, address: str, args: tuple) -> Optional[Tuple[str, tuple]]:
+        # The (address, arguments) answer to a remote's query, or None when
+        # the message has to go on to the console. Values a remote sets are
+        # taken as the console's new state.
+        if not address.endswith(QUERY_SUFFIX):
+            if not address.startswith(TRANSIENT_PREFIXES) and address not in self._indexed:
+                self._store(self._values, address, args)
+            return None
+        target = address[:-len(QUERY_SUFFIX)]
+        if args:
+            self._indexed.add(target)
+            value = self._indexed_values.get((target, args[0]))
+        else:
+            value = self._values.get(target)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return target, value
+
+    def items(self) -> Iterator[Tuple[str, tuple]]:
+        # Every mirrored value, for bringing a new remote up to date. The
+        # dict copies are made in one step, so the console may keep writing.
+        yield from dict(self._values).items()
+        for (address, _), args in dict(self._indexed_values).items():
+            yield address, args
+
+    def clear(self) -> None:
+        self._values = {}
+        self._indexed_values = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._values) + len(self._indexed_values),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
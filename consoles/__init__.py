@@ -1,7 +1,21 @@
 from .console import Console, Feature
-from .digico import DiGiCo
-from .studervista import StuderVista
+from backend_registry import Backend
+
+# Backend modules are only imported when a console of that type is selected
+CONSOLES = {
+    "DiGiCo": Backend(
+        "DiGiCo", "consoles.digico", "DiGiCo", [Feature.CUE_NUMBER, Feature.REPEATER, Feature.CUE_LIST]
+    ),
+    "Studer Vista": Backend("Studer Vista", "consoles.studervista", "StuderVista"),
+}
+
+
+def __getattr__(name):
+    # Keep `from consoles import DiGiCo` working without importing every backend
+    for backend in CONSOLES.values():
+        if backend.class_name == name:
+            return backend.load()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-CONSOLES = {"DiGiCo": DiGiCo, "Studer Vista": StuderVista}
 
 __all__ = ["Console", "CONSOLES", "Feature", "DiGiCo", "StuderVista"]
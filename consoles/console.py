@@ -1,24 +1,69 @@
 from enum import Enum
-from typing import Callable, List
+from typing import Callable, List, Optional
+
+from app_settings import ThreadSafeSettings, settings as app_settings
+from cue_settle import CueSettler
+from event_bus import EventBus, CueSkipped, bus as app_bus
 
 
 class Feature(Enum):
     CUE_NUMBER = 1
     REPEATER = 2
     SEPERATE_RECEIVE_PORT = 3
+    CUE_LIST = 4
 
 
 class Console:
     supported_features: List[Feature]
     type = "Unknown"
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, settings: Optional[ThreadSafeSettings] = None, bus: Optional[EventBus] = None) -> None:
+        # The pairing's settings and bus, the app wide ones unless the bridge
+        # hosts more than one console
+        self.settings = app_settings if settings is None else settings
+        self.bus = app_bus if bus is None else bus
+        # Called for every message received from the console, the bridge
+        # points this at its link monitor
+        self.on_inbound: Callable[[], None] = lambda: None
+        # Telemetry from this console is stored under this prefix, the
+        # bridge sets it to the pairing name for consoles other than the main one
+        self.telemetry_source = ""
+        # Recalls pass through this, so only the last of a quick run acts
+        self.cue_settler = CueSettler(self.settings, self._cue_skipped)
+
+    def _cue_skipped(self, label: str) -> None:
+        if self.settings.snapshot.journal_skipped_cues:
+            self.bus.publish(CueSkipped(cue=label))
 
     def heartbeat(self) -> None:
+        # Probes a console that has gone quiet
         pass
 
+    def link_up(self) -> None:
+        # Traffic resumed after the link was down, ask the console to identify itself
+        self.heartbeat()
+
+    def link_down(self) -> None:
+        # Nothing has arrived from the console for the link timeout
+        pass
+
+    def cue_list(self) -> List[str]:
+        # Every cue on the console in show order, named the way cue loads are
+        raise NotImplementedError(f"{self.type} can't list its cues")
+
     def start_managed_threads(
         self, start_managed_thread: Callable[[str, Callable], None]
     ) -> None:
         pass
+
+    def start_repeater(
+        self, start_managed_thread: Callable[[str, Callable], None]
+    ) -> None:
+        pass
+
+    def stop_repeater(self) -> None:
+        pass
+
+    def shutdown_servers(self) -> None:
+        # A recall still settling would act on a console that is going away
+        self.cue_settler.cancel()
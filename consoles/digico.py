@@ -1,18 +1,46 @@
 from . import Console, Feature
+from app_settings import ThreadSafeSettings
+from capture import capture
+from console_mirror import TRANSIENT_PREFIXES, ConsoleMirror
+from event_bus import EventBus, ConsoleConnected, CueLoad, CueSkipped, PlaceMarker, TransportAction
 from logger_config import logger
-from typing import Any, Callable
-from pubsub import pub
-from pythonosc import dispatcher, osc_server, udp_client
+from metrics import CountingOSCUDPServer, CountingUDPClient, metrics
+from osc_encoder import OscTemplate
+from priority_lanes import Lane, PriorityLanes
+from supervisor import CancellationToken, serve
+from telemetry import telemetry
+from typing import Any, Callable, Dict, List, Optional, Set
+from pythonosc import dispatcher, udp_client
 from pythonosc.dispatcher import Dispatcher
-from pythonosc.osc_server import ThreadingOSCUDPServer
 import socket
-import wx
 import threading
+import time
+
+# Queries sent to the console on every recall, macro press and heartbeat
+SNAPSHOT_NAME_QUERY = OscTemplate("/Snapshots/name/?", "i")
+MACRO_NAME_QUERY = OscTemplate("/Macros/name/?", "i")
+CONSOLE_NAME_QUERY = OscTemplate("/Console/Name/?").encode()
+# Messages sent to a new remote between short pauses, so syncing it from the
+# mirror doesn't overrun its receive buffer
+SYNC_BURST = 256
+# Snapshot names asked for at once when listing the cues, and how long the
+# console may go quiet before the rest of a window counts as unanswered
+CUE_LIST_WINDOW = 64
+CUE_LIST_TIMEOUT = 0.5
+# Console traffic handled ahead of everything else: recalls, macro presses,
+# the name answers they lead to and the console name the link monitor
+# relies on. Meters go last and are the first to be shed.
+CONTROL_PREFIXES = (b"/Snapshots/", b"/Macros/", b"/Console/Name")
+BULK_PREFIXES = tuple(prefix.encode() for prefix in TRANSIENT_PREFIXES)
 
 class RawMessageDispatcher(Dispatcher):
+    def __init__(self, settings: ThreadSafeSettings):
+        super().__init__()
+        self.settings = settings
+
     def handle_error(self, OSCAddress: str, *args):
         # Handles malformed OSC messages and forwards on to console
-        logger.debug(f"Received malformed OSC message at address: {OSCAddress}")
+        logger.debug("Received malformed OSC message at address: %s", OSCAddress)
         try:
             # The last argument contains the raw message data
             raw_data = args[-1] if args else None
@@ -20,23 +48,23 @@ class RawMessageDispatcher(Dispatcher):
                 # Forward the raw data exactly as received
                 self.forward_raw_message(raw_data)
         except Exception as e:
-            logger.error(f"Error forwarding malformed OSC message: {e}")
-    @staticmethod
-    def forward_raw_message(raw_data):
-        from app_settings import settings
+            logger.error("Error forwarding malformed OSC message: %s", e)
+    def forward_raw_message(self, raw_data):
         # Forwards the raw message data without parsing
         logger.debug("Forwarding raw message.")
         try:
             # Create a raw UDP socket for forwarding
             forward_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             # Forward to the Digico console IP and receive port
-            forward_socket.sendto(raw_data, (settings.console_ip,settings.receive_port))
+            snapshot = self.settings.snapshot
+            forward_socket.sendto(raw_data, (snapshot.console_ip, snapshot.receive_port))
+            capture.record("console_out", raw_data)
             forward_socket.close()
         except Exception as e:
-            logger.error(f"Error forwarding raw message: {e}")
+            logger.error("Error forwarding raw message: %s", e)
 
 
-class RawOSCServer(ThreadingOSCUDPServer):
+class RawOSCServer(CountingOSCUDPServer):
     def handle_request(self):
         # Override to get raw data before OSC parsing
         try:
@@ -51,76 +79,137 @@ class RawOSCServer(ThreadingOSCUDPServer):
                 super().handle_request()
             except Exception as e:
                 # If OSC parsing fails, handle as raw data
-                logger.debug(f"OSC parsing failed, handling as raw data. {e}")
+                logger.debug("OSC parsing failed, handling as raw data. %s", e)
                 if hasattr(self.dispatcher, 'handle_error'):
                     self.dispatcher.handle_error("/", data)
         except Exception as e:
-            logger.error(f"Error in raw server handler: {e}")
+            logger.error("Error in raw server handler: %s", e)
+
+class ConsoleOSCServer(CountingOSCUDPServer):
+    # Reports every datagram from the console before it is dispatched, then
+    # queues it in the lane its address belongs to rather than starting a
+    # thread for it, so a meter flood can't hold up a recall
+    def __init__(self, server_address, dispatcher, on_datagram: Callable[[], None], lanes_name: str):
+        self.on_datagram = on_datagram
+        super().__init__(server_address, dispatcher, "console_in")
+        self.lanes = PriorityLanes(lanes_name, self._dispatch)
+        self.lanes.start()
+
+    def verify_request(self, request, client_address):
+        self.on_datagram()
+        return super().verify_request(request, client_address)
+
+    def process_request(self, request, client_address):
+        data = request[0]
+        if data.startswith(CONTROL_PREFIXES):
+            lane = Lane.CONTROL
+        elif data.startswith(BULK_PREFIXES):
+            lane = Lane.BULK
+        else:
+            lane = Lane.RELAY
+        self.lanes.put(lane, (request, client_address))
+
+    def _dispatch(self, item) -> None:
+        self.finish_request(*item)
+
+    def server_close(self):
+        super().server_close()
+        self.lanes.stop()
+
 
 class DiGiCo(Console):
     type = "DiGiCo"
-    supported_features = [Feature.CUE_NUMBER, Feature.REPEATER]
+    supported_features = [Feature.CUE_NUMBER, Feature.REPEATER, Feature.CUE_LIST]
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, settings: Optional[ThreadSafeSettings] = None, bus: Optional[EventBus] = None):
+        super().__init__(settings, bus)
         self.console_send_lock = threading.Lock()
         self.digico_osc_server = None
         self.repeater_osc_server = None
-        pub.subscribe(self._shutdown_servers, "shutdown_servers")
+        # When the last recall and macro press arrived, carried on the events they cause
+        self._recall_ingest = 0.0
+        self._macro_ingest = 0.0
+        # What the console last sent, for answering repeater queries, and the
+        # addresses of the remotes that have been brought up to date from it
+        self.mirror = ConsoleMirror()
+        self._remotes = set()
+        # Snapshot names collected while listing the cues, keyed by snapshot
+        # number, and the recalled snapshot whose name is a cue load
+        self._cue_list: Optional[Dict[int, str]] = None
+        self._cue_list_arrived = threading.Condition()
+        self._recalled_snapshot: Optional[int] = None
+        # Skipped snapshots whose names were asked for, so they can be journaled
+        self._skipped_snapshots: Set[int] = set()
 
     def start_managed_threads(
         self, start_managed_thread: Callable[[str, Any], None]
     ) -> None:
-        from app_settings import settings
         logger.info("Starting OSC Server threads")
         start_managed_thread(
             "console_connection_thread", self._build_digico_osc_servers
         )
-        if settings.forwarder_enabled:
+        self.start_repeater(start_managed_thread)
+
+    def start_repeater(
+        self, start_managed_thread: Callable[[str, Any], None]
+    ) -> None:
+        if self.settings.forwarder_enabled:
             start_managed_thread(
                 "repeater_osc_thread", self._build_repeater_osc_servers
             )
 
 
-    def _build_digico_osc_servers(self):
+    def _local_address(self) -> str:
+        # The local address in the console's subnet that our servers bind to
+        from utilities import interface_table
+        match = interface_table.find(self.settings.console_ip)
+        if not match:
+            raise RuntimeError("No local ip found in console's subnet")
+        logger.info(f"Console subnet is reached through {match.interface} ({match.address})")
+        return match.address
+
+    def _build_digico_osc_servers(self, token: CancellationToken):
         # Connect to the Digico console
-        from utilities import find_local_ip_in_subnet
         logger.info("Starting Digico OSC server")
-        from app_settings import settings
-        self.console_client = udp_client.SimpleUDPClient(settings.console_ip, settings.console_port)
+        self.console_client = CountingUDPClient(self.settings.console_ip, self.settings.console_port, "console_out")
         self.digico_dispatcher = dispatcher.Dispatcher()
         self._receive_console_OSC()
         try:
-            local_ip = find_local_ip_in_subnet(settings.console_ip)
-            if not local_ip:
-                raise RuntimeError("No local ip found in console's subnet")
-            self.digico_osc_server = osc_server.ThreadingOSCUDPServer((find_local_ip_in_subnet
-                                                                       (settings.console_ip),
-                                                                       settings.receive_port),
-                                                                      self.digico_dispatcher)
+            self.digico_osc_server = ConsoleOSCServer((self._local_address(), self.settings.receive_port),
+                                                      self.digico_dispatcher,
+                                                      self.on_inbound,
+                                                      "console_lanes")
+            metrics.gauge("console_lanes" + (f".{self.telemetry_source}" if self.telemetry_source else ""),
+                          self.digico_osc_server.lanes.stats)
             logger.info("Digico OSC server started")
-            self.digico_osc_server.serve_forever()
+            serve(self.digico_osc_server, token)
+            logger.info("Digico OSC Server shutdown completed")
         except Exception as e:
             logger.error(f"Digico OSC server startup error: {e}")
+        finally:
+            self.digico_osc_server = None
 
-    def _build_repeater_osc_servers(self):
+    def _build_repeater_osc_servers(self, token: CancellationToken):
         # Connect to Repeater via OSC
         logger.info("Starting Repeater OSC server")
-        from utilities import find_local_ip_in_subnet
-        from app_settings import settings
-        self.repeater_client = udp_client.SimpleUDPClient(settings.repeater_ip, settings.repeater_port)
+        self.repeater_client = CountingUDPClient(self.settings.repeater_ip, self.settings.repeater_port, "repeater_out")
+        metrics.gauge("repeater_mirror" + (f".{self.telemetry_source}" if self.telemetry_source else ""),
+                      self.mirror.stats)
         # Custom dispatcher to deal with corrupted OSC from iPad
-        self.repeater_dispatcher = RawMessageDispatcher()
+        self.repeater_dispatcher = RawMessageDispatcher(self.settings)
         self._receive_repeater_OSC()
         try:
             # Raw OSC Server to deal with corrupted OSC from iPad App
             self.repeater_osc_server = RawOSCServer(
-                (find_local_ip_in_subnet(settings.console_ip), settings.repeater_receive_port),
-                self.repeater_dispatcher)
+                (self._local_address(), self.settings.repeater_receive_port),
+                self.repeater_dispatcher, "repeater_in")
             logger.info("Repeater OSC server started")
-            self.repeater_osc_server.serve_forever()
+            serve(self.repeater_osc_server, token)
+            logger.info("Repeater OSC Server shutdown completed")
         except Exception as e:
             logger.error(f"Repeater OSC server startup error: {e}")
+        finally:
+            self.repeater_osc_server = None
 
 # Digico Functions
 
@@ -140,118 +229,203 @@ class DiGiCo(Console):
 
     def _console_name_handler(self, OSCAddress: str, console_name: str):
         # Receives the console name response and updates the UI.
-        from app_settings import settings
-        if settings.forwarder_enabled:
+        if self.settings.snapshot.forwarder_enabled:
+            self.mirror.from_console(OSCAddress, (console_name,))
             try:
                 self.repeater_client.send_message(OSCAddress, console_name)
             except Exception as e:
-                logger.error(f"Console name cannot be repeated: {e}")
+                logger.error("Console name cannot be repeated: %s", e)
         try:
-            wx.CallAfter(pub.sendMessage, "console_connected", consolename=console_name)
+            self.bus.publish(ConsoleConnected(consolename=console_name))
         except Exception as e:
             logger.error(f"Console Name Handler Error: {e}")
 
     def _request_snapshot_info(self, OSCAddress: str, *args):
         # Receives the OSC for the Current Snapshot Number and uses that to request the cue number/name
-        from app_settings import settings
-        if settings.forwarder_enabled:
+        ingest = time.perf_counter()
+        if self.settings.snapshot.forwarder_enabled:
             try:
                 self.repeater_client.send_message(OSCAddress, *args)
             except Exception as e:
-                logger.error(f"Snapshot info cannot be repeated: {e}")
-        logger.info("Requested snapshot info")
+                logger.error("Snapshot info cannot be repeated: %s", e)
         current_snapshot_number = int(OSCAddress.split("/")[3])
+        # Only the snapshot a run of recalls ends on gets its name asked for
+        self.cue_settler.recall(f"Snapshot {current_snapshot_number}", ingest,
+                                lambda ingest: self._query_snapshot_name(current_snapshot_number, ingest),
+                                lambda: self._query_skipped_name(current_snapshot_number))
+
+    def _query_snapshot_name(self, current_snapshot_number: int, ingest: float) -> None:
+        self._recall_ingest = ingest
+        self._recalled_snapshot = current_snapshot_number
+        logger.info("Requested snapshot info for %s", current_snapshot_number)
         with self.console_send_lock:
-            self.console_client.send_message("/Snapshots/name/?", current_snapshot_number)
+            self.console_client.send_dgram(SNAPSHOT_NAME_QUERY.encode(current_snapshot_number))
+
+    def _query_skipped_name(self, snapshot_number: int) -> None:
+        # A skipped recall is journaled under its cue name like any other,
+        # so only asked for when skipped cues are journaled at all
+        if not self.settings.snapshot.journal_skipped_cues:
+            return
+        self._skipped_snapshots.add(snapshot_number)
+        with self.console_send_lock:
+            self.console_client.send_dgram(SNAPSHOT_NAME_QUERY.encode(snapshot_number))
 
     def _request_macro_info(self, OSCAddress: str, pressed):
         # When a Macro is pressed, request the name of the macro
+        self._macro_ingest = time.perf_counter()
         self.requested_macro_num = OSCAddress.split("/")[3]
         with self.console_send_lock:
-            self.console_client.send_message("/Macros/name/?", int(self.requested_macro_num))
+            self.console_client.send_dgram(MACRO_NAME_QUERY.encode(int(self.requested_macro_num)))
 
     def _macro_name_handler(self, OSCAddress: str, *args):
         #If macros match names, then send behavior to Reaper
-        from app_settings import settings
-        if settings.forwarder_enabled:
+        if self.settings.snapshot.forwarder_enabled:
+            self.mirror.from_console(OSCAddress, args)
             try:
                 self.repeater_client.send_message(OSCAddress, [*args])
             except Exception as e:
-                logger.error(f"Macro name cannot be repeated: {e}")
+                logger.error("Macro name cannot be repeated: %s", e)
         if self.requested_macro_num is not None:
             if int(self.requested_macro_num) == int(args[0]):
                 macro_name = args[1]
                 macro_name = str(macro_name).lower()
-                print(macro_name)
+                logger.debug("Macro name: %s", macro_name)
                 if macro_name in ("reaper,rec", "reaper rec", "rec", "record", "reaper, record", "reaper record"):
-                    pub.sendMessage("incoming_transport_action", transport_action="rec")
+                    self.bus.publish(TransportAction(transport_action="rec", ingest=self._macro_ingest))
                 elif macro_name in ("reaper,stop", "reaper stop", "stop"):
-                    pub.sendMessage("incoming_transport_action", transport_action="stop")
+                    self.bus.publish(TransportAction(transport_action="stop", ingest=self._macro_ingest))
                 elif macro_name in ("reaper,play", "reaper play", "play"):
-                    pub.sendMessage("incoming_transport_action", transport_action="play")
+                    self.bus.publish(TransportAction(transport_action="play", ingest=self._macro_ingest))
                 elif macro_name in ("reaper,marker", "reaper marker", "marker"):
-                    self.process_marker_macro()
+                    self.process_marker_macro(self._macro_ingest)
                 elif macro_name in ("mode,rec", "mode,record", "mode,recording",
                                     "mode rec", "mode record", "mode recording"):
-                    settings.marker_mode = "Recording"
-                    pub.sendMessage("mode_select_osc", selected_mode="Recording")
+                    self.settings.marker_mode = "Recording"
+                    self.bus.send_message("mode_select_osc", selected_mode="Recording")
                 elif macro_name in ("mode,track", "mode,tracking", "mode,PB Track",
                                     "mode track", "mode tracking", "mode PB Track"):
-                    settings.marker_mode = "PlaybackTrack"
-                    pub.sendMessage("mode_select_osc", selected_mode="PlaybackTrack")
+                    self.settings.marker_mode = "PlaybackTrack"
+                    self.bus.send_message("mode_select_osc", selected_mode="PlaybackTrack")
                 elif macro_name in ("mode,no track", "mode,no tracking", "mode no track",
                                     "mode no tracking"):
-                    settings.marker_mode = "PlaybackNoTrack"
-                    pub.sendMessage("mode_select_osc", selected_mode="PlaybackNoTrack")
+                    self.settings.marker_mode = "PlaybackNoTrack"
+                    self.bus.send_message("mode_select_osc", selected_mode="PlaybackNoTrack")
             self.requested_macro_num = None
 
-    @staticmethod
-    def process_marker_macro():
-        pub.sendMessage("place_marker_with_name", marker_name="Marker from Console")
+    def process_marker_macro(self, ingest: float = 0.0):
+        self.bus.publish(PlaceMarker(marker_name="Marker from Console", ingest=ingest))
 
     def snapshot_OSC_handler(self, OSCAddress: str, *args):
         # Processes the current cue number
-        from app_settings import settings
-        if settings.forwarder_enabled:
+        if self.settings.snapshot.forwarder_enabled:
+            self.mirror.from_console(OSCAddress, args)
             try:
                 self.repeater_client.send_message(OSCAddress, [*args])
             except Exception as e:
-                logger.error(f"Snapshot cue number cannot be repeated: {e}")
+                logger.error("Snapshot cue number cannot be repeated: %s", e)
         cue_name = args[3]
         cue_number = str(args[1] / 100)
         cue_payload = cue_number + " " + cue_name
-        pub.sendMessage("handle_cue_load", cue=cue_payload)
+        if args[0] != self._recalled_snapshot and args[0] in self._skipped_snapshots:
+            self._skipped_snapshots.discard(args[0])
+            self.bus.publish(CueSkipped(cue=cue_payload))
+            return
+        collecting = self._cue_list
+        if collecting is not None and args[0] != self._recalled_snapshot:
+            # An answer to cue_list, not a recall
+            with self._cue_list_arrived:
+                collecting[int(args[0])] = cue_payload
+                self._cue_list_arrived.notify_all()
+            return
+        # A name the console sends without a recall is timed from its own arrival
+        ingest = self._recall_ingest or time.perf_counter()
+        self._recall_ingest = 0.0
+        metrics.histogram("console.recall_to_cue").observe(time.perf_counter() - ingest)
+        self.bus.publish(CueLoad(cue=cue_payload, ingest=ingest))
+
+    def cue_list(self) -> List[str]:
+        # Asks for the snapshot names a window at a time, without waiting
+        # for each answer, until a whole window goes unanswered
+        collected: Dict[int, str] = {}
+        self._cue_list = collected
+        try:
+            first = 1
+            while True:
+                window = range(first, first + CUE_LIST_WINDOW)
+                with self.console_send_lock:
+                    for number in window:
+                        self.console_client.send_dgram(SNAPSHOT_NAME_QUERY.encode(number))
+                with self._cue_list_arrived:
+                    answered = sum(number in collected for number in window)
+                    while answered < len(window):
+                        self._cue_list_arrived.wait(CUE_LIST_TIMEOUT)
+                        now_answered = sum(number in collected for number in window)
+                        if now_answered == answered:
+                            break
+                        answered = now_answered
+                if not answered:
+                    break
+                first += CUE_LIST_WINDOW
+        finally:
+            self._cue_list = None
+        logger.info("Console has %s snapshots", len(collected))
+        return [collected[number] for number in sorted(collected)]
 
 # Repeater Functions
 
     def _receive_repeater_OSC(self):
-        self.repeater_dispatcher.set_default_handler(self.send_to_console)
+        self.repeater_dispatcher.set_default_handler(self._repeater_OSC_handler, needs_reply_address=True)
+
+    def _repeater_OSC_handler(self, client_address, OSCAddress: str, *args):
+        # Queries the mirror can answer are served here, and the answer goes
+        # back to whichever remote asked. Everything else goes on to the
+        # console.
+        if self.settings.snapshot.repeater_mirror:
+            if client_address not in self._remotes:
+                self._remotes.add(client_address)
+                self._sync_remote(client_address)
+            reply = self.mirror.from_remote(OSCAddress, args)
+            if reply is not None:
+                try:
+                    self.repeater_client.send_message(reply[0], [*reply[1]], client_address)
+                except Exception as e:
+                    logger.error("Mirrored value cannot be repeated: %s", e)
+                return
+        self.send_to_console(OSCAddress, *args)
+
+    def _sync_remote(self, client_address) -> None:
+        # A remote that hasn't been heard from gets everything the mirror
+        # holds, instead of asking the console for it piece by piece
+        sent = 0
+        try:
+            for address, args in self.mirror.items():
+                self.repeater_client.send_message(address, [*args], client_address)
+                sent += 1
+                if sent % SYNC_BURST == 0:
+                    time.sleep(0.001)
+        except Exception as e:
+            logger.error("Could not sync remote %s: %s", client_address, e)
+        if sent:
+            logger.info("Synced new remote %s with %s mirrored values", client_address, sent)
 
     def _forward_OSC(self, OSCAddress: str, *args):
-        from app_settings import settings
-        if settings.forwarder_enabled:
+        telemetry.record(self.telemetry_source, OSCAddress, args)
+        if self.settings.snapshot.forwarder_enabled:
+            self.mirror.from_console(OSCAddress, args)
             try:
                 self.repeater_client.send_message(OSCAddress, [*args])
             except Exception as e:
-                logger.error(f"Forwarder error: {e}")
+                logger.error("Forwarder error: %s", e)
     
+    def link_down(self) -> None:
+        # The desk may change or restart while it is unreachable, so what it
+        # last sent can't be served any more, and every remote is synced
+        # again once it is back
+        self.mirror.clear()
+        self._remotes.clear()
+        self._skipped_snapshots.clear()
+
     def heartbeat(self) -> None:
         with self.console_send_lock:
             assert isinstance(self.console_client, udp_client.UDPClient)
-            self.console_client.send_message("/Console/Name/?", None)
-
-    def _shutdown_servers(self):
-        try:
-            if self.digico_osc_server:
-                self.digico_osc_server.shutdown()
-                self.digico_osc_server.server_close()
-                logger.info(f"Digico OSC Server shutdown completed")
-        except Exception as e:
-            logger.error(f"Error shutting down Digico server: {e}")
-        try:
-            if self.repeater_osc_server:
-                self.repeater_osc_server.shutdown()
-                self.repeater_osc_server.server_close()
-                logger.info(f"Repeater OSC Server shutdown completed")
-        except Exception as e:
-            logger.error(f"Error shutting down OSC Repeater server: {e}")
\ No newline at end of file
+            self.console_client.send_dgram(CONSOLE_NAME_QUERY)
@@ -1,65 +1,89 @@
 import socket
 import threading
 import time
-from typing import Any, Callable, List
+from typing import Any, Callable, List, Optional
 
 import asn1
-import wx
-from pubsub import pub
 
+from app_settings import ThreadSafeSettings
+from event_bus import EventBus, ConsoleConnected, CueLoad
 from logger_config import logger
+from supervisor import CancellationToken
 
 from . import Console
 
+# Seconds allowed for the TCP connect, and to wait before trying again
+CONNECT_TIMEOUT = 2.0
+RECONNECT_DELAY = 5.0
+
 
 class StuderVista(Console):
     type = "Studer Vista"
     supported_features = []
     _client_socket: socket.socket
-    _shutdown_server_event = threading.Event()
-    _received_real_data = threading.Event()
+
+    def __init__(self, settings: Optional[ThreadSafeSettings] = None, bus: Optional[EventBus] = None) -> None:
+        super().__init__(settings, bus)
+        self._received_real_data = threading.Event()
 
     def start_managed_threads(
         self, start_managed_thread: Callable[[str, Any], None]
     ) -> None:
-        self._shutdown_server_event.clear()
-        self._received_real_data.clear()
         start_managed_thread("console_connection_thread", self._console_client_thread)
-        pub.subscribe(self._shutdown_server_event.set, "shutdown_servers")
 
-    def _console_client_thread(self):
-        from app_settings import settings
+    def shutdown_servers(self) -> None:
+        super().shutdown_servers()
+        if hasattr(self, "_client_socket"):
+            try:
+                # Wakes the client thread if it is blocked in recv
+                self._client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
 
-        while not self._shutdown_server_event.is_set():
+    def _console_client_thread(self, token: CancellationToken):
+        token.on_cancel(self.shutdown_servers)
+        while not token.cancelled:
             with socket.socket(
                 socket.AF_INET, socket.SOCK_STREAM
             ) as self._client_socket:
                 try:
+                    self._client_socket.settimeout(CONNECT_TIMEOUT)
                     self._client_socket.connect(
-                        (settings.console_ip, settings.console_port)
+                        (self.settings.console_ip, self.settings.console_port)
                     )
+                    self._client_socket.settimeout(None)
                     logger.info("Ember connected successfully")
-                except TimeoutError:
+                except OSError as e:
+                    logger.debug(f"Ember connection failed: {e}")
+                    token.wait(RECONNECT_DELAY)
                     continue
                 self._send_subscribe()
-                while not self._shutdown_server_event.is_set():
+                while not token.cancelled:
                     try:
                         result_bytes = self._client_socket.recv(4096)
                     except ConnectionResetError:
                         logger.error("Ember connection reset")
-                        pub.sendMessage("console_disconnected")
+                        self.bus.send_message("console_disconnected")
+                        break
+                    if not result_bytes:
+                        # Connection closed by the console or by shutdown_servers
                         break
+                    ingest = time.perf_counter()
+                    self.on_inbound()
                     decoder = asn1.Decoder()
                     decoder.start(result_bytes)
                     _, value = decoder.read()
                     decoded_message = self._decode_message(value)
                     if decoded_message:
-                        pub.sendMessage("console_connected", consolename="Connected")
+                        self.bus.publish(ConsoleConnected(consolename="Connected"))
                         self._received_real_data.set()
                         if decoded_message != "Last Recalled Snapshot":
                             decoded_message = decoded_message[-1:][0]
-                            pub.sendMessage("handle_cue_load", cue=decoded_message)
-            time.sleep(5000)
+                            self.cue_settler.recall(
+                                decoded_message, ingest,
+                                lambda ingest, cue=decoded_message: self.bus.publish(CueLoad(cue=cue, ingest=ingest)),
+                            )
+            token.wait(RECONNECT_DELAY)
 
     def _decode_message(self, value: Any) -> List[str]:
         message_string: List[str] = []
@@ -79,14 +103,18 @@ class StuderVista(Console):
         if hasattr(self, "_client_socket"):
             try:
                 if self._received_real_data.is_set():
+                    # Keepalive, the reply is what tells the link monitor we're connected
                     self._client_socket.sendall(
                         b"\x7f\x8f\xff\xfe\xd9\\\x800\x80\x00\x00\x00\x00"
                     )
-                    pub.sendMessage("console_connected", consolename="Connected")
                 else:
                     self._send_subscribe()
-                    pub.sendMessage(
-                        "console_connected", consolename="Starting", colour=wx.YELLOW
+                    self.bus.publish(
+                        ConsoleConnected(consolename="Starting", colour="yellow")
                     )
             except OSError:
-                pub.sendMessage("console_disconnected")
+                self.bus.send_message("console_disconnected")
+
+    def link_up(self) -> None:
+        if self._received_real_data.is_set():
+            self.bus.publish(ConsoleConnected(consolename="Connected"))
@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from app_settings import ThreadSafeSettings
+from logger_config import logger
+
+
+class CueSettler:
+    # Holds each recall for the settle window and drops it if another one
+    # comes in meanwhile, so scrolling through snapshots or a run of GOs
+    # only acts on the cue the console ends up on. Whatever the recall rate,
+    # the DAW sees at most one cue per settle window. A window of 0 acts on
+    # every recall straight away. The wait runs on a thread that only lives
+    # while a recall is pending.
+    def __init__(self, settings: ThreadSafeSettings, on_skipped: Callable[[str], None]):
+        self.settings = settings
+        self.on_skipped = on_skipped
+        self.settled = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._pending: Optional[Tuple[str, float, Callable[[float], None], Optional[Callable[[], None]]]] = None
+        self._deadline = 0.0
+        self._waiting = False
+
+    def recall(self, label: str, ingest: float, act: Callable[[float], None],
+               on_skipped: Optional[Callable[[], None]] = None) -> None:
+        # label names the recall in logs and the journal, act is called with
+        # the ingest time once the recall has settled. A console that only
+        # knows a recall's name once it has asked for it passes on_skipped,
+        # which is called instead of the settler's own if the recall is skipped.
+        window = self.settings.snapshot.cue_settle_time
+        if window <= 0:
+            self._act(act, ingest)
+            return
+        with self._lock:
+            skipped = self._pending
+            self._pending = (label, ingest, act, on_skipped)
+            self._deadline = time.monotonic() + window
+            if not self._waiting:
+                self._waiting = True
+                threading.Thread(target=self._wait, name="cue_settle", daemon=True).start()
+        if skipped is not None:
+            self.skipped += 1
+            logger.info("Skipped %s, another recall followed within the settle window", skipped[0])
+            self._notify_skipped(skipped[0], skipped[3])
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._pending = None
+
+    def _wait(self) -> None:
+        while True:
+            with self._lock:
+                remaining = self._deadline - time.monotonic()
+                if remaining <= 0:
+                    pending, self._pending = self._pending, None
+                    self._waiting = False
+                    break
+            time.sleep(remaining)
+        if pending is not None:
+            self._act(pending[2], pending[1])
+
+    def _act(self, act: Callable[[float], None], ingest: float) -> None:
+        self.settled += 1
+        try:
+            act(ingest)
+        except Exception as e:
+            logger.error(f"Cue recall handler error: {e}")
+
+    def _notify_skipped(self, label: str, on_skipped: Optional[Callable[[], None]]) -> None:
+        try:
+            if on_skipped is None:
+                self.on_skipped(label)
+            else:
+                on_skipped()
+        except Exception as e:
+            logger.error(f"Skipped cue handler error: {e}")
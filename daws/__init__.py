@@ -1,5 +1,19 @@
 from .daw import Daw
-from .reaper import Reaper
-from .protools import ProTools
+from backend_registry import Backend
 
-__all__ = ["Daw", "Reaper", "ProTools"]
+# Backend modules are only imported when a DAW of that type is selected
+DAWS = {
+    "Reaper": Backend("Reaper", "daws.reaper", "Reaper"),
+    "ProTools": Backend("ProTools", "daws.protools", "ProTools"),
+}
+
+
+def __getattr__(name):
+    # Keep `from daws import Reaper` working without importing every backend
+    for backend in DAWS.values():
+        if backend.class_name == name:
+            return backend.load()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["Daw", "DAWS", "Reaper", "ProTools"]
@@ -1,14 +1,82 @@
-from typing import Callable, List
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from app_settings import ThreadSafeSettings, settings as app_settings
+from event_bus import EventBus, bus as app_bus
+
+# Seconds between the markers seed_markers lays out
+SEED_SPACING = 1.0
 
 
 class Daw:
     type = "Unknown"
+    # Set on the extra DAWs a pairing fans out to, to tell their threads and
+    # metrics apart from the first one's
+    label = ""
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, settings: Optional[ThreadSafeSettings] = None, bus: Optional[EventBus] = None) -> None:
+        # The pairing's settings and bus, the app wide ones unless the bridge
+        # hosts more than one DAW
+        self.settings = app_settings if settings is None else settings
+        self.bus = app_bus if bus is None else bus
+
+    @property
+    def subscriber_name(self) -> str:
+        # Name of this DAW's bus queue in metrics and logs
+        return f"{self.type}/{self.label}" if self.label else self.type
 
     def start_managed_threads(
         self, start_managed_thread: Callable[[str, Callable], None]
     ) -> None:
         pass
 
+    def shutdown_servers(self) -> None:
+        pass
+
+    def connect(self) -> None:
+        # Opens the connection used to send to the DAW without starting any
+        # servers, for one-off commands like rebuilding markers
+        pass
+
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        # After start_managed_threads, waits until the DAW can be sent
+        # commands and has said what it is doing. False if it never did.
+        return True
+
+    def position(self) -> Optional[float]:
+        # Playhead position in seconds on the session timeline, None if unknown
+        return None
+
+    def place_marker_at(self, position: float, marker_name: str) -> None:
+        raise NotImplementedError(f"{self.type} can't place markers at a position")
+
+    def marker_names(self) -> List[str]:
+        # Names of the markers already in the session
+        raise NotImplementedError(f"{self.type} can't list its markers")
+
+    def add_markers(self, markers: Sequence[Tuple[float, str]]) -> None:
+        # Places (position, name) markers. Backends that can send several in
+        # one go override this.
+        for position, marker_name in markers:
+            self.place_marker_at(position, marker_name)
+
+    def seed_markers(self, cues: Sequence[str], start: float = 0.0,
+                     spacing: float = SEED_SPACING) -> Tuple[int, int]:
+        # Adds a marker for every cue the session doesn't have one for yet,
+        # laid out in cue order `spacing` seconds apart from `start`, so
+        # playback tracking finds every cue. Markers already there are left
+        # alone, including ones that aren't cues. Returns (added, already there).
+        name_only = self.settings.snapshot.name_only_match
+
+        def key(name: str) -> str:
+            # Matched the way playback tracking matches them
+            return " ".join(name.split(" ")[1:]) if name_only else name
+
+        existing = {key(name) for name in self.marker_names()}
+        missing = []
+        for index, cue in enumerate(cues):
+            if key(cue) not in existing:
+                existing.add(key(cue))
+                missing.append((start + index * spacing, cue))
+        if missing:
+            self.add_markers(missing)
+        return len(missing), len(cues) - len(missing)
@@ -1,27 +1,30 @@
-from setuptools.command.build_ext import if_dl
-
 from . import Daw
 import ptsl
 from ptsl import PTSL_pb2 as pt
 from pubsub import pub
 from typing import Any, Callable
+from app_settings import ThreadSafeSettings
+from event_bus import EventBus, CueLoad, PlaceMarker, TransportAction
 from logger_config import logger
+from supervisor import CancellationToken
 import threading
 import sys
 import time
 from typing import Optional
 
+
 class ProTools(Daw):
     type = "ProTools"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, settings: Optional[ThreadSafeSettings] = None, bus: Optional[EventBus] = None,
+                 address: Optional[str] = None):
+        super().__init__(settings, bus)
+        self.address = address or self.settings.ptsl_address
         self.pt_engine_connection = None
         self.pt_send_lock = threading.Lock()
-        pub.subscribe(self._place_marker_with_name, "place_marker_with_name")
-        pub.subscribe(self._incoming_transport_action, "incoming_transport_action")
-        pub.subscribe(self._handle_cue_load, "handle_cue_load")
-        pub.subscribe(self._shutdown_servers, "shutdown_servers")
+        self.bus.subscribe(PlaceMarker, self._place_marker_with_name)
+        self.bus.subscribe(TransportAction, self._incoming_transport_action)
+        self.bus.subscribe(CueLoad, self._handle_cue_load)
 
     def start_managed_threads(
             self, start_managed_thread: Callable[[str, Any], None]
@@ -31,13 +34,75 @@ class ProTools(Daw):
             "daw_connection_thread", self._open_protools_connection
         )
 
-    def _open_protools_connection(self):
+    def _open_protools_connection(self, token: Optional[CancellationToken] = None):
         self.pt_engine_connection = ptsl.engine.Engine(company_name="JSSD",
-                                         application_name=sys.argv[0])
+                                         application_name=sys.argv[0],
+                                         address=self.address)
         if self.pt_engine_connection is not None:
             logger.info("Connection established to Pro Tools")
 
 
+    def connect(self):
+        self._open_protools_connection()
+
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        # The connection is opened by the daw connection thread
+        deadline = time.monotonic() + timeout
+        while self.pt_engine_connection is None:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def position(self):
+        # Start of the timeline selection, which is where the playhead is
+        # when nothing is selected
+        if not self.pt_engine_connection:
+            return None
+        try:
+            in_time, _ = self.pt_engine_connection.get_timeline_selection(format=pt.Samples)
+            return int(in_time) / self.pt_engine_connection.session_sample_rate()
+        except Exception as e:
+            logger.debug(f"Could not read the Pro Tools position: {e}")
+            return None
+
+    def _sample_rate(self):
+        # Marker positions are given in seconds and Pro Tools takes samples.
+        # There is no rate without an open session.
+        assert self.pt_engine_connection
+        try:
+            sample_rate = self.pt_engine_connection.session_sample_rate()
+        except Exception as e:
+            logger.debug(f"Could not read the Pro Tools sample rate: {e}")
+            sample_rate = None
+        if not sample_rate:
+            logger.error("Cannot place markers, Pro Tools has no session open")
+            raise RuntimeError("Pro Tools has no session open")
+        return sample_rate
+
+    def place_marker_at(self, position, marker_name):
+        self._create_marker(position, marker_name, self._sample_rate())
+
+    def marker_names(self):
+        assert self.pt_engine_connection
+        return [location.name for location in self.pt_engine_connection.get_memory_locations()]
+
+    def add_markers(self, markers):
+        # PTSL creates one memory location per command, so the batch is the
+        # missing markers sent back to back with a single sample rate lookup
+        sample_rate = self._sample_rate()
+        with self.pt_send_lock:
+            for position, marker_name in markers:
+                self._create_marker(position, marker_name, sample_rate)
+
+    def _create_marker(self, position, marker_name, sample_rate):
+        samples = str(round(position * sample_rate))
+        self.pt_engine_connection.create_memory_location(name=marker_name,
+                                                         start_time=samples,
+                                                         end_time=samples,
+                                                         time_properties=pt.TP_Marker,
+                                                         reference=pt.MLR_Absolute)
+
     def do_newmemloc(self, args):
         'Create a new marker memory location: NEWMEMLOC start-time'
         command_args = {'name': 'New Marker',
@@ -117,7 +182,8 @@ class ProTools(Daw):
                         logger.error("Play command failed, no session is currently open")
                         return False
 
-    def _shutdown_servers(self):
+    def shutdown_servers(self):
+        self.bus.unsubscribe(self)
         try:
             if self.pt_engine_connection:
                 self.pt_engine_connection.close()
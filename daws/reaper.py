@@ -1,42 +1,88 @@
 from . import Daw
+from app_settings import ThreadSafeSettings
+from event_bus import EventBus, CueLoad, PlaceMarker, TransportAction
 from logger_config import logger
-from typing import Any, Callable
-from pubsub import pub
-from pythonosc import dispatcher, osc_server, udp_client
+from metrics import CountingOSCUDPServer, CountingUDPClient
+from osc_encoder import BUNDLE_HEADER, OscTemplate, osc_bundle
+from supervisor import CancellationToken, serve
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from pythonosc import dispatcher
 from pythonosc.dispatcher import Dispatcher
 from pythonosc.osc_server import ThreadingOSCUDPServer
+import ipaddress
 import threading
+import time
 import configure_reaper
 
+# Reaper's OSC commands, encoded once. Actions are Reaper command IDs.
+ACTION = OscTemplate("/action", "i")
+ADD_MARKER = ACTION.encode(40157)
+PLAY = ACTION.encode(1007)
+STOP = ACTION.encode(1016)
+GO_TO_END = ACTION.encode(40043)
+# "Control surface: Refresh all surfaces", makes Reaper resend its state
+REFRESH_SURFACES = ACTION.encode(41743)
+RECORD = ACTION.encode(1013)
+GO_TO_MARKER = OscTemplate("/marker", "i")
+LAST_MARKER_NAME = OscTemplate("/lastmarker/name", "s")
+SET_TIME = OscTemplate("/time", "f")
+# Asking for no markers then for up to 512 makes Reaper send the names of all of them
+MARKER_COUNT_RESET = OscTemplate("/device/marker/count", "i").encode(0)
+MARKER_COUNT_ALL = OscTemplate("/device/marker/count", "i").encode(512)
+# Seeded markers are sent as bundles that fit in one Ethernet frame
+SEED_BUNDLE_BYTES = 1400
+# Reaper sends one message per marker name, the list is complete once they stop
+MARKER_LIST_QUIET = 0.3
 
 class Reaper(Daw):
     type = "Reaper"
+    # Whether a local Reaper's ini file is checked for, and given, an OSC
+    # interface for our ports. Benchmarks driving a fake Reaper turn it off.
+    validate_prefs = True
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, settings: Optional[ThreadSafeSettings] = None, bus: Optional[EventBus] = None):
+        super().__init__(settings, bus)
         self.reaper_send_lock = threading.Lock()
         self.name_to_match = ""
         self.is_playing = False
         self.is_recording = False
+        # Which of /play and /record Reaper has reported since the server started
+        self._transport_reported = set()
+        self._transport_known = threading.Event()
         self.reaper_osc_server = None
-        pub.subscribe(self._place_marker_with_name, "place_marker_with_name")
-        pub.subscribe(self._incoming_transport_action, "incoming_transport_action")
-        pub.subscribe(self._handle_cue_load, "handle_cue_load")
-        pub.subscribe(self._shutdown_servers, "shutdown_servers")
-        self._validate_reaper_prefs()
+        self.reaper_client = None
+        # Reaper reports the playhead on /time while it moves
+        self.playhead = None
+        # Marker names by Reaper ID while marker_names() collects them
+        self._marker_listing: Optional[Dict[str, str]] = None
+        self.bus.subscribe(PlaceMarker, self._place_marker_with_name)
+        self.bus.subscribe(TransportAction, self._incoming_transport_action)
+        self.bus.subscribe(CueLoad, self._handle_cue_load)
+        if self.validate_prefs and self._is_local():
+            self._validate_reaper_prefs()
+
+    def _is_local(self) -> bool:
+        # A Reaper on another machine has its own preferences and sends its
+        # replies over the network rather than to localhost
+        reaper_ip = self.settings.reaper_ip
+        if reaper_ip == "localhost":
+            return True
+        try:
+            return ipaddress.ip_address(reaper_ip).is_loopback
+        except ValueError:
+            return False
 
     def _validate_reaper_prefs(self):
         # If the Reaper .ini file does not contain an entry for Digico-Reaper Link, add one.
-        from app_settings import settings
         try:
-            if not self._check_reaper_prefs(settings.reaper_receive_port, settings.reaper_port):
-                self._add_reaper_prefs(settings.reaper_receive_port, settings.reaper_port)
-                pub.sendMessage("reset_reaper", resetreaper=True)
+            if not self._check_reaper_prefs(self.settings.reaper_receive_port, self.settings.reaper_port):
+                self._add_reaper_prefs(self.settings.reaper_receive_port, self.settings.reaper_port)
+                self.bus.send_message("reset_reaper", resetreaper=True)
             return True
         except RuntimeError as e:
             # If reaper is not running, send an error to the UI
             logger.debug(f"Reaper not running: {e}")
-            pub.sendMessage('reaper_error', reapererror=e)
+            self.bus.send_message('reaper_error', reapererror=e)
             return False
 
     @staticmethod
@@ -61,33 +107,49 @@ class Reaper(Daw):
             "daw_connection_thread", self._build_reaper_osc_servers
         )
 
-    def _build_reaper_osc_servers(self):
+    def _build_reaper_osc_servers(self, token: CancellationToken):
         # Connect to Reaper via OSC
-        from app_settings import settings
         logger.info("Starting Reaper OSC server")
-        self.reaper_client = udp_client.SimpleUDPClient(settings.reaper_ip, settings.reaper_port)
+        self.connect()
         self.reaper_dispatcher = dispatcher.Dispatcher()
         self._receive_reaper_OSC()
         try:
-            self.reaper_osc_server = osc_server.ThreadingOSCUDPServer(("127.0.0.1", settings.reaper_receive_port),
-                                                                      self.reaper_dispatcher)
+            listen_ip = "127.0.0.1" if self._is_local() else "0.0.0.0"
+            self.reaper_osc_server = CountingOSCUDPServer((listen_ip, self.settings.reaper_receive_port),
+                                                          self.reaper_dispatcher, "daw_in")
             logger.info("Reaper OSC server started")
-            self.reaper_osc_server.serve_forever()
+            serve(self.reaper_osc_server, token)
+            logger.info("Reaper OSC Server shutdown completed")
         except Exception as e:
             logger.error(f"Reaper OSC server startup error: {e}")
+        finally:
+            self.reaper_osc_server = None
+
+    def connect(self):
+        self.reaper_client = CountingUDPClient(self.settings.reaper_ip, self.settings.reaper_port, "daw_out")
 
     def _receive_reaper_OSC(self):
         # Receives and distributes OSC from Reaper, based on matching OSC values
         self.reaper_dispatcher.map("/marker/*/name", self._marker_matcher)
         self.reaper_dispatcher.map("/play", self._current_transport_state)
         self.reaper_dispatcher.map("/record", self._current_transport_state)
+        self.reaper_dispatcher.map("/time", self._playhead_moved)
+
+    def _playhead_moved(self, OSCAddress, seconds):
+        self.playhead = float(seconds)
+
+    def position(self):
+        return self.playhead
 
     def _marker_matcher(self, OSCAddress, test_name):
         # Matches a marker composite name with its Reaper ID
-        from app_settings import settings
         address_split = OSCAddress.split("/")
         marker_id = address_split[2]
-        if settings.name_only_match:
+        listing = self._marker_listing
+        if listing is not None:
+            listing[marker_id] = test_name
+            return
+        if self.settings.snapshot.name_only_match:
             test_name = test_name.split(" ")
             test_name = test_name[1:]
             test_name = " ".join(test_name)
@@ -120,29 +182,91 @@ class Reaper(Daw):
         elif recording is False:
             self.is_recording = False
             logger.info("Reaper is not recording")
+        self._transport_reported.add(OSCAddress)
+        if len(self._transport_reported) == 2:
+            self._transport_known.set()
+
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        # The transport guards only mean something once Reaper has reported
+        # whether it is playing and recording, so ask it to resend its state
+        deadline = time.monotonic() + timeout
+        while self.reaper_osc_server is None:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        with self.reaper_send_lock:
+            self.reaper_client.send_dgram(REFRESH_SURFACES)
+        return self._transport_known.wait(max(0.0, deadline - time.monotonic()))
 
     def _goto_marker_by_id(self, marker_id):
         with self.reaper_send_lock:
-            self.reaper_client.send_message("/marker", int(marker_id))
+            self.reaper_client.send_dgram(GO_TO_MARKER.encode(int(marker_id)))
 
     def _place_marker_with_name(self, marker_name):
         with self.reaper_send_lock:
-            self.reaper_client.send_message("/action", 40157)
-            self.reaper_client.send_message("/lastmarker/name", marker_name)
+            self.reaper_client.send_dgram(ADD_MARKER)
+            self.reaper_client.send_dgram(LAST_MARKER_NAME.encode(marker_name))
+
+    def place_marker_at(self, position, marker_name):
+        # Moves the edit cursor to position and drops a named marker there.
+        # Moving the cursor would move a running playhead too.
+        if self.is_playing or self.is_recording:
+            raise RuntimeError("Stop Reaper before placing markers at a position")
+        with self.reaper_send_lock:
+            self.reaper_client.send_dgram(SET_TIME.encode(float(position)))
+            self.reaper_client.send_dgram(ADD_MARKER)
+            self.reaper_client.send_dgram(LAST_MARKER_NAME.encode(marker_name))
+
+    def marker_names(self) -> List[str]:
+        # Only works while the bridge is receiving Reaper's replies, and
+        # sees at most the 512 markers the count query asks for
+        if self.reaper_osc_server is None:
+            raise RuntimeError("Not receiving from Reaper, start the bridge first")
+        listing: Dict[str, str] = {}
+        self._marker_listing = listing
+        try:
+            with self.reaper_send_lock:
+                self.reaper_client.send_dgram(MARKER_COUNT_RESET)
+                self.reaper_client.send_dgram(MARKER_COUNT_ALL)
+            seen = -1
+            while len(listing) != seen:
+                seen = len(listing)
+                time.sleep(MARKER_LIST_QUIET)
+        finally:
+            self._marker_listing = None
+        return [name for name in listing.values() if name]
+
+    def add_markers(self, markers: Sequence[Tuple[float, str]]) -> None:
+        # Each marker is the same three messages place_marker_at sends, and
+        # as many markers as fit go in one bundle
+        if self.is_playing or self.is_recording:
+            raise RuntimeError("Stop Reaper before placing markers at a position")
+        bundle: List[bytes] = []
+        size = len(BUNDLE_HEADER)
+        with self.reaper_send_lock:
+            for position, marker_name in markers:
+                messages = [SET_TIME.encode(float(position)), ADD_MARKER, LAST_MARKER_NAME.encode(marker_name)]
+                marker_size = sum(4 + len(message) for message in messages)
+                if bundle and size + marker_size > SEED_BUNDLE_BYTES:
+                    self.reaper_client.send_dgram(osc_bundle(bundle))
+                    bundle, size = [], len(BUNDLE_HEADER)
+                bundle.extend(messages)
+                size += marker_size
+            if bundle:
+                self.reaper_client.send_dgram(osc_bundle(bundle))
 
     def get_marker_id_by_name(self, name):
         # Asks for current marker information based upon number of markers.
-        from app_settings import settings
         if self.is_playing is False:
             self.name_to_match = name
-        if settings.name_only_match:
+        if self.settings.snapshot.name_only_match:
             self.name_to_match = self.name_to_match.split(" ")
             self.name_to_match = self.name_to_match[1:]
             self.name_to_match = " ".join(self.name_to_match)
         with self.reaper_send_lock:
-            self.reaper_client.send_message("/device/marker/count", 0)
+            self.reaper_client.send_dgram(MARKER_COUNT_RESET)
             # Is there a better way to handle this in OSC only? Max of 512 markers.
-            self.reaper_client.send_message("/device/marker/count", 512)
+            self.reaper_client.send_dgram(MARKER_COUNT_ALL)
 
     def _incoming_transport_action(self, transport_action):
         try:
@@ -157,33 +281,27 @@ class Reaper(Daw):
 
     def _reaper_play(self):
         with self.reaper_send_lock:
-            self.reaper_client.send_message("/action", 1007)
+            self.reaper_client.send_dgram(PLAY)
 
     def _reaper_stop(self):
         with self.reaper_send_lock:
-            self.reaper_client.send_message("/action", 1016)
+            self.reaper_client.send_dgram(STOP)
 
     def _reaper_rec(self):
         # Sends action to skip to end of project and then record, to prevent overwrites
-        from app_settings import settings
-        settings.marker_mode = "Recording"
-        pub.sendMessage("mode_select_osc", selected_mode="Recording")
+        self.settings.marker_mode = "Recording"
+        self.bus.send_message("mode_select_osc", selected_mode="Recording")
         with self.reaper_send_lock:
-            self.reaper_client.send_message("/action", 40043)
-            self.reaper_client.send_message("/action", 1013)
+            self.reaper_client.send_dgram(GO_TO_END)
+            self.reaper_client.send_dgram(RECORD)
 
     def _handle_cue_load(self, cue: str) -> None:
-        from app_settings import settings
-        if settings.marker_mode == "Recording" and self.is_recording is True:
+        marker_mode = self.settings.snapshot.marker_mode
+        if marker_mode == "Recording" and self.is_recording is True:
             self._place_marker_with_name(cue)
-        elif settings.marker_mode == "PlaybackTrack" and self.is_playing is False:
+        elif marker_mode == "PlaybackTrack" and self.is_playing is False:
             self.get_marker_id_by_name(cue)
 
-    def _shutdown_servers(self):
-        try:
-            if self.reaper_osc_server:
-                self.reaper_osc_server.shutdown()
-                self.reaper_osc_server.server_close()
-            logger.info(f"Reaper OSC Server shutdown completed")
-        except Exception as e:
-            logger.error(f"Error shutting down Reaper server: {e}")
\ No newline at end of file
+    def shutdown_servers(self):
+        # The OSC server stops with its worker
+        self.bus.unsubscribe(self)
@@ -0,0 +1,274 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, fields
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Type, Union
+
+from pubsub import pub
+
+from logger_config import logger
+from metrics import metrics
+
+
+class Priority(IntEnum):
+    # Each subscriber handles what waits at a higher priority first
+    CONTROL = 0  # cues, markers and transport actions, never shed
+    STATUS = 1  # connection status and the like, the oldest is shed when the queue is full
+
+
+class Event:
+    # Base class for events carried on the bus. `topic` is the pypubsub topic
+    # name the event replaces, so existing callers keep working. `priority`
+    # is the one subscribers get it at unless they ask for another.
+    __slots__ = ()
+    topic = ""
+    priority = Priority.STATUS
+
+
+def _ingest():
+    # perf_counter() time the triggering packet arrived from the console. It
+    # travels with the event for metrics and is not passed to handlers.
+    return field(default=0.0, compare=False, metadata={"meta": True})
+
+
+@dataclass(frozen=True, slots=True)
+class CueLoad(Event):
+    topic = "handle_cue_load"
+    priority = Priority.CONTROL
+    cue: str
+    ingest: float = _ingest()
+
+
+@dataclass(frozen=True, slots=True)
+class CueSkipped(Event):
+    # A recall that another one replaced within the settle window
+    topic = "cue_skipped"
+    cue: str
+
+
+@dataclass(frozen=True, slots=True)
+class PlaceMarker(Event):
+    topic = "place_marker_with_name"
+    priority = Priority.CONTROL
+    marker_name: str
+    ingest: float = _ingest()
+
+
+@dataclass(frozen=True, slots=True)
+class TransportAction(Event):
+    topic = "incoming_transport_action"
+    priority = Priority.CONTROL
+    transport_action: str
+    ingest: float = _ingest()
+
+
+@dataclass(frozen=True, slots=True)
+class ConsoleConnected(Event):
+    topic = "console_connected"
+    consolename: str
+    # Colour name for the status field, kept free of wx so headless builds work
+    colour: str = "green"
+
+
+EVENT_TYPES: Dict[str, Type[Event]] = {
+    event_type.topic: event_type
+    for event_type in (CueLoad, CueSkipped, PlaceMarker, TransportAction, ConsoleConnected)
+}
+
+# Handler argument names per event type, so delivery doesn't introspect on every call
+_FIELD_NAMES: Dict[Type[Event], Tuple[str, ...]] = {
+    event_type: tuple(f.name for f in fields(event_type) if not f.metadata.get("meta"))
+    for event_type in EVENT_TYPES.values()
+}
+
+_STOP = object()
+
+
+class Subscriber:
+    # One queue per priority and one dispatch thread per subscribing object.
+    # Handlers are called with the event's fields as keyword arguments, the
+    # same way pypubsub calls them. Events of one priority are handled in the
+    # order they were published, and a control event never waits behind a
+    # status one.
+    def __init__(self, owner: Any, maxsize: int):
+        self.owner = owner
+        self.maxsize = maxsize
+        self.handlers: Dict[Type[Event], Callable] = {}
+        self.priorities: Dict[Type[Event], Priority] = {}
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.handler_time = 0.0
+        self.handler_time_max = 0.0
+        self.queue_time_max = 0.0
+        self._queues: List[Deque] = [deque() for _ in Priority]
+        self._ready = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._dispatch, name=f"bus-{type(owner).__name__}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def name(self) -> str:
+        # Owners with several instances on one bus, like DAWs, name themselves
+        return getattr(self.owner, "subscriber_name", None) or getattr(
+            self.owner, "__qualname__", type(self.owner).__name__
+        )
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    def offer(self, item) -> None:
+        # Never blocks the publisher. Control events are always queued, even
+        # behind a stalled DAW. A full status queue drops its oldest event to
+        # make room for the newest one.
+        priority = self.priorities.get(type(item[0]), Priority.STATUS)
+        with self._ready:
+            queue = self._queues[priority]
+            if priority != Priority.CONTROL and len(queue) >= self.maxsize:
+                queue.popleft()
+                self.dropped += 1
+            queue.append(item)
+            self._ready.notify()
+
+    def stop(self) -> None:
+        # Events already queued are handled first
+        with self._ready:
+            self._queues[-1].append(_STOP)
+            self._ready.notify()
+
+    def _next(self):
+        with self._ready:
+            while True:
+                for queue in self._queues:
+                    if queue:
+                        return queue.popleft()
+                self._ready.wait()
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._next()
+            if item is _STOP:
+                return
+            event, published = item
+            handler = self.handlers.get(type(event))
+            if handler is None:
+                continue
+            started = time.perf_counter()
+            try:
+                handler(**{name: getattr(event, name) for name in _FIELD_NAMES[type(event)]})
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error handling {type(event).__name__} in {self.name}: {e}")
+            finished = time.perf_counter()
+            self.delivered += 1
+            self.handler_time += finished - started
+            self.handler_time_max = max(self.handler_time_max, finished - started)
+            self.queue_time_max = max(self.queue_time_max, started - published)
+            event_name = type(event).__name__
+            metrics.histogram(f"dispatch.{event_name}").observe(started - published)
+            metrics.histogram(f"handler.{self.name}.{event_name}").observe(finished - started)
+            ingest = getattr(event, "ingest", 0.0)
+            if ingest:
+                metrics.histogram(f"end_to_end.{self.name}.{event_name}").observe(finished - ingest)
+
+
+class EventBus:
+    # Queued replacement for pypubsub on the hot path. Publishing only puts
+    # the event on each subscriber's queue, so a slow UI or DAW handler never
+    # delays the network thread that published it. A pairing other than the
+    # main one gets its own bus, with topic_prefix keeping its pypubsub
+    # topics apart from the ones the main window listens to.
+    def __init__(self, maxsize: int = 256, topic_prefix: str = ""):
+        self.maxsize = maxsize
+        self.topic_prefix = topic_prefix
+        self._lock = threading.Lock()
+        self._subscribers: Dict[Any, Subscriber] = {}
+        # Copy-on-write routing table, read without locking when publishing
+        self._routes: Dict[Type[Event], Tuple[Subscriber, ...]] = {}
+
+    def subscribe(
+        self,
+        event_type: Union[Type[Event], str],
+        handler: Callable,
+        priority: Optional[Priority] = None,
+        maxsize: Optional[int] = None,
+    ) -> None:
+        # Handlers that are bound methods of the same object share one set
+        # of queues and one thread, so none waits on another object's
+        # handlers. priority overrides the event type's own for this handler.
+        if isinstance(event_type, str):
+            event_type = EVENT_TYPES[event_type]
+        owner = getattr(handler, "__self__", handler)
+        with self._lock:
+            subscriber = self._subscribers.get(id(owner))
+            if subscriber is None:
+                subscriber = Subscriber(owner, maxsize or self.maxsize)
+                self._subscribers[id(owner)] = subscriber
+            subscriber.handlers[event_type] = handler
+            subscriber.priorities[event_type] = event_type.priority if priority is None else priority
+            self._rebuild_routes()
+
+    def unsubscribe(self, owner: Any) -> None:
+        # Removes every handler belonging to owner and stops its dispatch thread
+        owner = getattr(owner, "__self__", owner)
+        with self._lock:
+            subscriber = self._subscribers.pop(id(owner), None)
+            self._rebuild_routes()
+        if subscriber:
+            subscriber.stop()
+
+    def publish(self, event: Event) -> None:
+        item = (event, time.perf_counter())
+        for subscriber in self._routes.get(type(event), ()):
+            subscriber.offer(item)
+
+    def send_message(self, topic: str, **kwargs) -> None:
+        # Compatibility shim for pypubsub style calls. Topics that have a bus
+        # event go through the bus, everything else still goes to pypubsub.
+        event_type = EVENT_TYPES.get(topic)
+        if event_type is None:
+            pub.sendMessage(self.topic_prefix + topic, **kwargs)
+        else:
+            self.publish(event_type(**kwargs))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        # Queue depth and handler latency per subscriber
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        return [
+            {
+                "subscriber": s.name,
+                "depth": s.depth,
+                "delivered": s.delivered,
+                "dropped": s.dropped,
+                "errors": s.errors,
+                "handler_avg_ms": s.handler_time / s.delivered * 1000 if s.delivered else 0.0,
+                "handler_max_ms": s.handler_time_max * 1000,
+                "queue_max_ms": s.queue_time_max * 1000,
+            }
+            for s in subscribers
+        ]
+
+    def queue_stats(self) -> Dict[str, Dict[str, int]]:
+        # The per subscriber figures the metrics report
+        return {
+            s["subscriber"]: {"depth": s["depth"], "dropped": s["dropped"], "errors": s["errors"]}
+            for s in self.stats()
+        }
+
+    def _rebuild_routes(self) -> None:
+        routes: Dict[Type[Event], List[Subscriber]] = {}
+        for subscriber in self._subscribers.values():
+            for event_type in subscriber.handlers:
+                routes.setdefault(event_type, []).append(subscriber)
+        self._routes = {
+            event_type: tuple(subs)
+            for event_type, subs in routes.items()
+        }
+
+
+bus = EventBus()
+metrics.gauge("bus", bus.queue_stats)
@@ -0,0 +1,2 @@
+# Local stand-ins for the consoles and DAWs the bridge talks to, used by the
+# benchmarks and for development without a desk or DAW on the network.
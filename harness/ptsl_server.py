@@ -0,0 +1,246 @@
+import argparse
+import itertools
+import random
+import threading
+import time
+from concurrent import futures
+from typing import Dict, List, Optional
+
+import grpc
+from google.protobuf import json_format
+from ptsl import PTSL_pb2 as pt
+from ptsl import PTSL_pb2_grpc
+
+from logger_config import logger
+
+DEFAULT_ADDRESS = "localhost:31416"
+SAMPLE_RATE = 48000
+
+
+class PtslStandIn(PTSL_pb2_grpc.PTSLServicer):
+    # Implements the part of the PTSL service that the ProTools backend uses:
+    # transport state, record arm, play toggle and memory locations.
+    # Every command can be delayed or made to fail to exercise the backend's
+    # timing and error handling without a running Pro Tools.
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        delays: Optional[Dict[str, float]] = None,
+        fail_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.delay = delay
+        self.delays = dict(delays or {})
+        self.fail_rate = fail_rate
+        self.session_open = True
+        self.calls: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._failures: Dict[int, List] = {}
+        self._session_ids = itertools.count(1)
+        self._transport = pt.TS_TransportStopped
+        self._armed = False
+        self._play_started = 0.0
+        self._playhead = 0
+        self._memory_locations: List[pt.MemoryLocation] = []
+        self._handlers = {
+            pt.HostReadyCheck: self._host_ready_check,
+            pt.RegisterConnection: self._register_connection,
+            pt.GetTransportState: self._get_transport_state,
+            pt.GetTransportArmed: self._get_transport_armed,
+            pt.TogglePlayState: self._toggle_play_state,
+            pt.ToggleRecordEnable: self._toggle_record_enable,
+            pt.CreateMemoryLocation: self._create_memory_location,
+            pt.GetMemoryLocations: self._get_memory_locations,
+            pt.GetSessionSampleRate: self._get_session_sample_rate,
+        }
+
+    def inject_failure(
+        self, command: str, error_type: int = pt.PT_UnknownError, count: int = 1
+    ) -> None:
+        # Make the next `count` calls of a command fail with the given error
+        command_id = pt.CommandId.Value(command)
+        with self._lock:
+            self._failures.setdefault(command_id, []).extend([error_type] * count)
+
+    @property
+    def transport_state(self) -> str:
+        with self._lock:
+            return pt.TS_TransportState.Name(self._transport)
+
+    @property
+    def memory_locations(self) -> List[pt.MemoryLocation]:
+        with self._lock:
+            return list(self._memory_locations)
+
+    def SendGrpcRequest(self, request, context):
+        command_id = request.header.command
+        command_name = pt.CommandId.Name(command_id)
+        with self._lock:
+            self.calls[command_name] = self.calls.get(command_name, 0) + 1
+        delay = self.delays.get(command_name, self.delay)
+        if delay:
+            time.sleep(delay)
+        handler = self._handlers.get(command_id)
+        if handler is None:
+            return self._failed(request, pt.PT_UnknownError, f"{command_name} is not implemented by the stand-in")
+        error_type = self._pending_failure(command_id)
+        if error_type is not None:
+            return self._failed(request, error_type, "Injected failure")
+        if command_id not in (pt.HostReadyCheck, pt.RegisterConnection):
+            if not self.session_open:
+                return self._failed(request, pt.PT_NoOpenedSession, "No session is open")
+        with self._lock:
+            body = handler(request)
+        return self._completed(request, body)
+
+    def SendGrpcStreamingRequest(self, request, context):
+        yield self.SendGrpcRequest(request, context)
+
+    def _pending_failure(self, command_id: int) -> Optional[int]:
+        with self._lock:
+            queued = self._failures.get(command_id)
+            if queued:
+                return queued.pop(0)
+            if command_id in (pt.HostReadyCheck, pt.RegisterConnection):
+                return None
+            if self.fail_rate and self._random.random() < self.fail_rate:
+                return pt.PT_UnknownError
+        return None
+
+    @staticmethod
+    def _completed(request, body=None) -> pt.Response:
+        body_json = ""
+        if body is not None:
+            body_json = json_format.MessageToJson(body, preserving_proto_field_name=True)
+        return pt.Response(
+            header=pt.ResponseHeader(
+                task_id=request.header.task_id,
+                command=request.header.command,
+                status=pt.Completed,
+            ),
+            response_body_json=body_json,
+        )
+
+    @staticmethod
+    def _failed(request, error_type: int, message: str) -> pt.Response:
+        errors = pt.ResponseError(
+            errors=[pt.CommandError(command_error_type=error_type, command_error_message=message)]
+        )
+        return pt.Response(
+            header=pt.ResponseHeader(
+                task_id=request.header.task_id,
+                command=request.header.command,
+                status=pt.Failed,
+            ),
+            response_error_json=json_format.MessageToJson(errors, preserving_proto_field_name=True),
+        )
+
+    def _current_sample(self) -> int:
+        # The playhead advances in real time while the transport is rolling
+        if self._transport in (pt.TS_TransportPlaying, pt.TS_TransportRecording):
+            return self._playhead + int((time.monotonic() - self._play_started) * SAMPLE_RATE)
+        return self._playhead
+
+    # Command handlers, called with the servicer lock held
+
+    def _host_ready_check(self, request):
+        return None
+
+    def _register_connection(self, request):
+        return pt.RegisterConnectionResponseBody(session_id=f"standin-{next(self._session_ids)}")
+
+    def _get_transport_state(self, request):
+        return pt.GetTransportStateResponseBody(current_setting=self._transport)
+
+    def _get_transport_armed(self, request):
+        return pt.GetTransportArmedResponseBody(is_transport_armed=self._armed)
+
+    def _toggle_play_state(self, request):
+        if self._transport in (pt.TS_TransportPlaying, pt.TS_TransportRecording):
+            self._playhead = self._current_sample()
+            self._transport = pt.TS_TransportStopped
+        else:
+            self._play_started = time.monotonic()
+            self._transport = pt.TS_TransportRecording if self._armed else pt.TS_TransportPlaying
+        return None
+
+    def _toggle_record_enable(self, request):
+        self._armed = not self._armed
+        return None
+
+    def _create_memory_location(self, request):
+        body = pt.CreateMemoryLocationRequestBody()
+        if request.request_body_json:
+            json_format.Parse(request.request_body_json, body, ignore_unknown_fields=True)
+        number = body.number or len(self._memory_locations) + 1
+        start_time = body.start_time or str(self._current_sample())
+        self._memory_locations.append(
+            pt.MemoryLocation(
+                number=number,
+                name=body.name,
+                start_time=start_time,
+                end_time=body.end_time or start_time,
+                comments=body.comments,
+            )
+        )
+        return None
+
+    def _get_session_sample_rate(self, request):
+        return pt.GetSessionSampleRateResponseBody(sample_rate=pt.SR_48000)
+
+    def _get_memory_locations(self, request):
+        return pt.GetMemoryLocationsResponseBody(
+            memory_locations=self._memory_locations,
+            pagination_response=pt.PaginationResponse(
+                total=len(self._memory_locations), limit=1000, offset=0
+            ),
+        )
+
+
+class StandInServer:
+    # Hosts a PtslStandIn on a local gRPC port. Use port 0 to let the OS pick one.
+    def __init__(self, servicer: Optional[PtslStandIn] = None, address: str = DEFAULT_ADDRESS):
+        self.servicer = servicer or PtslStandIn()
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        PTSL_pb2_grpc.add_PTSLServicer_to_server(self.servicer, self._server)
+        host = address.rsplit(":", 1)[0]
+        port = self._server.add_insecure_port(address)
+        self.address = f"{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._server.start()
+        logger.info(f"PTSL stand-in listening on {self.address}")
+        return self
+
+    def stop(self, grace: Optional[float] = None) -> None:
+        self._server.stop(grace).wait()
+        logger.info("PTSL stand-in stopped")
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local PTSL stand-in for the Pro Tools backend")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Delay applied to every command")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of commands that fail")
+    parser.add_argument("--no-session", action="store_true", help="Behave as if no session is open")
+    args = parser.parse_args()
+
+    servicer = PtslStandIn(delay=args.delay_ms / 1000, fail_rate=args.fail_rate)
+    servicer.session_open = not args.no_session
+    server = StandInServer(servicer, args.address).start()
+    try:
+        server._server.wait_for_termination()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Simulated peers for driving the bridge without a desk or a DAW: a DiGiCo
+# console, an iPad running the DiGiCo app through the repeater, and a Reaper
+# OSC endpoint. Each one is a UDP socket on localhost with a receive thread,
+# and records when each message arrived so benchmarks can time the bridge.
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pythonosc.osc_bundle import OscBundle
+from pythonosc.osc_message import OscMessage
+from pythonosc.osc_message_builder import build_msg
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cue_name(number: int) -> str:
+    # What the bridge makes of snapshot `number`, and so the Reaper marker name
+    return f"{number * 100 / 100} Cue {number}"
+
+
+class SimulatedPeer:
+    # A localhost OSC endpoint. Subclasses react to messages in handle().
+    def __init__(self, port: int, peer_port: int):
+        self.peer_address = ("127.0.0.1", peer_port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", port))
+        self.sock.settimeout(0.05)
+        self.received = 0
+        self._waiters: List[Tuple[Callable[[str, list], bool], threading.Event, list]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._receive, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def send(self, address: str, *args: Any) -> None:
+        self.sock.sendto(build_msg(address, list(args)).dgram, self.peer_address)
+
+    def expect(self, match: Callable[[str, list], bool]) -> Tuple[threading.Event, list]:
+        # Returns an event set when a matching message arrives, and a list
+        # that then holds its arrival time. Register before sending the trigger.
+        arrived, stamp = threading.Event(), []
+        with self._lock:
+            self._waiters.append((match, arrived, stamp))
+        return arrived, stamp
+
+    def stream(self, rate: int, duration: float, message: Callable[[int], Tuple[str, Any]]) -> int:
+        # Sends message(n) at `rate` messages per second for `duration`
+        # seconds and returns how many were sent. Sent in small bursts so high
+        # rates stay accurate.
+        burst = max(1, rate // 200)
+        interval = burst / rate
+        sent = 0
+        start = time.perf_counter()
+        next_burst = start
+        while time.perf_counter() - start < duration:
+            for _ in range(burst):
+                self.send(*message(sent))
+                sent += 1
+            next_burst += interval
+            delay = next_burst - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return sent
+
+    def handle(self, address: str, params: list) -> None:
+        pass
+
+    def _receive(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data, _ = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            now = time.perf_counter()
+            self.received += 1
+            try:
+                if OscBundle.dgram_is_bundle(data):
+                    messages = [m for m in OscBundle(data) if isinstance(m, OscMessage)]
+                else:
+                    messages = [OscMessage(data)]
+            except Exception:
+                continue
+            for message in messages:
+                address, params = message.address, message.params
+                if self._waiters:
+                    with self._lock:
+                        for waiter in list(self._waiters):
+                            if waiter[0](address, params):
+                                waiter[2].append(now)
+                                waiter[1].set()
+                                self._waiters.remove(waiter)
+                self.handle(address, params)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+
+class SimulatedConsole(SimulatedPeer):
+    # Listens on the console port and talks to the bridge's receive port.
+    # Answers name queries for the console, snapshots and macros. With
+    # snapshots set, only that many snapshots exist. Clearing alive makes the
+    # desk go silent, as when its cable is pulled.
+    def __init__(self, port: int, bridge_port: int, name: str = "SD12",
+                 macros: Optional[Dict[int, str]] = None, snapshots: Optional[int] = None):
+        self.name = name
+        self.snapshots = snapshots
+        self.macros = macros or {1: "reaper,play", 2: "reaper,stop", 3: "reaper,rec", 4: "reaper,marker"}
+        self.forwarded = 0
+        self.probes = 0
+        self.alive = True
+        super().__init__(port, bridge_port)
+
+    def send(self, address: str, *args: Any) -> None:
+        if self.alive:
+            super().send(address, *args)
+
+    def handle(self, address: str, params: list) -> None:
+        if address == "/Console/Name/?":
+            self.probes += 1
+            self.send("/Console/Name", self.name)
+        elif address == "/Snapshots/name/?":
+            number = int(params[0])
+            if self.snapshots is None or number <= self.snapshots:
+                self.send("/Snapshots/name", number, number * 100, 0, f"Cue {number}")
+        elif address == "/Macros/name/?":
+            number = int(params[0])
+            self.send("/Macros/name", number, self.macros.get(number, ""))
+        else:
+            # Anything else is the repeater passing on an iPad message
+            self.forwarded += 1
+
+    def recall(self, number: int) -> float:
+        # Recalls a snapshot on the desk and returns when it was sent
+        sent = time.perf_counter()
+        self.send(f"/Snapshots/Recall_Snapshot/{number}", 1)
+        return sent
+
+    def press_macro(self, number: int) -> float:
+        sent = time.perf_counter()
+        self.send(f"/Macros/Recall_Macro/{number}", 1)
+        return sent
+
+    def flood(self, rate: int, duration: float, channels: int = 48) -> int:
+        # Meter traffic for every input channel in turn
+        return self.stream(rate, duration, lambda n: (f"/Meters/Input/{n % channels + 1}", 0.5))
+
+
+class SimulatedRepeaterClient(SimulatedPeer):
+    # The iPad side of the repeater. Counts what the bridge passes on from
+    # the console and can send control changes of its own.
+    def __init__(self, port: int, bridge_port: int):
+        self.meters = 0
+        super().__init__(port, bridge_port)
+
+    def handle(self, address: str, params: list) -> None:
+        if address.startswith("/Meters/"):
+            self.meters += 1
+
+    def flood(self, rate: int, duration: float, channels: int = 48) -> int:
+        # Fader moves, as when someone drags a fader on the iPad
+        return self.stream(rate, duration, lambda n: (f"/Input_Channels/{n % channels + 1}/fader", -10.0))
+
+
+class FakeReaper(SimulatedPeer):
+    # Reaper's OSC control surface: answers marker queries with its marker
+    # list, reports transport state, again when asked to refresh, and records
+    # the actions it is sent. Adding a marker and naming the last one change
+    # the list.
+    def __init__(self, port: int, bridge_port: int, markers: int = 100):
+        self.markers = {index: cue_name(index) for index in range(1, markers + 1)}
+        self.actions: List[int] = []
+        self.playing = False
+        self.recording = False
+        super().__init__(port, bridge_port)
+
+    def handle(self, address: str, params: list) -> None:
+        if address == "/device/marker/count" and params and params[0]:
+            for marker_id, name in self.markers.items():
+                self.send(f"/marker/{marker_id}/name", name)
+        elif address == "/action":
+            self.actions.append(int(params[0]))
+            if params[0] == 40157:
+                self.markers[len(self.markers) + 1] = ""
+            elif params[0] == 41743:
+                self.transport(self.playing, self.recording)
+        elif address == "/lastmarker/name" and self.markers:
+            self.markers[len(self.markers)] = params[0]
+
+    def transport(self, playing: bool = False, recording: bool = False) -> None:
+        self.playing, self.recording = playing, recording
+        self.send("/play", int(playing))
+        self.send("/record", int(recording))
+
+
+class HeadlessBridge:
+    # Runs headless.py in a child process, so its CPU use can be measured on
+    # its own, and follows its status lines. The child keeps its preferences,
+    # journal and metrics in a temporary directory, away from the user's.
+    def __init__(self, *flags: str):
+        self._data_dir = tempfile.TemporaryDirectory()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_ROOT, "headless.py"), "--data-dir", self._data_dir.name, *flags],
+            cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        self.events: List[Dict[str, Any]] = []
+        self._changed = threading.Condition()
+        threading.Thread(target=self._follow, name="bridge-status", daemon=True).start()
+
+    def _follow(self) -> None:
+        for line in self.process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            with self._changed:
+                self.events.append(event)
+                self._changed.notify_all()
+
+    def wait_for(self, event: str, timeout: float = 10.0) -> Dict[str, Any]:
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                for seen in self.events:
+                    if seen["event"] == event:
+                        return seen
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.process.poll() is not None:
+                    raise TimeoutError(f"Bridge never reported {event}")
+                self._changed.wait(remaining)
+
+    def cpu_seconds(self) -> float:
+        import psutil
+        times = psutil.Process(self.process.pid).cpu_times()
+        return times.user + times.system
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._data_dir.cleanup()
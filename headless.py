@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pubsub import pub
+
+from app_settings import settings
+from consoles import CONSOLES
+from daws import DAWS
+from event_bus import bus, ConsoleConnected, EventBus, PlaceMarker
+from logger_config import logger
+from utilities import DawConsoleBridge
+
+
+class StatusReporter:
+    # Reports bridge status as JSON lines on stdout and, optionally, to every
+    # client connected to a local TCP socket. New socket clients are sent the
+    # current state as soon as they connect. With on_command set, JSON lines
+    # the socket clients send are passed to it, which is how the GUI drives
+    # a bridge running in its worker process.
+    def __init__(self, stream=sys.stdout, port: int = 0, host: str = "127.0.0.1",
+                 on_command: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.stream = stream
+        self.port = port
+        self.host = host
+        self.on_command = on_command
+        self.state = {
+            "console": "N/C", "colour": "red", "console_type": settings.console_type,
+            "daw_type": settings.daw_type, "marker_mode": settings.marker_mode,
+        }
+        self._lock = threading.Lock()
+        self._clients: List[socket.socket] = []
+        self._listener: Optional[socket.socket] = None
+        # Listeners for the other pairings, pypubsub only keeps weak references
+        self._pairings: List["_PairingStatus"] = []
+
+    def start(self) -> None:
+        bus.subscribe(ConsoleConnected, self.console_connected)
+        pub.subscribe(self.console_disconnected, "console_disconnected")
+        pub.subscribe(self.console_type_updated, "console_type_updated")
+        pub.subscribe(self.daw_type_updated, "daw_type_updated")
+        settings.subscribe(self.settings_changed)
+        pub.subscribe(self.reaper_error, "reaper_error")
+        pub.subscribe(self.reaper_configured, "reset_reaper")
+        pub.subscribe(self.markers_seeded, "markers_seeded")
+        if self.port:
+            self._listener = socket.create_server((self.host, self.port))
+            threading.Thread(target=self._accept_clients, name="status-socket", daemon=True).start()
+            logger.info(f"Status socket listening on {self.host}:{self.port}")
+
+    def stop(self) -> None:
+        bus.unsubscribe(self)
+        settings.unsubscribe(self.settings_changed)
+        if self._listener:
+            self._listener.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
+
+    def emit(self, event: str, **fields) -> None:
+        line = json.dumps({"time": time.time(), "event": event, **fields}) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+            for client in list(self._clients):
+                try:
+                    client.sendall(line.encode())
+                except OSError:
+                    self._clients.remove(client)
+                    client.close()
+
+    def watch_pairing(self, name: str, pairing_bus: EventBus) -> None:
+        # Reports a pairing other than the main one, with its name on each line
+        status = _PairingStatus(self, name)
+        self._pairings.append(status)
+        pairing_bus.subscribe(ConsoleConnected, status.console_connected)
+        pub.subscribe(status.console_disconnected, pairing_bus.topic_prefix + "console_disconnected")
+
+    def _accept_clients(self) -> None:
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                client.sendall((json.dumps({"time": time.time(), "event": "state", **self.state}) + "\n").encode())
+                self._clients.append(client)
+            if self.on_command:
+                threading.Thread(target=self._read_commands, args=(client,), name="status-commands",
+                                 daemon=True).start()
+
+    def _read_commands(self, client: socket.socket) -> None:
+        try:
+            for line in client.makefile("r", encoding="utf-8"):
+                try:
+                    self.on_command(json.loads(line))
+                except Exception as e:
+                    logger.error(f"Error handling command {line.strip()}: {e}")
+        except OSError:
+            pass
+        logger.info("Status socket client disconnected")
+
+    # Status handlers. Repeated heartbeat replies only produce output when the state changes.
+
+    def console_connected(self, consolename, colour="green"):
+        status = consolename if colour == "green" else f"{consolename} ({colour})"
+        if self.state["console"] != status:
+            self.state.update(console=status, colour=colour)
+            self.emit("console_connected", console=consolename, colour=colour)
+
+    def console_disconnected(self):
+        if self.state["console"] != "N/C":
+            self.state.update(console="N/C", colour="red")
+            self.emit("console_disconnected")
+
+    def console_type_updated(self, console):
+        self.state["console_type"] = console.type
+        self.emit("console_type", console_type=console.type)
+
+    def daw_type_updated(self, daw):
+        self.state["daw_type"] = daw.type
+        self.emit("daw_type", daw_type=daw.type)
+
+    def settings_changed(self, old, new):
+        # Console macros, Reaper's record action and GUI commands all change the mode through settings
+        if old.marker_mode != new.marker_mode:
+            self.state["marker_mode"] = new.marker_mode
+            self.emit("marker_mode", marker_mode=new.marker_mode)
+
+    def reaper_error(self, reapererror, arg2=None):
+        self.emit("reaper_error", error=str(reapererror))
+
+    def reaper_configured(self, resetreaper, arg2=None):
+        self.emit("reaper_configured", message="Reaper has been configured, please restart Reaper")
+
+    def markers_seeded(self, daw, added, present, error):
+        self.emit("markers_seeded", daw=daw, added=added, present=present, error=error)
+
+
+class _PairingStatus:
+    def __init__(self, reporter: StatusReporter, name: str):
+        self.reporter = reporter
+        self.name = name
+        self.console = "N/C"
+
+    def console_connected(self, consolename, colour="green"):
+        status = consolename if colour == "green" else f"{consolename} ({colour})"
+        if self.console != status:
+            self.console = status
+            self.reporter.emit("console_connected", pairing=self.name, console=consolename, colour=colour)
+
+    def console_disconnected(self):
+        if self.console != "N/C":
+            self.console = "N/C"
+            self.reporter.emit("console_disconnected", pairing=self.name)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run Digico-Reaper Link without a GUI. Settings come from the "
+                    "preferences file, any flags given here override them for this run."
+    )
+    parser.add_argument("--console-type", choices=list(CONSOLES))
+    parser.add_argument("--daw-type", choices=list(DAWS))
+    parser.add_argument("--console-ip")
+    parser.add_argument("--console-port", type=int, help="Port to send to the console")
+    parser.add_argument("--receive-port", type=int, help="Port to receive from the console")
+    parser.add_argument("--reaper-ip")
+    parser.add_argument("--reaper-port", type=int, help="Port to send to Reaper")
+    parser.add_argument("--reaper-receive-port", type=int, help="Port to receive from Reaper")
+    parser.add_argument("--repeater", dest="forwarder_enabled", action="store_true", default=None)
+    parser.add_argument("--no-repeater", dest="forwarder_enabled", action="store_false")
+    parser.add_argument("--repeater-ip")
+    parser.add_argument("--repeater-port", type=int, help="Port to send to the repeater device")
+    parser.add_argument("--repeater-receive-port", type=int, help="Port to receive from the repeater device")
+    parser.add_argument("--marker-mode", choices=["Recording", "PlaybackTrack", "PlaybackNoTrack"])
+    parser.add_argument("--name-only", dest="name_only_match", action="store_true", default=None)
+    parser.add_argument("--cue-settle", dest="cue_settle_time", type=float,
+                        help="Seconds a recall must stand before its cue reaches the DAW, 0 for none")
+    parser.add_argument("--journal-skipped", dest="journal_skipped_cues", action="store_true", default=None,
+                        help="Journal the recalls the settle window skipped")
+    parser.add_argument("--no-mirror", dest="repeater_mirror", action="store_false", default=None,
+                        help="Pass every repeater query on to the console instead of answering it locally")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve latency and throughput metrics on this local HTTP port")
+    parser.add_argument("--capture", dest="capture_enabled", action="store_true", default=None,
+                        help="Record all OSC traffic to a capture file in the log directory")
+    parser.add_argument("--telemetry", dest="telemetry_enabled", action="store_true", default=None,
+                        help="Record the console's fader, mute and other parameter changes")
+    parser.add_argument("--data-dir",
+                        help="Keep the preferences file, journal, metrics, captures and telemetry in this "
+                             "directory instead of the user's")
+    parser.add_argument("--status-port", type=int, default=0,
+                        help="Also report status on this local TCP port")
+    parser.add_argument("--quiet", action="store_true", help="Don't report status on stdout")
+    parser.add_argument("--worker", action="store_true",
+                        help="Run as the GUI's network process, taking commands on the status socket")
+    args = parser.parse_args(argv)
+    if args.worker and not args.status_port:
+        parser.error("--worker needs --status-port")
+    return args
+
+
+SETTINGS_FLAGS = [
+    "console_type", "daw_type", "console_ip", "console_port", "receive_port",
+    "reaper_ip", "reaper_port", "reaper_receive_port", "forwarder_enabled",
+    "repeater_ip", "repeater_port", "repeater_receive_port", "marker_mode", "name_only_match", "repeater_mirror",
+    "cue_settle_time", "journal_skipped_cues",
+    "metrics_port", "capture_enabled", "telemetry_enabled",
+]
+
+
+def handle_command(bridge: DawConsoleBridge, stop: threading.Event, command: Dict[str, Any]) -> None:
+    # Commands from the GUI. Anything that restarts connections runs on the
+    # bridge's control thread, like it did when the GUI called the bridge.
+    name = command.get("command")
+    if name == "place_marker":
+        bus.publish(PlaceMarker(marker_name=command["marker_name"]))
+    elif name == "marker_mode":
+        settings.marker_mode = command["marker_mode"]
+    elif name == "reconnect":
+        bridge.submit(bridge.reconnect)
+    elif name == "start_threads":
+        bridge.submit(bridge.start_threads)
+    elif name == "seed_markers":
+        bridge.submit(bridge.seed_markers)
+    elif name == "update_configuration":
+        bridge.submit(bridge.update_configuration, **command["values"])
+    elif name == "window_pos":
+        bridge.update_pos_in_config(command["position"])
+    elif name == "window_size":
+        bridge.update_size_in_config(command["size"])
+    elif name == "shutdown":
+        stop.set()
+    else:
+        logger.warning(f"Unknown command: {name}")
+
+
+class _NullStream:
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logger.info("Starting Digico-Reaper Link in headless mode")
+    # Loads the preferences file into settings
+    if args.data_dir:
+        bridge = DawConsoleBridge(os.path.join(args.data_dir, "settingsV3.ini"), args.data_dir)
+    else:
+        bridge = DawConsoleBridge()
+    for name in SETTINGS_FLAGS:
+        value = getattr(args, name)
+        if value is not None:
+            # Go through the setters so ports are validated
+            setattr(settings, name, value)
+
+    stop = threading.Event()
+    reporter = StatusReporter(
+        _NullStream() if args.quiet else sys.stdout, args.status_port,
+        on_command=(lambda command: handle_command(bridge, stop, command)) if args.worker else None,
+    )
+    reporter.start()
+    for name, pairing in bridge.pairings.items():
+        if pairing is not bridge.main:
+            reporter.watch_pairing(name, pairing.bus)
+
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    bridge.start_threads()
+    reporter.emit("started", console_type=settings.console_type, daw_type=settings.daw_type)
+    if "wx" in sys.modules and not getattr(sys, "frozen", False):
+        # A frozen GUI build runs its worker through main.py, which imports wx
+        logger.warning("wx was imported in headless mode")
+    while not stop.wait(1):
+        pass
+
+    logger.info("Shutting down headless bridge")
+    bridge.close_servers()
+    reporter.emit("stopped")
+    reporter.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
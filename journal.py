@@ -0,0 +1,318 @@
+import argparse
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import appdirs
+
+from event_bus import EventBus, CueLoad, CueSkipped, PlaceMarker, Priority, TransportAction
+from logger_config import logger
+
+# The journal is a JSON lines file with one entry per cue, marker or transport
+# action, plus an index file of fixed size records (time, byte offset into the
+# journal) so a time range can be found with a binary search. The index can
+# always be rebuilt from the journal.
+INDEX_RECORD = struct.Struct("<dQ")
+JOURNAL_FILE = "journal.jsonl"
+INDEX_FILE = "journal.idx"
+
+
+def journal_dir() -> str:
+    return os.path.join(appdirs.user_data_dir("Digico-Reaper Link", "Justin Stasiw"), "journal")
+
+
+class _Feed:
+    # Journals the events of one pairing's bus. Entries are written on the
+    # feed's own bus dispatch thread and fsynced before the next event is
+    # taken, so a crash loses at most the entry being written.
+    def __init__(self, journal: "Journal", pairing: str, bus: EventBus,
+                 daw_state: Callable[[], Tuple[str, Optional[float]]]):
+        self.journal = journal
+        self.pairing = pairing
+        self.bus = bus
+        self.daw_state = daw_state
+        # Skipped cues are journaled as control events too, so none is shed
+        # and each lands in order with the cues around it
+        bus.subscribe(CueLoad, self._cue_loaded)
+        bus.subscribe(CueSkipped, self._cue_skipped, priority=Priority.CONTROL)
+        bus.subscribe(PlaceMarker, self._marker_placed)
+        bus.subscribe(TransportAction, self._transport_action)
+
+    def _append(self, kind: str, value: str) -> None:
+        daw, position = self.daw_state()
+        self.journal.append(kind, value, self.pairing, daw, position)
+
+    def _cue_loaded(self, cue: str) -> None:
+        self._append("cue", cue)
+
+    def _cue_skipped(self, cue: str) -> None:
+        self._append("skipped", cue)
+
+    def _marker_placed(self, marker_name: str) -> None:
+        self._append("marker", marker_name)
+
+    def _transport_action(self, transport_action: str) -> None:
+        self._append("transport", transport_action)
+
+
+class Journal:
+    # Appends what the bridge's pairings saw to one journal, each entry
+    # tagged with the pairing it came from
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._data = None
+        self._index = None
+        self._last_time = 0.0
+        self._feeds: List[_Feed] = []
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._data = open(os.path.join(self.directory, JOURNAL_FILE), "a+b")
+            self._index = open(os.path.join(self.directory, INDEX_FILE), "a+b")
+            self._recover()
+
+    def follow(self, pairing: str, bus: EventBus, daw_state: Callable[[], Tuple[str, Optional[float]]]) -> None:
+        self._feeds.append(_Feed(self, pairing, bus, daw_state))
+
+    def close(self) -> None:
+        for feed in self._feeds:
+            feed.bus.unsubscribe(feed)
+        self._feeds = []
+        with self._lock:
+            for f in (self._data, self._index):
+                if f:
+                    f.close()
+            self._data = self._index = None
+
+    def _recover(self) -> None:
+        # Drops a half written last entry and indexes entries the index
+        # doesn't have yet, which is what a crash between the two writes leaves
+        data_size = self._data.seek(0, os.SEEK_END)
+        index_size = self._index.seek(0, os.SEEK_END)
+        if index_size % INDEX_RECORD.size:
+            index_size -= index_size % INDEX_RECORD.size
+            self._index.truncate(index_size)
+        offset = 0
+        if index_size:
+            self._index.seek(index_size - INDEX_RECORD.size)
+            self._last_time, last_offset = INDEX_RECORD.unpack(self._index.read(INDEX_RECORD.size))
+            if last_offset >= data_size:
+                logger.warning("Journal index is ahead of the journal, rebuilding it")
+                self._index.truncate(0)
+                self._last_time = 0.0
+            else:
+                self._data.seek(last_offset)
+                self._data.readline()
+                offset = self._data.tell()
+        self._data.seek(offset)
+        reindexed = 0
+        while True:
+            line = self._data.readline()
+            if not line.endswith(b"\n"):
+                if line:
+                    logger.warning("Dropping a partly written journal entry")
+                    self._data.truncate(offset)
+                break
+            try:
+                entry_time = json.loads(line)["time"]
+            except (ValueError, KeyError):
+                entry_time = self._last_time
+            self._append_index(entry_time, offset)
+            reindexed += 1
+            offset += len(line)
+        if reindexed:
+            logger.info(f"Indexed {reindexed} journal entries")
+        self._index.flush()
+
+    def _append_index(self, entry_time: float, offset: int) -> None:
+        # Index times never go backwards, even if the wall clock does
+        self._last_time = max(self._last_time, entry_time)
+        self._index.write(INDEX_RECORD.pack(self._last_time, offset))
+
+    def append(self, kind: str, value: str, pairing: str = "main", daw: str = "",
+               position: Optional[float] = None) -> None:
+        now = time.time()
+        line = json.dumps({
+            "time": now, "kind": kind, "value": value, "pairing": pairing, "daw": daw, "position": position,
+        })
+        with self._lock:
+            if self._data is None:
+                return
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(line.encode() + b"\n")
+            self._data.flush()
+            os.fsync(self._data.fileno())
+            self._append_index(now, offset)
+            self._index.flush()
+
+
+class JournalReader:
+    # Read only access for range queries, safe to use while a bridge writes
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _start_offset(self, start: float) -> int:
+        # Offset of the first entry at or after start, found in the index
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) < INDEX_RECORD.size:
+            return 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            low, high = 0, len(index) // INDEX_RECORD.size
+            while low < high:
+                middle = (low + high) // 2
+                if INDEX_RECORD.unpack_from(index, middle * INDEX_RECORD.size)[0] < start:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low == len(index) // INDEX_RECORD.size:
+                # Nothing indexed that late, but there may be unindexed entries
+                low -= 1
+            return INDEX_RECORD.unpack_from(index, low * INDEX_RECORD.size)[1]
+
+    def entries(self, start: float = 0.0, end: float = float("inf")) -> Iterator[Dict]:
+        path = os.path.join(self.directory, JOURNAL_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(self._start_offset(start))
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["time"] > end:
+                    return
+                if entry["time"] >= start:
+                    yield entry
+
+
+def rebuild_markers(entries: List[Dict], place: Callable[[float, str], None],
+                    at: Optional[float] = None, kinds: Tuple[str, ...] = ("cue", "marker")) -> Tuple[int, int]:
+    # Places a marker for every entry of the given kinds. With `at`, entries
+    # are laid out by wall clock with the first one at `at` seconds. Without
+    # it the DAW position saved with each entry is used and entries that
+    # have none are skipped. Returns (placed, skipped).
+    entries = [entry for entry in entries if entry["kind"] in kinds]
+    placed = skipped = 0
+    first = entries[0]["time"] if entries else 0.0
+    for entry in entries:
+        position = entry.get("position") if at is None else at + entry["time"] - first
+        if position is None:
+            skipped += 1
+            continue
+        name = f"Transport {entry['value']}" if entry["kind"] == "transport" else entry["value"]
+        place(position, name)
+        placed += 1
+    return placed, skipped
+
+
+def parse_time(value: str) -> float:
+    # Accepts "HH:MM[:SS]" for today, "YYYY-MM-DD HH:MM[:SS]" or a unix time
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            clock = datetime.datetime.strptime(value, fmt).time()
+            return datetime.datetime.combine(datetime.date.today(), clock).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Not a time: {value}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Read the show journal and rebuild DAW markers from it.")
+    parser.add_argument("--dir", default=journal_dir(), help="Journal directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("list", "Print the journal entries in a time range"),
+                            ("rebuild", "Place a marker in the current DAW session for every cue in a time range. "
+                                        "Quit Digico-Reaper Link first, it listens on the same DAW port")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--from", dest="start", type=parse_time, default=0.0,
+                             help="HH:MM[:SS], YYYY-MM-DD HH:MM[:SS] or a unix time")
+        command.add_argument("--to", dest="end", type=parse_time, default=float("inf"))
+        command.add_argument("--pairing", default="main", help="Which console/DAW pairing, for bridges with several")
+    rebuild = commands.choices["rebuild"]
+    rebuild.add_argument("--at", type=float,
+                         help="Lay the cues out by wall clock, starting this many seconds into the session, "
+                              "instead of at the DAW positions they were journaled with")
+    rebuild.add_argument("--include-transport", action="store_true", help="Also mark transport actions")
+    rebuild.add_argument("--dry-run", action="store_true", help="Print the markers instead of placing them")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    entries = [
+        entry for entry in JournalReader(args.dir).entries(args.start, args.end)
+        if entry.get("pairing", "main") == args.pairing
+    ]
+    if args.command == "list":
+        for entry in entries:
+            stamp = datetime.datetime.fromtimestamp(entry["time"]).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            position = "" if entry["position"] is None else f"{entry['position']:.3f}"
+            print(f"{stamp}  {entry['kind']:<9} {position:>10}  {entry['value']}")
+        return 0
+
+    kinds = ("cue", "marker", "transport") if args.include_transport else ("cue", "marker")
+    if args.dry_run:
+        placed, skipped = rebuild_markers(entries, lambda p, name: print(f"{p:>10.3f}  {name}"), args.at, kinds)
+    else:
+        from app_settings import ThreadSafeSettings
+        from config_store import ConfigStore
+        from daws import DAWS
+        from supervisor import Supervisor
+        from utilities import MAIN_PAIRING, PAIRING_SECTION_PREFIX, preferences_path
+        # The markers go to the DAW the pairing is configured for
+        store = ConfigStore(preferences_path())
+        config = store.config()
+        store.close()
+        section = "main" if args.pairing == MAIN_PAIRING else PAIRING_SECTION_PREFIX + args.pairing
+        if not config.has_section(section):
+            print(f"No pairing called {args.pairing} in the preferences")
+            return 1
+        pairing_settings = ThreadSafeSettings()
+        pairing_settings.update_from_config(config, section)
+        markers: List[Tuple[float, str]] = []
+        placed, skipped = rebuild_markers(entries, lambda p, name: markers.append((p, name)), args.at, kinds)
+        # The DAW's own servers run, so it reports whether it is playing
+        # before markers are placed, and they go in its batched form. They
+        # bind the port the app listens on, so the app must not be running.
+        supervisor = Supervisor()
+        daw = DAWS[pairing_settings.daw_type].load()(pairing_settings, EventBus())
+        daw.start_managed_threads(supervisor.start)
+        try:
+            if not daw.wait_ready():
+                print(f"{daw.type} did not answer. Quit Digico-Reaper Link if it is running, since it holds "
+                      f"the DAW's port, then check that {daw.type} is open and its OSC or PTSL settings")
+                return 1
+            if markers:
+                daw.add_markers(markers)
+        except RuntimeError as e:
+            print(e)
+            return 1
+        finally:
+            daw.shutdown_servers()
+            supervisor.stop_all()
+    print(f"{placed} markers placed, {skipped} skipped without a DAW position (use --at to place them)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import time
+from typing import Callable, Optional
+
+from app_settings import ThreadSafeSettings, settings as app_settings
+from logger_config import logger
+from supervisor import CancellationToken
+
+
+class LinkMonitor:
+    # Tracks the console link from the traffic it already sends. Every inbound
+    # datagram counts as proof of life, so a busy console is never probed. A
+    # probe only goes out once the link has been idle for link_idle_threshold,
+    # and the link is reported down when nothing has arrived link_timeout
+    # after that probe.
+    def __init__(
+        self,
+        probe: Callable[[], None],
+        on_up: Callable[[], None],
+        on_down: Callable[[], None],
+        tick: float = 0.05,
+        settings: Optional[ThreadSafeSettings] = None,
+    ):
+        self.settings = app_settings if settings is None else settings
+        self.probe = probe
+        self.on_up = on_up
+        self.on_down = on_down
+        self.tick = tick
+        self.up = False
+        self.probes_sent = 0
+        self._last_seen = float("-inf")
+        self._last_probe = float("-inf")
+
+    def touch(self) -> None:
+        # Called from the receive path for every datagram, so it stays a single store
+        self._last_seen = time.monotonic()
+
+    def run(self, token: CancellationToken) -> None:
+        while not token.wait(self.tick):
+            self.check()
+
+    def check(self) -> None:
+        snapshot = self.settings.snapshot
+        now = time.monotonic()
+        idle = now - self._last_seen
+        if not self.up and idle < snapshot.link_idle_threshold + snapshot.link_timeout:
+            self.up = True
+            logger.info("Console link is up")
+            self._notify(self.on_up)
+        elif self.up and idle >= snapshot.link_idle_threshold + snapshot.link_timeout:
+            self.up = False
+            logger.info(f"No console traffic for {idle:.2f} s, link is down")
+            self._notify(self.on_down)
+        if idle >= snapshot.link_idle_threshold and now - self._last_probe >= snapshot.link_idle_threshold:
+            self._last_probe = now
+            self.probes_sent += 1
+            try:
+                self.probe()
+            except Exception as e:
+                logger.debug(f"Console probe failed: {e}")
+
+    @staticmethod
+    def _notify(callback: Callable[[], None]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Link state handler error: {e}")
@@ -1,9 +1,72 @@
+import atexit
+import collections
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Tuple
+
 import appdirs
 
 
+class RateLimitFilter(logging.Filter):
+    # Lets through at most `burst` records per call site every `interval`
+    # seconds. The first record after a quiet spell says how many were dropped.
+    def __init__(self, burst: int = 10, interval: float = 5.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._lock = threading.Lock()
+        # call site -> (window start, records in window, suppressed)
+        self._sites: Dict[Tuple[str, int], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.interval:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.burst:
+                site[1] += 1
+                return True
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class RingBufferHandler(logging.Handler):
+    # Keeps the most recent records in memory, unformatted, so the debug
+    # history around a problem can be read back without a DEBUG log file
+    def __init__(self, capacity: int = 2000):
+        super().__init__(logging.DEBUG)
+        self.buffer: collections.deque = collections.deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.buffer.append(record)
+
+    def records(self) -> List[logging.LogRecord]:
+        return list(self.buffer)
+
+    def lines(self) -> List[str]:
+        formatter = self.formatter or logging.Formatter()
+        return [formatter.format(record) for record in self.records()]
+
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler.prepare() formats the message on the caller's thread.
+    # Records are queued as they are, so %-style arguments are only merged on
+    # the listener thread, by the handlers that actually write them out.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 def setup_logger():
     # Create logs directory if it doesn't exist
     appname = "Digico-Reaper Link"
@@ -40,12 +103,26 @@ def setup_logger():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(console_formatter)
 
+    # Recent records, kept in memory
+    ring_handler = RingBufferHandler()
+    ring_handler.setFormatter(file_formatter)
+
+    # The network threads only put records on a queue. Formatting and disk
+    # I/O happen on the listener's thread.
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, ring_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
     # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(queue_handler)
 
-    return logger
+    return logger, listener, ring_handler
 
 
 # Create and configure logger
-logger = setup_logger()
+logger, log_listener, recent_logs = setup_logger()
@@ -1,19 +1,29 @@
 import ipaddress
-import threading
+import sys
+from typing import Any, Dict
 
 import wx
 from pubsub import pub
 
 from app_settings import settings
+from backend_registry import Backend
+from bridge_client import BridgeClient, HEADLESS_FLAG
 from consoles import CONSOLES, Console, Feature
-from daws import Daw
+from daws import DAWS
+from event_bus import bus, ConsoleConnected
 from logger_config import logger
-from utilities import DawConsoleBridge
+from ui_state import UIState
+
+
+# Status colours sent by the backends, by name so they don't depend on wx
+STATUS_COLOURS = {"green": wx.GREEN, "yellow": wx.YELLOW, "red": wx.RED}
+# Most times per second the main window redraws connection status
+UI_REFRESH_HZ = 10
 
 
 class MainWindow(wx.Frame):
-    # Bringing the logic from utilities as an attribute of MainWindow
-    BridgeFunctions = DawConsoleBridge()
+    # The bridge runs in a worker process, this is the window's handle on it
+    BridgeFunctions = BridgeClient()
 
     def __init__(self):
         logger.info("Initializing main window")
@@ -28,6 +38,8 @@ class MainWindow(wx.Frame):
         filemenu.AppendSeparator()
         m_exit = filemenu.Append(wx.ID_EXIT, "&Exit\tAlt-X", "Close window and exit program.")
         properties_menuitem = filemenu.Append(wx.ID_PROPERTIES, "Properties", "Program Settings")
+        seed_menuitem = filemenu.Append(wx.ID_ANY, "Seed Markers from Console",
+                                        "Add a marker to the DAW for every console cue it doesn't have yet")
         menubar = wx.MenuBar()
         menubar.Append(filemenu, "&File")
         self.SetMenuBar(menubar)
@@ -36,6 +48,7 @@ class MainWindow(wx.Frame):
         self.Bind(wx.EVT_MENU, self.on_close, m_exit)
         self.Bind(wx.EVT_MENU, self.on_about, about_menuitem)
         self.Bind(wx.EVT_MENU, self.launch_prefs, properties_menuitem)
+        self.Bind(wx.EVT_MENU, self.seed_markers, seed_menuitem)
         self.Bind(wx.EVT_CLOSE, self.on_close)
         self.Show()
 
@@ -46,6 +59,17 @@ class MainWindow(wx.Frame):
         dlg.ShowModal()  # Shows it
         dlg.Destroy()  # Destroy pop-up when finished.
 
+    def seed_markers(self, event):
+        # Needs the DAW stopped, since markers are placed by moving the cursor
+        dlg = wx.MessageDialog(self,
+                               "Add a marker for every console cue the DAW session doesn't have yet? "
+                               "Stop the transport first.",
+                               "Seed Markers", wx.OK | wx.CANCEL | wx.ICON_QUESTION)
+        result = dlg.ShowModal()
+        dlg.Destroy()
+        if result == wx.ID_OK:
+            self.BridgeFunctions.seed_markers()
+
     def launch_prefs(self, event):
         # Open the preferences frame
         PrefsWindow(parent=wx.GetTopLevelParent(self), title="Digico-Reaper Properties", console=self.GetTopLevelParent().BridgeFunctions.console)
@@ -65,12 +89,24 @@ class MainWindow(wx.Frame):
         result = dlg.ShowModal()
         dlg.Destroy()
         if result == wx.ID_OK:
-            closed_complete = self.GetTopLevelParent().BridgeFunctions.close_servers()
-            if closed_complete:
-                try:
-                    self.GetTopLevelParent().Destroy()
-                except Exception as e:
-                    logger.error(f"Error closing application: {e}")
+            self.shutdown_and_destroy()
+
+    def shutdown_and_destroy(self):
+        # Shut the bridge worker down without blocking the UI, then destroy
+        # the window back on the UI thread
+        self.Hide()
+        future = self.BridgeFunctions.shutdown()
+        future.add_done_callback(lambda f: wx.CallAfter(self.destroy_after_shutdown, f))
+
+    def destroy_after_shutdown(self, future):
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Error shutting down bridge: {e}")
+        try:
+            self.Destroy()
+        except Exception as e:
+            logger.error(f"Error closing application: {e}")
 
 
 class MainPanel(wx.Panel):
@@ -78,7 +114,13 @@ class MainPanel(wx.Panel):
     def __init__(self, parent):
         logger.info("Initializing main panel")
         wx.Panel.__init__(self, parent)
-        self.DigicoTimer: wx.CallLater | None = None
+        # What the status widgets should show, written from any thread
+        self.ui_state = UIState(
+            console_status="N/C",
+            console_colour="red",
+            console_type=MainWindow.BridgeFunctions.console.type,
+            marker_mode=settings.marker_mode,
+        )
         panel_sizer = wx.BoxSizer(wx.VERTICAL)
         # Font Definitions
         header_font = wx.Font(20, family=wx.FONTFAMILY_SWISS, style=0, weight=wx.FONTWEIGHT_BOLD,
@@ -100,6 +142,11 @@ class MainPanel(wx.Panel):
         self.notrack_button_cntl.SetFont(header_font)
         radio_grid.Add(self.notrack_button_cntl, 0, wx.ALL | wx.EXPAND, 5)
         panel_sizer.Add(radio_grid, 0, wx.ALL | wx.EXPAND, 5)
+        self.mode_buttons = {
+            "Recording": self.rec_button_cntl,
+            "PlaybackTrack": self.track_button_cntl,
+            "PlaybackNoTrack": self.notrack_button_cntl,
+        }
 
         # Is connected section:
         connected_status = wx.StaticText(self)
@@ -143,88 +190,81 @@ class MainPanel(wx.Panel):
         self.Bind(wx.EVT_RADIOBUTTON, self.recmode, self.rec_button_cntl)
         self.Bind(wx.EVT_RADIOBUTTON, self.trackmode, self.track_button_cntl)
         self.Bind(wx.EVT_RADIOBUTTON, self.notrackmode, self.notrack_button_cntl)
-        # Subscribing to the OSC response for console name to reset the timeout timer
-        pub.subscribe(self.console_connected, "console_connected")
+        # Status handlers only write into ui_state, the redraw timer draws it
+        # on the UI thread at most UI_REFRESH_HZ times a second
+        self._drawn_version = -1
+        self._drawn: Dict[str, Any] = {}
+        self.redraw_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.redraw, self.redraw_timer)
+        self.redraw_timer.Start(1000 // UI_REFRESH_HZ)
+        # Console status comes from the console name response and the bridge's link monitor
+        bus.subscribe(ConsoleConnected, self.console_connected)
         pub.subscribe(self.console_disconnected, "console_disconnected")
         pub.subscribe(self.console_type_updated, "console_type_updated")
         pub.subscribe(self.reaper_disconnected_listener, "reaper_error")
         pub.subscribe(self.callforreaperrestart, "reset_reaper")
-        pub.subscribe(self.update_mode_select_gui_from_osc, "mode_select_osc")
-        MainWindow.BridgeFunctions.start_threads()
-        # Start a timer for Digico timeout
-        self.timer_lock = threading.Lock()
-        self.configuretimers()
+        pub.subscribe(self.markers_seeded_listener, "markers_seeded")
+        # Marker mode follows settings, whether it was changed here or by a console macro
+        settings.subscribe(self.settings_changed)
+        MainWindow.BridgeFunctions.start()
 
     @staticmethod
     def place_marker(e):
         # Manually places a marker in Reaper from the UI
-        pub.sendMessage("place_marker_with_name", marker_name="Marker from UI")
+        MainWindow.BridgeFunctions.place_marker("Marker from UI")
 
     def exitapp(self, e):
         # Calls on_close for the parent window
         self.GetTopLevelParent().on_close(None)
 
-    def update_mode_select_gui_from_osc(self, selected_mode):
-        if selected_mode == "Recording":
-            wx.CallAfter(self.rec_button_cntl.SetValue, True)
-        elif selected_mode == "PlaybackTrack":
-            wx.CallAfter(self.track_button_cntl.SetValue, True)
-        elif selected_mode == "PlaybackNoTrack":
-            wx.CallAfter(self.notrack_button_cntl.SetValue, True)
-
     @staticmethod
     def recmode(e):
-        settings.marker_mode = "Recording"
+        MainWindow.BridgeFunctions.set_marker_mode("Recording")
 
     @staticmethod
     def trackmode(e):
-        settings.marker_mode = "PlaybackTrack"
+        MainWindow.BridgeFunctions.set_marker_mode("PlaybackTrack")
 
     @staticmethod
     def notrackmode(e):
-        settings.marker_mode = "PlaybackNoTrack"
-
-    def configuretimers(self):
-        # Builds a 5-second non-blocking timer for console response timeout.
-        # Calls self.console_disconnected if timer runs out.
-        with self.timer_lock:
-            def safe_timer_config():
-                if self.DigicoTimer and self.DigicoTimer.IsRunning():
-                    self.DigicoTimer.Stop()
-                self.DigicoTimer = wx.CallLater(5000, self.console_disconnected)
-                self.DigicoTimer.Start()
-            wx.CallAfter(safe_timer_config)
+        MainWindow.BridgeFunctions.set_marker_mode("PlaybackNoTrack")
 
-    def console_type_updated(self, console: Console) -> None:
-        wx.CallAfter(self.console_type_connection_label.SetLabel, console.type)
-
-    def console_connected(self, consolename, colour: wx.Colour = wx.GREEN):
-        if isinstance(self.DigicoTimer, wx.CallLater) and self.DigicoTimer.IsRunning():
-            # When a response is received from the console, reset the timeout timer if running
-            wx.CallAfter(self.DigicoTimer.Stop)
-            # Update the UI to reflect the connected status
-            self.digico_connected.SetLabel(consolename)
-            self.digico_connected.SetBackgroundColour(colour)
-            self.digico_connected.SetForegroundColour(wx.BLACK)
-            # Restart the timeout timer
-            self.configuretimers()
+    def settings_changed(self, old, new):
+        if old.marker_mode != new.marker_mode:
+            self.ui_state.set(marker_mode=new.marker_mode)
 
-        else:
-            # If the timer was not already running
-            # Update UI to reflect connected
-            wx.CallAfter(self.digico_connected.SetLabel,consolename)
-            wx.CallAfter(self.digico_connected.SetBackgroundColour,wx.GREEN)
-            # Start the timer
-            self.configuretimers()
+    def console_type_updated(self, console: Console) -> None:
+        self.ui_state.set(console_type=console.type)
 
+    def console_connected(self, consolename, colour: str = "green"):
+        self.ui_state.set(console_status=consolename, console_colour=colour)
 
     def console_disconnected(self):
-        # If timer runs out without being reset, update the UI to N/C
-        self.digico_connected.SetLabel("N/C")
-        self.digico_connected.SetBackgroundColour(wx.RED)
-        self.digico_connected.SetForegroundColour(wx.WHITE)
+        # Sent by the link monitor thread when the console goes quiet
+        self.ui_state.set(console_status="N/C", console_colour="red")
+
+    def redraw(self, e):
+        # Only widgets whose values changed since the last draw are touched
+        if self.ui_state.version == self._drawn_version:
+            return
+        self._drawn_version, state = self.ui_state.read()
+        changed = {k for k, v in state.items() if self._drawn.get(k) != v}
+        self._drawn = state
+        if changed & {"console_status", "console_colour"}:
+            disconnected = state["console_colour"] == "red"
+            self.digico_connected.SetLabel(state["console_status"])
+            self.digico_connected.SetBackgroundColour(STATUS_COLOURS.get(state["console_colour"], wx.GREEN))
+            self.digico_connected.SetForegroundColour(wx.WHITE if disconnected else wx.BLACK)
+        if "console_type" in changed:
+            self.console_type_connection_label.SetLabel(state["console_type"])
+        if "marker_mode" in changed and state["marker_mode"] in self.mode_buttons:
+            self.mode_buttons[state["marker_mode"]].SetValue(True)
 
     def reaper_disconnected_listener(self, reapererror, arg2=None):
+        # Status from the worker arrives off the UI thread
+        wx.CallAfter(self.show_reaper_disconnected)
+
+    def show_reaper_disconnected(self):
         logger.info("Reaper not connected. Reporting to user.")
         dlg = wx.MessageDialog(self,
                                "Reaper is not currently open. Please open and press OK.",
@@ -232,16 +272,14 @@ class MainPanel(wx.Panel):
         result = dlg.ShowModal()
         dlg.Destroy()
         if result == wx.ID_CANCEL:
-            closed_complete = self.GetTopLevelParent().BridgeFunctions.close_servers()
-            if closed_complete:
-                try:
-                    self.GetTopLevelParent().Destroy()
-                except Exception as e:
-                    logger.error(f"Failed to close Reaper disconnected dialog: {e}")
+            self.GetTopLevelParent().shutdown_and_destroy()
         elif result == wx.ID_OK:
             MainWindow.BridgeFunctions.start_threads()
 
     def callforreaperrestart(self, resetreaper, arg2=None):
+        wx.CallAfter(self.show_reaper_restart)
+
+    def show_reaper_restart(self):
         logger.info("Reaper has been configured. Requesting restart")
         dlg = wx.MessageDialog(self,
                                "Reaper has been configured for use with Digico-Reaper Link. "
@@ -250,21 +288,23 @@ class MainPanel(wx.Panel):
         result = dlg.ShowModal()
         dlg.Destroy()
 
+    def markers_seeded_listener(self, daw, added, present, error):
+        wx.CallAfter(self.show_markers_seeded, daw, added, present, error)
+
+    def show_markers_seeded(self, daw, added, present, error):
+        if error:
+            message = f"Could not seed markers in {daw}: {error}"
+        else:
+            message = f"Added {added} markers to {daw}, {present} cues already had one."
+        dlg = wx.MessageDialog(self, message, "Seed Markers", wx.OK)
+        dlg.ShowModal()
+        dlg.Destroy()
+
     @staticmethod
     def attemptreconnect(e):
         logger.info("Manual reconnection requested.")
-        # Just forces a close/reconnect of the OSC servers by manually updating the configuration.
-        MainWindow.BridgeFunctions.update_configuration(con_ip=settings.console_ip,
-                                                        rptr_ip=settings.repeater_ip, con_send=settings.console_port,
-                                                        con_rcv=settings.receive_port,
-                                                        fwd_enable=settings.forwarder_enabled,
-                                                        rpr_send=settings.reaper_port,
-                                                        rpr_rcv=settings.reaper_receive_port,
-                                                        rptr_snd=settings.repeater_port,
-                                                        rptr_rcv=settings.repeater_receive_port,
-                                                        name_only=settings.name_only_match,
-                                                        console_type=settings.console_type,
-                                                        daw_type=settings.daw_type)
+        # Reopens the console connections without dropping the DAW link.
+        MainWindow.BridgeFunctions.reconnect()
 
 
 class PrefsWindow(wx.Frame):
@@ -344,7 +384,7 @@ class PrefsPanel(wx.Panel):
         panel_sizer.Add(self.console_type_radio_box, 0, wx.ALL | wx.EXPAND, 5)
 
         # Daw type radio box
-        daw_types = [daw.type for daw in Daw.__subclasses__()]
+        daw_types = list(DAWS)
         self.daw_type_radio_box = wx.RadioBox(self, label="DAW Type", choices=daw_types)
         self.daw_type_radio_box.SetSelection(daw_types.index(settings.daw_type))
         panel_sizer.Add(self.daw_type_radio_box, 0, wx.ALL | wx.EXPAND, 5)
@@ -412,10 +452,10 @@ class PrefsPanel(wx.Panel):
         self.Show()
 
     def changed_console_type(self, event: wx.CommandEvent) -> None:
-        console: Console = CONSOLES[event.GetString()]
-        self.update_console_supported_features(console)
+        # Registry entries carry the supported features without importing the backend
+        self.update_console_supported_features(CONSOLES[event.GetString()])
         
-    def update_console_supported_features(self, console: Console)-> None:
+    def update_console_supported_features(self, console: Console | Backend)-> None:
         self.console_rcv_port_control.Enabled = Feature.SEPERATE_RECEIVE_PORT in console.supported_features
         self.mode_match_all_radio.Enabled = Feature.CUE_NUMBER in console.supported_features
         self.mode_match_name_radio.Enabled = Feature.CUE_NUMBER in console.supported_features
@@ -443,9 +483,10 @@ class PrefsPanel(wx.Panel):
             settings.forwarder_enabled = self.repeater_radio_enabled.GetValue()
             settings.console_type = self.console_type_radio_box.GetString(self.console_type_radio_box.GetSelection())
             settings.daw_type = self.daw_type_radio_box.GetString(self.daw_type_radio_box.GetSelection())
-            # Force a close/reconnect of the OSC servers by pushing the configuration update.
+            # Save the configuration and restart only the connections whose settings changed.
             MainWindow.BridgeFunctions.update_configuration(con_ip=settings.console_ip,
-                                                            rptr_ip=settings.repeater_ip, con_send=settings.console_port,
+                                                            rptr_ip=settings.repeater_ip,
+                                                            con_send=settings.console_port,
                                                             con_rcv=settings.receive_port,
                                                             fwd_enable=settings.forwarder_enabled,
                                                             rpr_send=settings.reaper_port,
@@ -485,6 +526,10 @@ class PrefsPanel(wx.Panel):
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == [HEADLESS_FLAG]:
+        # A frozen build's bridge worker, see bridge_client.worker_command
+        import headless
+        sys.exit(headless.main(sys.argv[2:]))
     try:
         logger.info("Starting Digico-Reaper Link Application")
         app = wx.App(False)
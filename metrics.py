@@ -0,0 +1,283 @@
+import bisect
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from pythonosc.osc_message_builder import build_msg
+from pythonosc.osc_server import ThreadingOSCUDPServer
+from pythonosc.udp_client import SimpleUDPClient
+
+from capture import capture
+from logger_config import logger
+from osc_encoder import OscEncoder
+from supervisor import CancellationToken, serve
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS: Tuple[float, ...] = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+)
+
+
+class Histogram:
+    # Fixed buckets, so recording a sample is a bisect and a few additions
+    # under a lock. Percentiles are estimated from the bucket bounds.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        index = bisect.bisect_left(BUCKETS_MS, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += ms
+            if ms > self.max:
+                self.max = ms
+
+    def percentile(self, pct: float) -> float:
+        with self._lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = pct / 100 * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(BUCKETS_MS[index], maximum) if index < len(BUCKETS_MS) else maximum
+        return maximum
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max,
+        }
+
+
+class SocketCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.packets_in = 0
+        self.bytes_in = 0
+        self.packets_out = 0
+        self.bytes_out = 0
+        self.drops = 0
+
+    def received(self, size: int) -> None:
+        with self._lock:
+            self.packets_in += 1
+            self.bytes_in += size
+
+    def sent(self, size: int) -> None:
+        with self._lock:
+            self.packets_out += 1
+            self.bytes_out += size
+
+    def dropped(self) -> None:
+        with self._lock:
+            self.drops += 1
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "packets_in": self.packets_in,
+            "bytes_in": self.bytes_in,
+            "packets_out": self.packets_out,
+            "bytes_out": self.bytes_out,
+            "drops": self.drops,
+        }
+
+
+class Metrics:
+    # Registry for the bridge's stage histograms, socket counters and gauges.
+    # Gauges are callables read when a report is made, e.g. queue depths.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self._histograms: Dict[str, Histogram] = {}
+        self._sockets: Dict[str, SocketCounters] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def socket(self, name: str) -> SocketCounters:
+        counters = self._sockets.get(name)
+        if counters is None:
+            with self._lock:
+                counters = self._sockets.setdefault(name, SocketCounters())
+        return counters
+
+    def gauge(self, name: str, read: Callable[[], Any]) -> None:
+        with self._lock:
+            self._gauges[name] = read
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = dict(self._histograms)
+            sockets = dict(self._sockets)
+            gauges = dict(self._gauges)
+        uptime = time.monotonic() - self.started
+        gauge_values = {}
+        for name, read in gauges.items():
+            try:
+                gauge_values[name] = read()
+            except Exception as e:
+                gauge_values[name] = f"error: {e}"
+        return {
+            "uptime_s": uptime,
+            "stages": {name: h.summary() for name, h in sorted(histograms.items())},
+            "sockets": {
+                name: {**c.summary(), "packets_in_per_s": c.packets_in / uptime if uptime else 0.0}
+                for name, c in sorted(sockets.items())
+            },
+            "gauges": gauge_values,
+        }
+
+    def render_text(self) -> str:
+        # One "name value" line per number, easy to read and to scrape
+        report = self.report()
+        lines = [f"uptime_s {report['uptime_s']:.1f}"]
+        for name, summary in report["stages"].items():
+            lines.extend(f"stage.{name}.{key} {value:.3f}" for key, value in summary.items())
+        for name, summary in report["sockets"].items():
+            lines.extend(f"socket.{name}.{key} {value:.1f}" for key, value in summary.items())
+        for name, value in report["gauges"].items():
+            lines.append(f"gauge.{name} {json.dumps(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class CountingUDPClient(SimpleUDPClient):
+    # SimpleUDPClient that counts what it sends, and failed sends as drops.
+    # Sent datagrams also go to the traffic capture when one is running.
+    # Messages are encoded from cached templates rather than pythonosc's
+    # message builder, and hot paths can send precompiled datagrams with
+    # send_dgram. Both take a target to answer someone other than the
+    # configured peer, e.g. whichever remote asked.
+    def __init__(self, address: str, port: int, socket_name: str):
+        super().__init__(address, port)
+        self.socket_name = socket_name
+        self.counters = metrics.socket(socket_name)
+        self.encoder = OscEncoder()
+        self._target = (address, port)
+
+    def send_message(self, address: str, value, target: Optional[Tuple[str, int]] = None) -> None:
+        # Takes the same values as pythonosc, and hands it whatever the
+        # templates can't encode
+        if value is None:
+            values = ()
+        elif isinstance(value, (list, tuple)):
+            values = value
+        elif isinstance(value, (str, bytes, int, float)):
+            values = (value,)
+        else:
+            values = None
+        dgram = None if values is None else self.encoder.encode(address, values)
+        if dgram is None and target is None:
+            super().send_message(address, value)
+        elif dgram is None:
+            self.send_dgram(build_msg(address, value).dgram, target)
+        else:
+            self.send_dgram(dgram, target)
+
+    def send(self, content) -> None:
+        self.send_dgram(content.dgram)
+
+    def send_dgram(self, dgram: bytes, target: Optional[Tuple[str, int]] = None) -> None:
+        try:
+            self._sock.sendto(dgram, target or self._target)
+        except OSError:
+            self.counters.dropped()
+            raise
+        self.counters.sent(len(dgram))
+        capture.record(self.socket_name, dgram)
+
+
+class CountingOSCUDPServer(ThreadingOSCUDPServer):
+    # ThreadingOSCUDPServer that counts, and captures, every datagram it receives
+
+    # Room for bursts like Reaper's marker list, which the default buffer
+    # drops the end of. The OS may cap it lower.
+    receive_buffer = 4 * 1024 * 1024
+
+    def __init__(self, server_address, dispatcher, socket_name: str):
+        self.socket_name = socket_name
+        self.counters = metrics.socket(socket_name)
+        super().__init__(server_address, dispatcher)
+
+    def server_bind(self):
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        except OSError as e:
+            logger.debug(f"Could not enlarge the {self.socket_name} receive buffer: {e}")
+        super().server_bind()
+
+    def verify_request(self, request, client_address):
+        self.counters.received(len(request[0]))
+        capture.record(self.socket_name, request[0])
+        return True
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in ("/", "/metrics"):
+            body, content_type = metrics.render_text().encode(), "text/plain; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.report(), indent=2).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_http(port: int, token: CancellationToken) -> None:
+    # Serves /metrics (text) and /metrics.json on localhost only
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsRequestHandler)
+    except OSError as e:
+        logger.error(f"Metrics endpoint could not bind port {port}: {e}")
+        return
+    server.daemon_threads = True
+    logger.info(f"Metrics available at http://127.0.0.1:{port}/metrics")
+    serve(server, token)
+
+
+def write_file(path: str, interval: float, token: CancellationToken) -> None:
+    # Rewrites the metrics text file every interval seconds, and once more on stop
+    while True:
+        stopping = token.wait(interval)
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".metrics-", dir=os.path.dirname(path) or ".")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(metrics.render_text())
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write metrics file: {e}")
+        if stopping:
+            return
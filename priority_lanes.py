@@ -0,0 +1,94 @@
+import threading
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from logger_config import logger
+
+
+class Lane(IntEnum):
+    # Drained in this order. Lower lanes only run when every lane above is empty.
+    CONTROL = 0  # transport, cue and marker traffic, never shed
+    RELAY = 1  # parameter changes on their way to the repeater
+    BULK = 2  # meters and other streams a newer message soon replaces
+
+
+# How many messages a lane may hold before its oldest are shed, None for no
+# limit. A meter more than a few hundred messages old is no use to anyone,
+# while a parameter change is dropped only once the relay is far behind.
+LANE_CAPACITY: Dict[Lane, Optional[int]] = {
+    Lane.CONTROL: None,
+    Lane.RELAY: 8192,
+    Lane.BULK: 512,
+}
+
+_STOP = object()
+
+
+class PriorityLanes:
+    # One queue per lane and a single thread that handles whatever waits in
+    # the highest lane first, so control messages never queue behind relay
+    # traffic. A full lane sheds its own oldest messages, so an overloaded
+    # bridge drops meters first, then parameter changes, and never a cue.
+    def __init__(self, name: str, handle: Callable[[Any], None],
+                 capacity: Optional[Dict[Lane, Optional[int]]] = None):
+        self.name = name
+        self.handle = handle
+        self.capacity = dict(capacity or LANE_CAPACITY)
+        self.handled = {lane: 0 for lane in Lane}
+        self.shed = {lane: 0 for lane in Lane}
+        self._queues: List[Deque] = [deque() for _ in Lane]
+        self._ready = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._drain, name=self.name, daemon=True)
+        self._thread.start()
+
+    def put(self, lane: Lane, item: Any) -> None:
+        # Never blocks the receiving thread
+        with self._ready:
+            queue = self._queues[lane]
+            limit = self.capacity[lane]
+            if limit is not None and len(queue) >= limit:
+                queue.popleft()
+                self.shed[lane] += 1
+            queue.append(item)
+            self._ready.notify()
+
+    def stop(self) -> None:
+        # Messages still waiting are dropped, the thread finishes the one it is handling
+        with self._ready:
+            for queue in self._queues:
+                queue.clear()
+            self._queues[Lane.CONTROL].append(_STOP)
+            self._ready.notify()
+
+    def _next(self):
+        with self._ready:
+            while True:
+                for lane, queue in enumerate(self._queues):
+                    if queue:
+                        return lane, queue.popleft()
+                self._ready.wait()
+
+    def _drain(self) -> None:
+        while True:
+            lane, item = self._next()
+            if item is _STOP:
+                return
+            try:
+                self.handle(item)
+            except Exception as e:
+                logger.error("Error handling %s message in %s: %s", Lane(lane).name.lower(), self.name, e)
+            self.handled[lane] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            lane.name.lower(): {
+                "depth": len(self._queues[lane]),
+                "handled": self.handled[lane],
+                "shed": self.shed[lane],
+            }
+            for lane in Lane
+        }
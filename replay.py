@@ -0,0 +1,102 @@
+import argparse
+import collections
+import socket
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+from app_settings import SettingsSnapshot
+from capture import CaptureReader
+
+
+def summarize(path: str) -> None:
+    # Prints what a capture holds, per socket and direction
+    counts: Dict[Tuple[str, str], list] = collections.defaultdict(lambda: [0, 0])
+    duration = 0.0
+    with CaptureReader(path) as reader:
+        started = reader.started
+        for datagram in reader:
+            entry = counts[(datagram.socket, datagram.direction)]
+            entry[0] += 1
+            entry[1] += len(datagram.data)
+            duration = datagram.time
+        datagram = None
+    print(f"{path}: started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}, {duration:.1f} s")
+    for (socket_name, direction), (packets, size) in sorted(counts.items()):
+        print(f"  {socket_name + '_' + direction:<14}{packets:>10} datagrams{size:>12} bytes")
+
+
+def replay(path: str, targets: Dict[str, Tuple[str, int]], speed: float,
+           start_at: float = 0.0, stop_at: Optional[float] = None) -> Dict[str, int]:
+    # Sends the datagrams the bridge received, from the sockets in targets, to
+    # a bridge at the given addresses. speed 1 keeps the original timing, 10
+    # plays ten times as fast and 0 sends as fast as possible.
+    sent = collections.Counter()
+    senders = {name: socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for name in targets}
+    begin = time.perf_counter()
+    try:
+        with CaptureReader(path) as reader:
+            for datagram in reader:
+                if datagram.direction != "in" or datagram.socket not in targets:
+                    continue
+                if datagram.time < start_at:
+                    continue
+                if stop_at is not None and datagram.time > stop_at:
+                    break
+                if speed:
+                    delay = (datagram.time - start_at) / speed - (time.perf_counter() - begin)
+                    if delay > 0:
+                        time.sleep(delay)
+                senders[datagram.socket].sendto(datagram.data, targets[datagram.socket])
+                sent[datagram.socket] += 1
+            datagram = None
+    finally:
+        for sender in senders.values():
+            sender.close()
+    elapsed = time.perf_counter() - begin
+    print(f"Replayed {sum(sent.values())} datagrams in {elapsed:.2f} s "
+          f"({', '.join(f'{name} {count}' for name, count in sorted(sent.items())) or 'nothing'})")
+    return dict(sent)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = SettingsSnapshot()
+    parser = argparse.ArgumentParser(
+        description="Play a traffic capture into a running bridge, as the console, "
+                    "the repeater device and Reaper sent it."
+    )
+    parser.add_argument("capture", help="A .drlcap file written with capture enabled")
+    parser.add_argument("--summary", action="store_true", help="Only list what the capture holds")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 for real time, 10 or 100 to speed up, 0 for as fast as possible")
+    parser.add_argument("--from", dest="start_at", type=float, default=0.0,
+                        help="Start this many seconds into the capture")
+    parser.add_argument("--to", dest="stop_at", type=float, help="Stop this many seconds into the capture")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the bridge's console servers listen on")
+    parser.add_argument("--receive-port", type=int, default=defaults.receive_port)
+    parser.add_argument("--repeater-receive-port", type=int, default=defaults.repeater_receive_port)
+    parser.add_argument("--reaper-receive-port", type=int, default=defaults.reaper_receive_port)
+    parser.add_argument("--only", choices=["console", "repeater", "daw"], action="append",
+                        help="Replay only this socket's traffic, can be given more than once")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.summary:
+        summarize(args.capture)
+        return 0
+    targets = {
+        "console": (args.host, args.receive_port),
+        "repeater": (args.host, args.repeater_receive_port),
+        # The Reaper server always listens on localhost
+        "daw": ("127.0.0.1", args.reaper_receive_port),
+    }
+    if args.only:
+        targets = {name: address for name, address in targets.items() if name in args.only}
+    replay(args.capture, targets, args.speed, args.start_at, args.stop_at)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
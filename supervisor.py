@@ -0,0 +1,148 @@
+import selectors
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from logger_config import logger
+
+
+class CancellationToken:
+    # Handed to every worker. Workers check `cancelled`, sleep with wait() so a
+    # stop interrupts them, and can register callbacks that unblock sockets.
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._wakeup: Optional[Tuple[socket.socket, socket.socket]] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        # Sleeps for up to timeout seconds, returns True if cancelled
+        return self._event.wait(timeout)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+            if self._wakeup:
+                try:
+                    self._wakeup[1].send(b"\0")
+                except OSError:
+                    pass
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Cancellation callback error: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wakeup_socket(self) -> socket.socket:
+        # A socket that becomes readable on cancel, for select loops
+        with self._lock:
+            if self._wakeup is None:
+                self._wakeup = socket.socketpair()
+                if self._event.is_set():
+                    self._wakeup[1].send(b"\0")
+            return self._wakeup[0]
+
+    def close(self) -> None:
+        with self._lock:
+            wakeup, self._wakeup = self._wakeup, None
+        if wakeup:
+            for sock in wakeup:
+                sock.close()
+
+
+def serve(server: socketserver.BaseServer, token: CancellationToken) -> None:
+    # socketserver's serve_forever, but stopped by the token rather than
+    # shutdown(), so there is no poll interval to wait out. The server is
+    # closed on the way out.
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(server, selectors.EVENT_READ)
+            selector.register(token.wakeup_socket(), selectors.EVENT_READ)
+            while not token.cancelled:
+                for key, _ in selector.select():
+                    if key.fileobj is server and not token.cancelled:
+                        server._handle_request_noblock()
+                server.service_actions()
+    finally:
+        server.server_close()
+
+
+class Worker:
+    def __init__(self, name: str, target: Callable[[CancellationToken], None]):
+        self.name = name
+        self.token = CancellationToken()
+        self.thread = threading.Thread(target=self._run, args=(target,), name=name, daemon=True)
+
+    def _run(self, target: Callable[[CancellationToken], None]) -> None:
+        try:
+            target(self.token)
+        except Exception as e:
+            logger.error(f"Worker {self.name} failed: {e}")
+        finally:
+            self.token.close()
+
+
+class Supervisor:
+    # Owns every worker thread of the bridge. Workers are started by name and
+    # stopped by cancelling their tokens, then joined against one shared
+    # deadline so a stop takes a bounded time however many workers there are.
+    def __init__(self, stop_timeout: float = 1.0):
+        self.stop_timeout = stop_timeout
+        self._lock = threading.Lock()
+        self._workers: Dict[str, Worker] = {}
+
+    def start(self, name: str, target: Callable[[CancellationToken], None]) -> Worker:
+        with self._lock:
+            previous = self._workers.get(name)
+        if previous and previous.thread.is_alive():
+            logger.warning(f"Worker {name} is still running, stopping it first")
+            self.stop([name])
+        worker = Worker(name, target)
+        with self._lock:
+            self._workers[name] = worker
+        worker.thread.start()
+        return worker
+
+    def stop(self, names: Iterable[str], timeout: Optional[float] = None) -> List[str]:
+        # Returns the names of workers that did not finish in time
+        with self._lock:
+            workers = [self._workers.pop(name) for name in names if name in self._workers]
+        for worker in workers:
+            worker.token.cancel()
+        deadline = time.monotonic() + (self.stop_timeout if timeout is None else timeout)
+        leaked = []
+        for worker in workers:
+            if worker.thread is threading.current_thread():
+                continue
+            worker.thread.join(max(0.0, deadline - time.monotonic()))
+            if worker.thread.is_alive():
+                leaked.append(worker.name)
+        if leaked:
+            logger.warning(f"Workers did not stop in time: {', '.join(leaked)}")
+        return leaked
+
+    def stop_all(self, timeout: Optional[float] = None) -> List[str]:
+        with self._lock:
+            names = list(self._workers)
+        return self.stop(names, timeout)
+
+    def running(self) -> List[str]:
+        with self._lock:
+            return [name for name, worker in self._workers.items() if worker.thread.is_alive()]
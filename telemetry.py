@@ -0,0 +1,112 @@
+import os
+import queue
+import time
+from typing import Dict, List, Tuple
+
+import appdirs
+
+from logger_config import logger
+from supervisor import CancellationToken
+
+# Seconds a partly filled chunk may wait before it is written out, so a quiet
+# console still ends up on disk
+FLUSH_INTERVAL = 30.0
+
+
+def telemetry_dir() -> str:
+    return os.path.join(appdirs.user_data_dir("Digico-Reaper Link", "Justin Stasiw"), "telemetry")
+
+
+def series_name(source: str, address: str, index: int) -> str:
+    # The name a parameter is stored and queried under. Consoles of further
+    # pairings are prefixed with the pairing, and arguments after the first
+    # get their position appended.
+    name = address if index == 0 else f"{address}#{index}"
+    return f"{source}:{name}" if source else name
+
+
+class Telemetry:
+    # Records the numeric parameters the console sends (fader, mute, gain
+    # moves) as (time, address, value) rows. Like the capture, the receive
+    # path only queues the message while recording. Interning the addresses,
+    # filling the column buffers and writing segments happens on the writer
+    # thread, which is the only part that needs numpy.
+    def __init__(self):
+        self.active = False
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    def record(self, source: str, address: str, args: tuple) -> None:
+        if self.active:
+            self._queue.put((time.perf_counter(), source, address, args))
+
+    def run(self, directory: str, token: CancellationToken) -> None:
+        # Writes segments to directory until cancelled, then flushes what is queued
+        try:
+            from telemetry_store import SegmentWriter
+        except ImportError as e:
+            logger.error(f"Telemetry needs numpy, which could not be imported: {e}")
+            return
+        try:
+            writer = SegmentWriter(directory, clock_offset=time.time() - time.perf_counter())
+        except OSError as e:
+            logger.error(f"Could not open telemetry directory {directory}: {e}")
+            return
+        ids: Dict[Tuple[str, str, int], int] = {}
+        self.active = True
+        logger.info(f"Recording console telemetry to {directory}")
+        next_flush = time.monotonic() + FLUSH_INTERVAL
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=0.25)
+                except queue.Empty:
+                    item = None
+                    if token.cancelled:
+                        break
+                if item is not None:
+                    # Drain without blocking so a burst is copied into the chunk at once
+                    batch = [item]
+                    while True:
+                        try:
+                            batch.append(self._queue.get_nowait())
+                        except queue.Empty:
+                            break
+                    self._append(writer, ids, batch)
+                if time.monotonic() >= next_flush:
+                    writer.flush()
+                    next_flush = time.monotonic() + FLUSH_INTERVAL
+        finally:
+            self.active = False
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._append(writer, ids, batch)
+            writer.close()
+        logger.info(f"Telemetry stopped, {writer.rows_written} values in {writer.segment} segments")
+
+    @staticmethod
+    def _append(writer, ids: Dict[Tuple[str, str, int], int], batch: List[tuple]) -> None:
+        stamps: List[float] = []
+        series: List[int] = []
+        values: List[float] = []
+        for stamp, source, address, args in batch:
+            for index, value in enumerate(args):
+                # Strings, blobs and bools aren't parameter values
+                value_type = type(value)
+                if value_type is not float and value_type is not int:
+                    continue
+                key = (source, address, index)
+                series_id = ids.get(key)
+                if series_id is None:
+                    series_id = ids[key] = writer.intern(series_name(source, address, index))
+                stamps.append(stamp)
+                series.append(series_id)
+                values.append(value)
+        if stamps:
+            writer.append(stamps, series, values)
+
+
+telemetry = Telemetry()
@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from journal import JournalReader, journal_dir, parse_time
+from telemetry import telemetry_dir
+
+# A recording is a directory with the series names, one per line, whose line
+# number is the id stored in the address column, and numbered segments of
+# three .npy columns: unix time, series id and value. Segments are written
+# whole and renamed into place with the time column last, so a reader only
+# ever sees complete segments, and np.load can memory map them.
+ADDRESSES_FILE = "addresses.txt"
+COLUMNS = (("value", np.float64), ("address", np.uint32), ("time", np.float64))
+# Rows per chunk buffer, about 1.5 MB across the three columns
+CHUNK_ROWS = 1 << 16
+
+
+def _segment_path(directory: str, segment: int, column: str) -> str:
+    return os.path.join(directory, f"segment-{segment:06d}.{column}.npy")
+
+
+class SegmentWriter:
+    # Fills preallocated column buffers and writes them out as a segment
+    # when they are full or flushed. Only the telemetry writer thread uses it.
+    def __init__(self, directory: str, clock_offset: float = 0.0, chunk_rows: int = CHUNK_ROWS):
+        self.directory = directory
+        # Added to the stamps to turn perf_counter times into unix times
+        self.clock_offset = clock_offset
+        self.rows_written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._columns = {name: np.empty(chunk_rows, dtype) for name, dtype in COLUMNS}
+        self._rows = 0
+        # Carries on after whatever an earlier run left in the directory
+        existing = TelemetryReader(directory)
+        self.segment = max(existing.segments(), default=-1) + 1
+        self.addresses = existing.addresses
+        self._ids = existing.ids
+        self._addresses_file = open(os.path.join(directory, ADDRESSES_FILE), "a", encoding="utf-8")
+
+    def intern(self, name: str) -> int:
+        # Written before any segment that uses the id
+        if name in self._ids:
+            return self._ids[name]
+        self._ids[name] = len(self.addresses)
+        self.addresses.append(name)
+        self._addresses_file.write(name + "\n")
+        self._addresses_file.flush()
+        return len(self.addresses) - 1
+
+    def append(self, stamps: Sequence[float], ids: Sequence[int], values: Sequence[float]) -> None:
+        capacity = len(self._columns["time"])
+        start = 0
+        while start < len(stamps):
+            count = min(len(stamps) - start, capacity - self._rows)
+            end = self._rows + count
+            self._columns["time"][self._rows:end] = stamps[start:start + count]
+            self._columns["time"][self._rows:end] += self.clock_offset
+            self._columns["address"][self._rows:end] = ids[start:start + count]
+            self._columns["value"][self._rows:end] = values[start:start + count]
+            self._rows = end
+            start += count
+            if self._rows == capacity:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        for name, _ in COLUMNS:
+            path = _segment_path(self.directory, self.segment, name)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, self._columns[name][:self._rows])
+            os.replace(path + ".tmp", path)
+        self.rows_written += self._rows
+        self.segment += 1
+        self._rows = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._addresses_file.close()
+
+
+class TelemetryReader:
+    # Read only access to one recording, safe to use while the bridge is
+    # still writing it. Segments are memory mapped, so queries only read the
+    # part of a long show they touch.
+    def __init__(self, directory: str):
+        self.directory = directory
+        path = os.path.join(directory, ADDRESSES_FILE)
+        self.addresses: List[str] = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                # A name being written has no newline yet
+                self.addresses = [line[:-1] for line in f if line.endswith("\n")]
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(self.addresses)}
+
+    def segments(self) -> List[int]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            int(name[len("segment-"):-len(".time.npy")]) for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".time.npy")
+        )
+
+    def column(self, segment: int, name: str) -> np.ndarray:
+        return np.load(_segment_path(self.directory, segment, name), mmap_mode="r")
+
+    def _ranges(self, start: float, end: float) -> Iterator[Tuple[int, slice]]:
+        # Rows of each segment between start and end. Times only go forward
+        # within a recording, so a binary search finds them.
+        for segment in self.segments():
+            times = self.column(segment, "time")
+            if not len(times) or times[0] > end or times[-1] < start:
+                continue
+            first = int(np.searchsorted(times, start, "left"))
+            last = int(np.searchsorted(times, end, "right"))
+            if first < last:
+                yield segment, slice(first, last)
+
+    def series_id(self, address: str, pairing: str = "main") -> Optional[int]:
+        return self.ids.get(address if pairing == "main" else f"{pairing}:{address}")
+
+    def history(self, address: str, start: float = 0.0, end: float = float("inf"),
+                pairing: str = "main") -> Tuple[np.ndarray, np.ndarray]:
+        # Every value the console sent for address between start and end, as
+        # (times, values)
+        series = self.series_id(address, pairing)
+        times, values = [np.empty(0)], [np.empty(0)]
+        if series is None:
+            return times[0], values[0]
+        for segment, rows in self._ranges(start, end):
+            match = self.column(segment, "address")[rows] == series
+            times.append(self.column(segment, "time")[rows][match])
+            values.append(self.column(segment, "value")[rows][match])
+        return np.concatenate(times), np.concatenate(values)
+
+    def value_at(self, address: str, when: float, pairing: str = "main") -> Optional[float]:
+        # The last value sent for address at or before when, None if there was none
+        times, values = self.history(address, 0.0, when, pairing)
+        return float(values[-1]) if len(values) else None
+
+    def counts(self, start: float = 0.0, end: float = float("inf")) -> Dict[str, int]:
+        # How many values each address sent between start and end
+        totals = np.zeros(len(self.addresses), np.int64)
+        for segment, rows in self._ranges(start, end):
+            totals += np.bincount(self.column(segment, "address")[rows], minlength=len(self.addresses))[:len(totals)]
+        return {self.addresses[i]: int(totals[i]) for i in np.flatnonzero(totals)}
+
+
+def fader_address(channel: int) -> str:
+    return f"/Input_Channels/{channel}/fader"
+
+
+def fader_history(reader: TelemetryReader, channel: int, start: float = 0.0, end: float = float("inf"),
+                  pairing: str = "main") -> Tuple[np.ndarray, np.ndarray]:
+    return reader.history(fader_address(channel), start, end, pairing)
+
+
+def _is_cue(entry: Dict, cue: str) -> bool:
+    # Cues are journaled as "<number> <name>", either one picks them out
+    number, _, name = entry["value"].partition(" ")
+    return entry["value"] == cue or number == cue or name == cue
+
+
+def cue_window(first: str, second: Optional[str] = None, directory: Optional[str] = None,
+               pairing: str = "main", start: float = 0.0) -> Tuple[float, float]:
+    # The time span from the first recall of cue first after start until
+    # the next recall of cue second, or until now without second
+    entries = [
+        entry for entry in JournalReader(directory or journal_dir()).entries(start)
+        if entry["kind"] == "cue" and entry.get("pairing", "main") == pairing
+    ]
+    begin = next((entry["time"] for entry in entries if _is_cue(entry, first)), None)
+    if begin is None:
+        raise ValueError(f"Cue {first} is not in the journal")
+    if second is None:
+        return begin, float("inf")
+    end = next((entry["time"] for entry in entries if entry["time"] > begin and _is_cue(entry, second)), None)
+    if end is None:
+        raise ValueError(f"Cue {second} is not in the journal after cue {first}")
+    return begin, end
+
+
+def latest_recording() -> Optional[str]:
+    root = telemetry_dir()
+    if not os.path.isdir(root):
+        return None
+    runs = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    return os.path.join(root, runs[-1]) if runs else None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Query a console telemetry recording.")
+    parser.add_argument("--dir", help="Recording directory, the most recent one by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("addresses", "Print how many values each address sent in a time range"),
+                            ("history", "Print every value of one address in a time range")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--from", dest="start", type=parse_time, default=0.0,
+                             help="HH:MM[:SS], YYYY-MM-DD HH:MM[:SS] or a unix time")
+        command.add_argument("--to", dest="end", type=parse_time, default=float("inf"))
+        command.add_argument("--from-cue", help="Start at the first recall of this cue number or name")
+        command.add_argument("--to-cue", help="End at the next recall of this cue after --from-cue")
+        command.add_argument("--pairing", default="main", help="Which console/DAW pairing, for bridges with several")
+    history = commands.choices["history"]
+    target = history.add_mutually_exclusive_group(required=True)
+    target.add_argument("--address", help="OSC address, e.g. /Input_Channels/12/mute")
+    target.add_argument("--fader", type=int, metavar="CHANNEL", help="Fader of this input channel")
+    args = parser.parse_args(argv)
+    if args.to_cue and not args.from_cue:
+        parser.error("--to-cue needs --from-cue")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    directory = args.dir or latest_recording()
+    if directory is None:
+        print("No telemetry has been recorded")
+        return 1
+    reader = TelemetryReader(directory)
+    start, end = args.start, args.end
+    if args.from_cue:
+        try:
+            start, end = cue_window(args.from_cue, args.to_cue, pairing=args.pairing, start=start)
+        except ValueError as e:
+            print(e)
+            return 1
+    if args.command == "addresses":
+        for address, count in sorted(reader.counts(start, end).items()):
+            print(f"{count:>10}  {address}")
+        return 0
+
+    address = args.address or fader_address(args.fader)
+    times, values = reader.history(address, start, end, args.pairing)
+    for stamp, value in zip(times, values):
+        print(f"{datetime.datetime.fromtimestamp(stamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}  {value:g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import threading
+from typing import Any, Dict, Tuple
+
+
+class UIState:
+    # The status shown in the main window. Backend threads write into it and a
+    # timer on the UI thread draws it. A write that changes nothing returns
+    # without touching wx, so a flood of identical status events costs a dict
+    # comparison each. `version` moves on every real change so the timer can
+    # skip redraws with a single read.
+    def __init__(self, **fields: Any):
+        self._lock = threading.Lock()
+        self._fields: Dict[str, Any] = dict(fields)
+        self.version = 0
+
+    def set(self, **changes: Any) -> bool:
+        with self._lock:
+            changed = {k: v for k, v in changes.items() if self._fields.get(k) != v}
+            if not changed:
+                return False
+            self._fields.update(changed)
+            self.version += 1
+        return True
+
+    def read(self) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            return self.version, dict(self._fields)
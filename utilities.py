@@ -1,96 +1,443 @@
-import configparser
 import ipaddress
 import os.path
 import socket
 import threading
 import time
-from typing import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 
 import appdirs
 import psutil
-from configupdater import ConfigUpdater
 from pubsub import pub
 
-from app_settings import settings
-from consoles import Console, DiGiCo, StuderVista
-from daws import Daw, Reaper, ProTools
+from app_settings import DawSettings, SettingsSnapshot, ThreadSafeSettings, settings
+from capture import capture
+from config_store import ConfigStore
+from consoles import CONSOLES, Console
+from daws import DAWS, Daw
+from event_bus import EventBus, bus
+from journal import Journal, journal_dir
+from link_monitor import LinkMonitor
 from logger_config import logger
+from metrics import metrics, serve_http as serve_metrics, write_file as write_metrics_file
+from supervisor import CancellationToken, Supervisor
+from telemetry import telemetry, telemetry_dir
+
+
+class InterfaceAddress(NamedTuple):
+    interface: str
+    address: str
+
+
+class InterfaceTable:
+    # The machine's IPv4 addresses, keyed by netmask and network as integers,
+    # so matching an IP costs one dict lookup per distinct netmask. The table
+    # is built once and rebuilt only when the list of interfaces changes (checked
+    # at most every max_age seconds), when a lookup misses, or on invalidate().
+    def __init__(self, max_age: float = 5.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._by_mask: Dict[int, Dict[int, List[InterfaceAddress]]] = {}
+        self._names: Optional[tuple] = None
+        self._built_at: Optional[float] = None
+
+    @staticmethod
+    def _interface_names() -> Optional[tuple]:
+        try:
+            return tuple(sorted(name for _, name in socket.if_nameindex()))
+        except OSError:
+            return None
+
+    def _rebuild(self) -> None:
+        by_mask: Dict[int, Dict[int, List[InterfaceAddress]]] = {}
+        for interface, snics in psutil.net_if_addrs().items():
+            for snic in snics:
+                if snic.family != socket.AF_INET or not snic.netmask:
+                    continue
+                mask = int(ipaddress.IPv4Address(snic.netmask))
+                network = int(ipaddress.IPv4Address(snic.address)) & mask
+                by_mask.setdefault(mask, {}).setdefault(network, []).append(
+                    InterfaceAddress(interface, snic.address)
+                )
+        # Most specific networks first
+        self._by_mask = dict(sorted(by_mask.items(), reverse=True))
+        self._names = self._interface_names()
+        self._built_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        if time.monotonic() - self._built_at < self.max_age:
+            return False
+        names = self._interface_names()
+        if names is not None and names != self._names:
+            return True
+        self._built_at = time.monotonic()
+        return False
+
+    def _match(self, ip: int) -> List[InterfaceAddress]:
+        matches: List[InterfaceAddress] = []
+        for mask, networks in self._by_mask.items():
+            matches.extend(networks.get(ip & mask, ()))
+        return matches
+
+    def invalidate(self) -> None:
+        # Rebuild on the next lookup, e.g. after the user asks to reconnect
+        with self._lock:
+            self._built_at = None
+
+    def lookup(self, ip: str) -> List[InterfaceAddress]:
+        # Every local address in the same subnet as ip, most specific first
+        ip_int = int(ipaddress.IPv4Address(ip))
+        with self._lock:
+            rebuilt = self._stale()
+            if rebuilt:
+                self._rebuild()
+            matches = self._match(ip_int)
+            if not matches and not rebuilt:
+                # An interface may have come up or been readdressed since
+                self._rebuild()
+                matches = self._match(ip_int)
+        return matches
+
+    def find(self, ip: str) -> Optional[InterfaceAddress]:
+        matches = self.lookup(ip)
+        if len(matches) > 1:
+            logger.warning(
+                f"{ip} is reachable from more than one interface: "
+                + ", ".join(f"{m.interface} ({m.address})" for m in matches)
+                + f". Using {matches[0].interface}."
+            )
+        return matches[0] if matches else None
+
+
+interface_table = InterfaceTable()
 
 
 def find_local_ip_in_subnet(console_ip):
     # Find our local interface in the same network as the console interface
-    ipv4_interfaces = []
-    # Make a list of all the network interfaces on our machine
-    for interface, snics in psutil.net_if_addrs().items():
-        for snic in snics:
-            if snic.family == socket.AF_INET:
-                ipv4_interfaces.append((snic.address, snic.netmask))
-    # Iterate through network interfaces to see if any are in the same subnet as console
-    for i in ipv4_interfaces:
-        # Convert tuples to strings like 192.168.1.0/255.255.255.0 since thats what ipaddress expects
-        interface_ip_string = i[0] + "/" + i[1]
-        # If strict is off, then the user bits of the computer IP will be masked automatically
-        # Need to add error handling here
-        if ipaddress.IPv4Address(console_ip) in ipaddress.IPv4Network(interface_ip_string, False):
-            return i[0]
+    match = interface_table.find(console_ip)
+    return match.address if match else None
+
+
+# The settings each bridge component is built from. Changing one of them only
+# restarts that component. The repeater binds in the console's subnet, so it
+# follows the console IP too.
+COMPONENT_SETTINGS: Dict[str, Tuple[str, ...]] = {
+    "console": ("console_type", "console_ip", "console_port", "receive_port"),
+    "repeater": ("forwarder_enabled", "repeater_ip", "repeater_port", "repeater_receive_port", "console_ip"),
+    "daw": ("daw_type", "reaper_ip", "reaper_port", "reaper_receive_port", "ptsl_address"),
+}
+
+
+def changed_components(old: SettingsSnapshot, new: SettingsSnapshot) -> Set[str]:
+    # Which components need restarting to go from the old settings to the new ones
+    changed = {
+        component
+        for component, names in COMPONENT_SETTINGS.items()
+        if any(getattr(old, name) != getattr(new, name) for name in names)
+    }
+    if "console" in changed:
+        # The repeater belongs to the console backend and restarts with it
+        changed.discard("repeater")
+    return changed
+
+
+def preferences_path() -> str:
+    # The preferences file, in a config directory that is created if needed
+    config_dir = appdirs.user_config_dir("Digico-Reaper Link", "Justin Stasiw")
+    os.makedirs(config_dir, exist_ok=True)
+    return config_dir + "/settingsV3.ini"
+
+
+MAIN_PAIRING = "main"
+# Config sections of the pairings other than the main one, e.g. [pairing Monitors]
+PAIRING_SECTION_PREFIX = "pairing "
+# Config sections of further DAWs a pairing drives alongside its own, e.g.
+# [daw Backup], with a `pairing` key naming the pairing
+DAW_SECTION_PREFIX = "daw "
+
+
+class Pairing:
+    # One console and the DAW it drives, with the link monitor between them.
+    # The main pairing uses the app wide settings and bus, which the UI
+    # follows. Other pairings get their own, so their cues only reach their
+    # own DAW. Threads, config, metrics, capture, telemetry and the journal belong to
+    # the bridge and are shared.
+    def __init__(self, bridge: "DawConsoleBridge", name: str = MAIN_PAIRING,
+                 pairing_settings: Optional[ThreadSafeSettings] = None, pairing_bus: Optional[EventBus] = None):
+        self.bridge = bridge
+        self.name = name
+        self.settings = settings if pairing_settings is None else pairing_settings
+        self.bus = bus if pairing_bus is None else pairing_bus
+        self.link_monitor = LinkMonitor(
+            probe=lambda: self.console.heartbeat(),
+            on_up=lambda: self.console.link_up(),
+            on_down=self._link_down,
+            settings=self.settings,
+        )
+        self._console = Console(self.settings, self.bus)
+        self._daw = Daw(self.settings, self.bus)
+        self._running_settings = self.settings.snapshot
+        # Further DAWs that get every cue, marker and transport action too.
+        # Each has its own bus queue and thread, so a slow one never holds
+        # up the others.
+        self.extra_daw_settings: Dict[str, DawSettings] = {}
+        self.extra_daws: List[Daw] = []
+        self._extra_daw_threads: List[str] = []
+        self._running_extras: Dict[str, Dict] = {}
+        # Whether the servers are up, so a reconfigure knows to start or reconcile it
+        self.started = False
+
+    @classmethod
+    def from_config(cls, bridge: "DawConsoleBridge", name: str, config) -> "Pairing":
+        pairing_settings = ThreadSafeSettings()
+        pairing_settings.update_from_config(config, PAIRING_SECTION_PREFIX + name)
+        topic = "".join(c if c.isalnum() else "_" for c in name)
+        pairing = cls(bridge, name, pairing_settings, EventBus(topic_prefix=f"pairing_{topic}."))
+        metrics.gauge(f"bus.{name}", pairing.bus.queue_stats)
+        return pairing
+
+    def _link_down(self) -> None:
+        self.console.link_down()
+        self.bus.send_message("console_disconnected")
+
+    def thread_name(self, name: str) -> str:
+        return name if self.name == MAIN_PAIRING else f"{self.name}/{name}"
+
+    def start_managed_thread(self, name: str, target: Callable[[CancellationToken], None]) -> None:
+        self.bridge.start_managed_thread(self.thread_name(name), target)
+
+    def stop_threads(self, names: Iterable[str]) -> None:
+        self.bridge.stop_threads([self.thread_name(name) for name in names])
+
+    def start(self) -> None:
+        self._running_settings = self.settings.snapshot
+        self.start_daw()
+        self.start_console()
+        self.started = True
+
+    def stop(self) -> None:
+        self.console.shutdown_servers()
+        for daw in self.daws:
+            daw.shutdown_servers()
+        self.stop_threads(["console_connection_thread", "repeater_osc_thread", "daw_connection_thread",
+                           *self._extra_daw_threads])
+        self.extra_daws = []
+        self._extra_daw_threads = []
+        self.started = False
+
+    @property
+    def daws(self) -> List[Daw]:
+        return [self.daw, *self.extra_daws]
+
+    def start_daw(self):
+        # Only the selected backend is imported
+        daw_backend = DAWS.get(self.settings.daw_type)
+        if daw_backend:
+            self.daw = daw_backend.load()(self.settings, self.bus)
+        else:
+            logger.error(f"Unknown DAW type: {self.settings.daw_type}")
+        self.daw.start_managed_threads(self.start_managed_thread)
+        self._running_extras = {label: s.overrides for label, s in self.extra_daw_settings.items()}
+        for label, daw_settings in self.extra_daw_settings.items():
+            self.start_extra_daw(label, daw_settings)
+
+    def start_extra_daw(self, label: str, daw_settings: DawSettings):
+        daw_backend = DAWS.get(daw_settings.daw_type)
+        if not daw_backend:
+            logger.error(f"Unknown DAW type for {label}: {daw_settings.daw_type}")
+            return
+        daw = daw_backend.load()(daw_settings, self.bus)
+        daw.label = label
+
+        def start_managed_thread(name: str, target: Callable[[CancellationToken], None]) -> None:
+            self._extra_daw_threads.append(f"{name}/{label}")
+            self.start_managed_thread(f"{name}/{label}", target)
+
+        logger.info(f"Also sending to {daw.subscriber_name}")
+        daw.start_managed_threads(start_managed_thread)
+        self.extra_daws.append(daw)
+
+    def stop_daw(self):
+        for daw in self.daws:
+            daw.shutdown_servers()
+        self.stop_threads(["daw_connection_thread", *self._extra_daw_threads])
+        self.extra_daws = []
+        self._extra_daw_threads = []
+
+    def start_console(self):
+        # Only the selected backend is imported
+        console_backend = CONSOLES.get(self.settings.console_type)
+        if console_backend:
+            self.console = console_backend.load()(self.settings, self.bus)
         else:
-            pass
+            logger.error(f"Unknown console type: {self.settings.console_type}")
+        self.console.start_managed_threads(self.start_managed_thread)
+
+    def stop_console(self):
+        self.console.shutdown_servers()
+        self.stop_threads(["console_connection_thread", "repeater_osc_thread"])
+
+    def restart_repeater(self):
+        self.console.stop_repeater()
+        self.stop_threads(["repeater_osc_thread"])
+        self.console.start_repeater(self.start_managed_thread)
+
+    def apply_configuration(self) -> Set[str]:
+        # Restart only the components whose settings changed since they were
+        # started. Everything else stays bound and serving.
+        new_settings = self.settings.snapshot
+        changed = changed_components(self._running_settings, new_settings)
+        self._running_settings = new_settings
+        if changed:
+            logger.info(f"Restarting changed components of {self.name}: {', '.join(sorted(changed))}")
+        if "console" in changed:
+            self.stop_console()
+            self.start_console()
+        elif "repeater" in changed:
+            self.restart_repeater()
+        if {label: s.overrides for label, s in self.extra_daw_settings.items()} != self._running_extras:
+            changed.add("daw")
+        if "daw" in changed:
+            self.stop_daw()
+            self.start_daw()
+        return changed
+
+    def reconnect(self):
+        changed = self.apply_configuration()
+        if "console" not in changed:
+            self.stop_console()
+            self.start_console()
+
+    @property
+    def console(self) -> Console:
+        return self._console
+
+    @console.setter
+    def console(self, value: Console) -> None:
+        value.on_inbound = self.link_monitor.touch
+        value.telemetry_source = "" if self.name == MAIN_PAIRING else self.name
+        self._console = value
+        self.bus.send_message("console_type_updated", console=value)
 
+    @property
+    def daw(self) -> Daw:
+        return self._daw
 
-class ManagedThread(threading.Thread):
-    # Building threads that we can more easily control
-    def __init__(self, target, name=None, daemon=True):
-        super().__init__(target=target, name=name, daemon=daemon)
-        self._stop_event = threading.Event()
+    @daw.setter
+    def daw(self, value: Daw) -> None:
+        self._daw = value
+        self.bus.send_message("daw_type_updated", daw=value)
 
-    def stop(self):
-        self._stop_event.set()
+    def seed_markers(self) -> None:
+        # Reads the console's cue list once and gives every DAW of the
+        # pairing a marker for each cue it doesn't have yet
+        try:
+            cues = self.console.cue_list()
+        except Exception as e:
+            logger.error(f"Could not read the cue list of {self.name}: {e}")
+            self.bus.send_message("markers_seeded", daw=self.console.type, added=0, present=0, error=str(e))
+            return
+        for daw in self.daws:
+            try:
+                added, present = daw.seed_markers(cues)
+            except Exception as e:
+                logger.error(f"Could not seed markers in {daw.subscriber_name}: {e}")
+                self.bus.send_message("markers_seeded", daw=daw.subscriber_name, added=0, present=0, error=str(e))
+                continue
+            logger.info(f"Seeded {daw.subscriber_name} with {added} markers, {present} were already there")
+            self.bus.send_message("markers_seeded", daw=daw.subscriber_name, added=added, present=present, error="")
 
-    def stopped(self):
-        return self._stop_event.is_set()
+    def daw_state(self) -> Tuple[str, Optional[float]]:
+        # Which DAW a journal entry went to and where its playhead was
+        return self.daw.type, self.daw.position()
 
 
 class DawConsoleBridge:
-    _console: Console
+    # Hosts the main pairing, which the UI shows and configures, and any
+    # further pairings listed in the preferences file
 
-    def __init__(self):
+    def __init__(self, preferences_file: Optional[str] = None, data_dir: Optional[str] = None):
+        # preferences_file overrides the user's own, e.g. for benchmarks.
+        # data_dir likewise holds the journal, metrics file, captures and
+        # telemetry instead of the user's data and log directories.
         logger.info("Initializing ReaperDigicoOSCBridge")
         self.ini_prefs = ""
         self.config_dir = ""
+        self.data_dir = data_dir
         self.lock = threading.Lock()
-        self.where_to_put_user_data()
+        self.where_to_put_user_data(preferences_file)
+        self.config_store = ConfigStore(self.ini_prefs)
+        self.supervisor = Supervisor()
+        # Lifecycle changes run here one at a time, off the UI thread
+        self._control = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bridge-control")
+        self.main = Pairing(self)
+        self.pairings: Dict[str, Pairing] = {MAIN_PAIRING: self.main}
+        # Set between start_threads and close_servers
+        self.running = False
         self.check_configuration()
-        self.console_name_event = threading.Event()
-        self._console = Console()
-        self._daw = Daw()
-
+        self.journal = Journal(os.path.join(data_dir, "journal") if data_dir else journal_dir())
 
-    def where_to_put_user_data(self):
+    def where_to_put_user_data(self, preferences_file: Optional[str] = None):
         # Find a home for our preferences file
-        appname = "Digico-Reaper Link"
-        appauthor = "Justin Stasiw"
-        self.config_dir = appdirs.user_config_dir(appname, appauthor)
-        if os.path.isdir(self.config_dir):
-            pass
-        else:
-            os.makedirs(self.config_dir)
-        self.ini_prefs = self.config_dir + "/settingsV3.ini"
+        self.ini_prefs = preferences_file or preferences_path()
+        self.config_dir = os.path.dirname(self.ini_prefs)
 
     def check_configuration(self):
         # Load an existing configuration file, if one exists
         try:
             if os.path.isfile(self.ini_prefs):
-                self.set_vars_from_pref(self.ini_prefs)
+                self.set_vars_from_pref()
         except Exception as e:
             logger.error(f"Failed to check/initialize config file: {e}")
 
-    @staticmethod
-    def set_vars_from_pref(config_file_loc):
-        # Bring in the vars to fill out settings from the preferences file
+    def set_vars_from_pref(self):
+        # Bring in the vars to fill out settings from the in-memory preferences
         logger.info("Setting variables from preferences file")
-        config = configparser.ConfigParser()
-        config.read(config_file_loc)
+        config = self.config_store.config()
         settings.update_from_config(config)
+        for section in config.sections():
+            if not section.startswith(PAIRING_SECTION_PREFIX):
+                continue
+            name = section[len(PAIRING_SECTION_PREFIX):]
+            if name == MAIN_PAIRING:
+                logger.warning(f"Ignoring [{section}], the main pairing is configured in [main]")
+            elif name in self.pairings:
+                self.pairings[name].settings.update_from_config(config, section)
+            else:
+                logger.info(f"Adding pairing {name}")
+                self.pairings[name] = Pairing.from_config(self, name, config)
+        # Extra DAWs whose section didn't change keep their settings object,
+        # which a running DAW may be reading
+        previous = {}
+        for pairing in self.pairings.values():
+            previous[pairing.name] = pairing.extra_daw_settings
+            pairing.extra_daw_settings = {}
+        for section in config.sections():
+            if not section.startswith(DAW_SECTION_PREFIX):
+                continue
+            label = section[len(DAW_SECTION_PREFIX):]
+            pairing_name = config.get(section, "pairing", fallback=MAIN_PAIRING)
+            pairing = self.pairings.get(pairing_name)
+            if pairing is None:
+                logger.warning(f"Ignoring [{section}], there is no pairing called {pairing_name}")
+                continue
+            try:
+                daw_settings = DawSettings.from_config(pairing.settings, config, section)
+            except ValueError as e:
+                logger.error(f"Ignoring [{section}]: {e}")
+                continue
+            kept = previous.get(pairing.name, {}).get(label)
+            if kept is not None and kept.overrides == daw_settings.overrides:
+                daw_settings.close()
+                daw_settings = kept
+            pairing.extra_daw_settings[label] = daw_settings
+        for pairing_name, extra_daw_settings in previous.items():
+            kept = self.pairings[pairing_name].extra_daw_settings.values()
+            for daw_settings in extra_daw_settings.values():
+                if not any(daw_settings is k for k in kept):
+                    daw_settings.close()
 
     def update_configuration(
         self,
@@ -109,134 +456,175 @@ class DawConsoleBridge:
     ):
         # Given new values from the GUI, update the config file and restart the OSC Server
         logger.info("Updating configuration file")
-        updater = ConfigUpdater()
-        updater.read(self.ini_prefs)
         try:
-            if not updater.has_section('main'):
-                print("Adding main section")
-                updater.add_section('main')
-            updater["main"]["default_ip"] = con_ip
-            updater["main"]["repeater_ip"] = rptr_ip
-            updater["main"]["default_digico_send_port"] = str(con_send)
-            updater["main"]["default_digico_receive_port"] = str(con_rcv)
-            updater["main"]["default_reaper_send_port"] = str(rpr_send)
-            updater["main"]["default_reaper_receive_port"] = str(rpr_rcv)
-            updater["main"]["default_repeater_send_port"] = str(rptr_snd)
-            updater["main"]["default_repeater_receive_port"] = str(rptr_rcv)
-            updater["main"]["forwarder_enabled"] = str(fwd_enable)
-            updater["main"]["name_only_match"] = str(name_only)
-            updater["main"]["console_type"] = str(console_type)
-            updater["main"]["daw_type"] = str(daw_type)
+            self.config_store.update("main", {
+                "default_ip": con_ip,
+                "repeater_ip": rptr_ip,
+                "default_digico_send_port": con_send,
+                "default_digico_receive_port": con_rcv,
+                "default_reaper_send_port": rpr_send,
+                "default_reaper_receive_port": rpr_rcv,
+                "default_repeater_send_port": rptr_snd,
+                "default_repeater_receive_port": rptr_rcv,
+                "forwarder_enabled": fwd_enable,
+                "name_only_match": name_only,
+                "console_type": console_type,
+                "daw_type": daw_type,
+            })
+            self.set_vars_from_pref()
         except Exception as e:
             logger.error(f"Failed to update config file: {e}")
-        updater.update_file()
-        self.set_vars_from_pref(self.ini_prefs)
-        self.close_servers()
-        self.restart_servers()
-
+        self.apply_configuration()
 
     def update_pos_in_config(self, win_pos_tuple):
         # Receives the position of the window from the UI and stores it in the preferences file
         logger.info("Updating window position in config file")
-        updater = ConfigUpdater()
-        updater.read(self.ini_prefs)
-        try:
-            updater.set("main", "window_pos_x", str(win_pos_tuple[0]))
-            updater.set("main", "window_pos_y", str(win_pos_tuple[1]))
-        except Exception as e:
-            logger.error(f"Failed to update window position in config file: {e}")
-        updater.update_file()
+        self.config_store.update("main", {
+            "window_pos_x": win_pos_tuple[0],
+            "window_pos_y": win_pos_tuple[1],
+        })
 
     def update_size_in_config(self, win_size_tuple):
         logger.info("Updating window size in config file")
-        updater = ConfigUpdater()
-        updater.read(self.ini_prefs)
-        try:
-            updater["main"]["window_size_x"] = str(win_size_tuple[0])
-            updater["main"]["window_size_y"] = str(win_size_tuple[1])
-        except Exception as e:
-            logger.error(f"Failed to update window size in config file: {e}")
-        updater.update_file()
+        self.config_store.update("main", {
+            "window_size_x": win_size_tuple[0],
+            "window_size_y": win_size_tuple[1],
+        })
+
 
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        # Runs a lifecycle change (reconnect, reconfigure, shutdown) on the
+        # control thread so the caller, usually the UI, doesn't block on it
+        return self._control.submit(func, *args, **kwargs)
 
-    def start_managed_thread(self, attr_name: str, target: Callable) -> None:
-        # Start a ManagedThread that can be signaled to stop
-        thread = ManagedThread(target=target, daemon=True)
-        setattr(self, attr_name, thread)
-        thread.start()
+    def start_managed_thread(self, name: str, target: Callable[[CancellationToken], None]) -> None:
+        # Start a supervised worker, target is passed its cancellation token
+        self.supervisor.start(name, target)
 
     def start_threads(self):
-        # Start all OSC server threads
+        # Start all OSC server threads. The Reaper Disconnected dialog asks
+        # for this on a bridge that is already running, so the old pairings
+        # and journal feeds are closed first rather than left subscribed.
+        if self.running:
+            self.close_servers()
         logger.info("Starting threads")
-        if settings.daw_type == Reaper.type:
-            self.daw = Reaper()
-        elif settings.daw_type == ProTools.type:
-            self.daw = ProTools()
-        self.daw.start_managed_threads(self.start_managed_thread)
-        self.start_managed_thread("heartbeat_thread", self.heartbeat_loop)
-        if settings.console_type == DiGiCo.type:
-            self.console = DiGiCo()
-        elif settings.console_type == StuderVista.type:
-            self.console = StuderVista()
-        self.console.start_managed_threads(self.start_managed_thread)
+        if settings.capture_enabled:
+            self.start_capture()
+        if settings.telemetry_enabled:
+            self.start_telemetry()
+        self.journal.start()
+        for pairing in list(self.pairings.values()):
+            self.start_pairing(pairing)
+        self.start_managed_thread("link_monitor_thread", self.link_monitor_loop)
+        self.start_metrics()
+        self.running = True
+
+    def start_pairing(self, pairing: Pairing):
+        self.journal.follow(pairing.name, pairing.bus, pairing.daw_state)
+        pairing.start()
+
+    def log_dir(self) -> str:
+        # Where the metrics file and captures go, next to the log by default
+        return self.data_dir or appdirs.user_log_dir("Digico-Reaper Link", "Justin Stasiw")
+
+    def start_metrics(self):
+        # The metrics file is always written. The HTTP endpoint only runs
+        # when a port is set.
+        metrics_path = os.path.join(self.log_dir(), "metrics.txt")
+        self.start_managed_thread(
+            "metrics_file_thread", lambda token: write_metrics_file(metrics_path, 5.0, token)
+        )
+        port = settings.metrics_port
+        if port:
+            self.start_managed_thread("metrics_http_thread", lambda token: serve_metrics(port, token))
+
+    def start_capture(self):
+        # Each run gets its own file, named for when it started
+        capture_dir = os.path.join(self.log_dir(), "captures")
+        os.makedirs(capture_dir, exist_ok=True)
+        path = os.path.join(capture_dir, time.strftime("capture-%Y%m%d-%H%M%S.drlcap"))
+        self.start_managed_thread("capture_thread", lambda token: capture.run(path, token))
+
+    def start_telemetry(self):
+        # Each run records to its own directory, named for when it started
+        parent = os.path.join(self.data_dir, "telemetry") if self.data_dir else telemetry_dir()
+        directory = os.path.join(parent, time.strftime("telemetry-%Y%m%d-%H%M%S"))
+        self.start_managed_thread("telemetry_thread", lambda token: telemetry.run(directory, token))
+
+    def apply_configuration(self) -> Set[str]:
+        # The main pairing is configured from the UI, the others from the
+        # preferences file. A pairing added to the file since the servers
+        # started is started now, the rest restart what changed. Returns what
+        # changed for the main pairing. Before start_threads there is nothing
+        # to restart, starting picks the new settings up.
+        if not self.running:
+            return set()
+        changed = self.main.apply_configuration()
+        for pairing in list(self.pairings.values()):
+            if pairing is self.main:
+                continue
+            if pairing.started:
+                pairing.apply_configuration()
+            else:
+                logger.info(f"Starting new pairing {pairing.name}")
+                self.start_pairing(pairing)
+        return changed
+
+    def seed_markers(self):
+        # Only the main pairing is seeded from the UI
+        self.main.seed_markers()
+
+    def reconnect(self):
+        # Re-opens the console side connections, which is what a network
+        # change or a pulled cable affects. The DAW links are left alone unless
+        # their settings changed.
+        logger.info("Reconnecting to consoles")
+        interface_table.invalidate()
+        for pairing in self.pairings.values():
+            pairing.reconnect()
 
     @property
     def console(self) -> Console:
-        return self._console
-
-    @console.setter
-    def console(self, value: Console) -> None:
-        self._console = value
-        pub.sendMessage("console_type_updated", console=value)
+        return self.main.console
 
     @property
     def daw(self) -> Daw:
-        return self._daw
+        return self.main.daw
 
-    @daw.setter
-    def daw(self, value: Daw) -> None:
-        self._daw = value
-        pub.sendMessage("daw_type_updated", daw=value)
+    @property
+    def link_monitor(self) -> LinkMonitor:
+        return self.main.link_monitor
 
 
     # Console Functions:
 
-    def heartbeat_loop(self):
-        # Periodically requests the console name every 3 seconds
-        # to verify connection status and update the UI
-        while not self.console_name_event.is_set():
-            try:
-                if isinstance(self.console, Console):
-                    self.console.heartbeat()
-            except Exception as e:
-                logger.error(f"Heartbeat loop error: {e}")
-                pub.sendMessage("console_disconnected")
-            time.sleep(3)
+    def link_monitor_loop(self, token: CancellationToken):
+        # One thread watches every pairing's console link, and only probes a
+        # console when it has gone quiet
+        while not token.wait(self.main.link_monitor.tick):
+            for pairing in list(self.pairings.values()):
+                pairing.link_monitor.check()
+
 
+    def stop_threads(self, names: Iterable[str]):
+        self.supervisor.stop(names)
 
     def stop_all_threads(self):
         logger.info("Stopping all threads")
-        for attr in [
-            "console_connection_thread",
-            "daw_connection_thread",
-            "repeater_osc_thread",
-            "heartbeat_thread",
-        ]:
-            thread = getattr(self, attr, None)
-            if thread and isinstance(thread, ManagedThread):
-                thread.stop()
-                thread.join(timeout=1)
+        self.supervisor.stop_all()
 
     def close_servers(self):
         logger.info("Closing OSC servers...")
-        self.console_name_event.set()  # Signal heartbeat to exit
-        pub.sendMessage("shutdown_servers")
+        self.running = False
+        for pairing in self.pairings.values():
+            pairing.stop()
+        self.journal.close()
         self.stop_all_threads()
+        self.config_store.flush()
         logger.info("All servers closed and threads joined.")
         return True
 
     def restart_servers(self):
         # Restart the OSC server threads.
         logger.info("Restarting server threads")
-        self.console_name_event = threading.Event()
         self.start_threads()